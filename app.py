@@ -1,32 +1,48 @@
 # app.py
 import dash
 import dash_bootstrap_components as dbc
-from dash import html, dcc, Output, Input, callback
+from dash import html, dcc, Output, Input, State, callback, no_update
 from flask import Flask
 import os
 import config_store
+from result_store import results_blueprint
+from export_store import exports_blueprint
 
 external_stylesheets = [dbc.themes.MINTY, "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css"]
 
 server = Flask(__name__)
+server.register_blueprint(results_blueprint)
+server.register_blueprint(exports_blueprint)
 app = dash.Dash(__name__, server=server, use_pages=True, external_stylesheets=external_stylesheets)
 app.title = "ERP Multi-Module Dashboard"
 
 # Layout with navigation flow control
 app.layout = dbc.Container([
     dcc.Location(id="url", refresh=False),
+    # Per-browser id used to scope background jobs
+    dcc.Store(id="session-id", storage_type="local"),
     
     html.Div(id="navbar-container"),
     html.Div(id="page-content")
 ], fluid=True)
 
+@callback(
+    Output("session-id", "data"),
+    Input("url", "pathname"),
+    State("session-id", "data")
+)
+def ensure_session_id(_, session_id):
+    # Ids are issued (and signed) here; anything else the browser holds is replaced
+    return no_update if config_store.session_dir(session_id) else config_store.new_session_id()
+
 @callback(
     [Output("navbar-container", "children"), Output("page-content", "children")],
-    Input("url", "pathname")
+    Input("url", "pathname"),
+    State("session-id", "data")
 )
-def display_page(pathname):
+def display_page(pathname, session_id):
     # Step 1: If no config, always redirect to config page
-    if not config_store.db_config and pathname not in ["/config", "/"]:
+    if not config_store.get_config(session_id) and pathname not in ["/config", "/"]:
         return [], dcc.Location(pathname="/config", id="redirect-to-config")
     
     # Step 2: Home page logic - redirect to config page
@@ -0,0 +1,84 @@
+# benchmarks/bench_cube.py
+# Compare item-level chart aggregation on the pre-aggregated cube vs raw rows.
+#
+# Usage (from the repo root):
+#   python -m benchmarks.bench_cube                 # synthetic data
+#   python -m benchmarks.bench_cube --rows 5000000
+#   python -m benchmarks.bench_cube --extract data/erp_sales_data.parquet
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from extract_store import read_extract
+from filter_engine import FilterEngine
+from sales_cube import SalesCube
+
+
+def synthetic_frame(rows, seed=0):
+    # Customers reorder a small basket of items on weekly dispatch days,
+    # which is what makes invoice lines aggregate well in practice
+    rng = np.random.default_rng(seed)
+    states = rng.integers(0, 10, rows)
+    cities = states * 10 + rng.integers(0, 10, rows)
+    parties = cities * 5 + rng.integers(0, 5, rows)
+    items = (parties * 7 + rng.integers(0, 8, rows)) % 300
+    days = rng.integers(0, 1490, rows) // 7 * 7
+    df = pd.DataFrame({
+        "state_name": pd.Categorical([f"State {i}" for i in states]),
+        "city_name": pd.Categorical([f"City {i}" for i in cities]),
+        "Party_Name": pd.Categorical([f"Party {i}" for i in parties]),
+        "t_code": pd.Categorical(np.where(states < 8, "0", "1")),
+        "location_code": pd.Categorical(np.where(cities % 3 == 0, "100001", "100002")),
+        "item_name": pd.Categorical([f"Item {i}" for i in items]),
+        "invoice_date": pd.Timestamp("2020-04-01") + pd.to_timedelta(days, unit="D"),
+        "qty": rng.integers(1, 200, rows),
+        "Taxable_Value": rng.random(rows) * 10000,
+    })
+    df["invoice_value"] = df["Taxable_Value"] * 1.18
+    return df
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def run(df, repeat=5):
+    start = time.perf_counter()
+    cube = SalesCube(df)
+    build_time = time.perf_counter() - start
+    raw = FilterEngine(df)
+
+    first = df.iloc[0]
+    queries = {
+        "unfiltered": ({}, None),
+        "state": ({"state_name": first["state_name"]}, None),
+        "state+city": ({"state_name": first["state_name"], "city_name": first["city_name"]}, None),
+        "one year": ({}, ("2022-01-01", "2022-12-31")),
+        "state+t_code+month": ({"state_name": first["state_name"], "t_code": first["t_code"]},
+                               ("2022-03-01", "2022-03-31")),
+    }
+
+    print(f"rows={len(df):,} cube_rows={len(cube.frame):,} build={build_time:.3f}s")
+    print(f"{'query':<22}{'raw (ms)':>12}{'cube (ms)':>12}{'speedup':>10}")
+    for name, (equals, date_range) in queries.items():
+        raw_t = _time(lambda: raw.filter(equals, date_range)
+                      .groupby("item_name", observed=True)["invoice_value"].sum(), repeat)
+        cube_t = _time(lambda: cube.query(equals, date_range, "invoice_value"), repeat)
+        print(f"{name:<22}{raw_t * 1000:>12.2f}{cube_t * 1000:>12.2f}{raw_t / cube_t:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cube vs raw-row chart aggregation")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--extract", help="benchmark an existing extract instead of synthetic data")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frame = read_extract(args.extract) if args.extract else synthetic_frame(args.rows)
+    run(frame, args.repeat)
@@ -0,0 +1,181 @@
+# benchmarks/bench_dashboard.py
+# Server-side timings of the sales dashboard on synthetic data (see
+# synthetic_sales.py): loading the extract, filtering, every chart type,
+# the dropdown callbacks and both exports. Each run is stored in
+# benchmarks/results/dashboard.jsonl and compared with the last run at the
+# same scale, so a regression between versions shows up as a flagged row.
+#
+# "cold" timings start from empty in-process caches (the first request
+# after a worker starts or the extract changes); the others are medians of
+# repeated calls with the caches warm.
+#
+# Usage (from the repo root):
+#   python -m benchmarks.bench_dashboard                  # 1m rows
+#   python -m benchmarks.bench_dashboard --rows 10k
+#   python -m benchmarks.bench_dashboard --rows 50m --repeat 3 --no-pdf
+#
+# Generated extracts are kept in benchmarks/.work/<rows>-<seed>/ and
+# reused by later runs with the same rows and seed.
+import argparse
+import os
+import shutil
+import sys
+import time
+import numpy as np
+
+from benchmarks import results
+
+WORK_DIR = os.path.join(results.BENCH_DIR, ".work")
+CHART_TYPES = ['bar', 'pie', 'line', 'time']
+EXPORT_FORMATS = ['csv.gz', 'parquet', 'xlsx']
+METRIC = 'invoice_value'
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def _once(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def prepare(rows, seed):
+    """Switch to the run's work directory and make sure its extract exists.
+
+    Returns the seconds spent generating it (None when it was reused).
+    """
+    from extract_store import EXTRACT_PATH, read_manifest
+    from synthetic_sales import write_sales_data
+
+    workdir = os.path.join(WORK_DIR, f"{rows}-{seed}")
+    os.makedirs(workdir, exist_ok=True)
+    # The app's data/ paths are relative: everything this run reads or
+    # writes stays in the work directory
+    os.chdir(workdir)
+    manifest = read_manifest(EXTRACT_PATH) if os.path.exists(EXTRACT_PATH) else None
+    if manifest is not None and manifest['rows'] == rows:
+        return None
+    print(f"Generating {rows:,} rows in {workdir} ...")
+    seconds, _ = _once(lambda: write_sales_data(rows, EXTRACT_PATH, seed))
+    return seconds
+
+
+def scenarios(index):
+    """Filter sets (state, city, customer, tcode, locn, from, to) drawn from the data"""
+    state = index['states'][0]['value']
+    city = index['cities'][state][0]['value']
+    customer = index['customers'][(state, city)][0]['value']
+    tcode = index['t_codes'][0]['value']
+    locn = index['location_codes'][0]['value']
+    quarter = ("2023-01-01", "2023-03-31")
+    return {
+        'all': (None, None, None, None, None, None, None),
+        'state': (state, None, None, None, None, None, None),
+        'customer': (state, city, customer, None, None, None, None),
+        'quarter': (None, None, None, None, None, *quarter),
+        'tcode_location_quarter': (None, None, None, tcode, locn, *quarter),
+        'state_quarter': (state, None, None, None, None, *quarter),
+    }
+
+
+def run(rows, seed=0, repeat=5, pdf=True):
+    generated = prepare(rows, seed)
+
+    import app  # noqa: F401  (registers the Dash pages)
+    from data_cache import dataset_cache
+    from figure_cache import figure_cache
+    from job_runner import Job
+    from pages import sales
+
+    timings = {}
+    if generated is not None:
+        timings['generate'] = generated
+
+    def cold(name, fn):
+        dataset_cache.invalidate()
+        figure_cache.clear()
+        timings[name], result = _once(fn)
+        return result
+
+    # ---- Loading ----
+    cold('load_data.cold', lambda: sales.load_data(sales.DASHBOARD_COLUMNS))
+    timings['load_data.warm'] = _time(lambda: sales.load_data(sales.DASHBOARD_COLUMNS), repeat)
+    cold('load_cube.cold', sales.load_cube)
+    index = cold('dropdowns.index.cold', sales.load_index)
+    cases = scenarios(index)
+
+    # ---- Filtering (caches warm) ----
+    sales.load_data(sales.DASHBOARD_COLUMNS)
+    for name, filters in cases.items():
+        sales.filter_df(*filters, columns=sales.DASHBOARD_COLUMNS)
+        timings[f'filter_df.{name}'] = _time(lambda: sales.filter_df(*filters, columns=sales.DASHBOARD_COLUMNS),
+                                             repeat)
+
+    # ---- Charts ----
+    # Built: data caches warm, figure cache empty. Cached: the same request again.
+    sales.load_cube()
+    for chart in CHART_TYPES:
+        for name in ('all', 'state_quarter'):
+            args = (*cases[name], chart, METRIC)
+
+            def build():
+                figure_cache.clear()
+                return sales.update_graph(*args)
+            timings[f'update_graph.{chart}.{name}'] = _time(build, repeat)
+        timings[f'update_graph.{chart}.cached'] = _time(lambda: sales.update_graph(*args), repeat)
+
+    # ---- Dropdowns ----
+    state, city = cases['customer'][:2]
+    timings['dropdowns.states'] = _time(lambda: sales.populate_states(None), repeat)
+    timings['dropdowns.cities'] = _time(lambda: sales.populate_cities(state, None), repeat)
+    timings['dropdowns.customers'] = _time(lambda: sales.populate_customers(state, city, None), repeat)
+    timings['dropdowns.tcodes'] = _time(lambda: sales.populate_tcodes(None), repeat)
+    timings['dropdowns.locations'] = _time(lambda: sales.populate_locns(None), repeat)
+
+    # ---- Exports (one state, one quarter) ----
+    filters = cases['state_quarter']
+    for fmt in EXPORT_FORMATS:
+        seconds, path = _once(lambda: sales.build_data_export(Job("benchmark", "data-export"), *filters, fmt))
+        timings[f'export.data.{fmt}'] = seconds
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    if pdf:
+        try:
+            timings['export.pdf.bar'], _ = _once(
+                lambda: sales.build_pdf_export(Job("benchmark", "pdf-export"), *filters, 'bar', METRIC))
+        except Exception as e:
+            # Needs kaleido's headless Chrome
+            print(f"PDF export skipped: {e}")
+            timings['export.pdf.bar'] = None
+    return timings
+
+
+if __name__ == "__main__":
+    from synthetic_sales import SCALES, parse_rows
+
+    parser = argparse.ArgumentParser(description="Sales dashboard benchmarks on synthetic data")
+    parser.add_argument("--rows", default="1m", help=f"row count, e.g. 250000 or one of {', '.join(SCALES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-pdf", action="store_true", help="skip the PDF export (needs headless Chrome)")
+    parser.add_argument("--no-save", action="store_true", help="compare with the last run but don't store this one")
+    args = parser.parse_args()
+
+    # Repo modules have to stay importable after the switch to the work directory
+    sys.path.insert(0, results.REPO_DIR)
+    row_count = parse_rows(args.rows)
+    params = {'rows': row_count, 'seed': args.seed}
+    timings = run(row_count, args.seed, args.repeat, pdf=not args.no_pdf)
+
+    baseline = results.previous("dashboard", **params)
+    regressions = results.compare(timings, baseline)
+    if not args.no_save:
+        results.save("dashboard", timings, repeat=args.repeat, **params)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) more than {results.REGRESSION_RATIO:.0%} slower than the baseline")
@@ -0,0 +1,112 @@
+# benchmarks/bench_startup.py
+# Import-time profile of the app's cold start: what a new gunicorn worker
+# host pays before it can serve anything. Each run imports the module in a
+# fresh interpreter with `python -X importtime` and reports the wall time,
+# the heaviest third-party packages and the app's own modules.
+#
+# Usage (from the repo root):
+#   python -m benchmarks.bench_startup
+#   python -m benchmarks.bench_startup --module wsgi --repeat 5
+#   python -m benchmarks.bench_startup --json startup.json
+#   python -m benchmarks.bench_startup --save    # compare with and store in benchmarks/results/
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _app_modules():
+    names = {os.path.splitext(f)[0] for f in os.listdir(REPO_DIR) if f.endswith(".py")}
+    return names | {"pages"}
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        timing, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(timing), int(cumulative), depth))
+    return imports
+
+
+def profile_once(module):
+    # WARM_UP=0: time the imports, not wsgi's data loading
+    env = dict(os.environ, WARM_UP="0", PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def summarize(imports):
+    app_modules = _app_modules()
+    packages = defaultdict(int)
+    own = {}
+    for name, self_us, cumulative_us, _ in imports:
+        top = name.split(".")[0]
+        if top in app_modules:
+            own[name] = cumulative_us
+        else:
+            packages[top] += self_us
+    return {
+        'total_ms': sum(i[1] for i in imports) / 1000,
+        'packages_ms': {k: v / 1000 for k, v in sorted(packages.items(), key=lambda kv: -kv[1])},
+        'app_modules_ms': {k: v / 1000 for k, v in sorted(own.items(), key=lambda kv: -kv[1])},
+        'modules': len(imports),
+    }
+
+
+def run(module="app", repeat=3, top=15):
+    runs = [profile_once(module) for _ in range(repeat)]
+    # The fastest run has the least noise from the rest of the machine
+    wall, imports = min(runs, key=lambda r: r[0])
+    report = summarize(imports)
+    report.update({
+        'module': module,
+        'wall_s': wall,
+        'wall_s_runs': [r[0] for r in runs],
+        'python': platform.python_version(),
+        'recorded_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+
+    print(f"import {module}: {wall:.2f}s wall (best of {repeat}), "
+          f"{report['total_ms']:.0f} ms in {report['modules']} imports")
+    print(f"\n{'package':<32}{'self (ms)':>12}")
+    for name, ms in list(report['packages_ms'].items())[:top]:
+        print(f"{name:<32}{ms:>12.1f}")
+    print(f"\n{'app module':<32}{'cumulative (ms)':>18}")
+    for name, ms in list(report['app_modules_ms'].items())[:top]:
+        print(f"{name:<32}{ms:>18.1f}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import profile")
+    parser.add_argument("--module", default="app", help="module to import (app or wsgi)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="rows per table")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--save", action="store_true", help="compare with the last stored run and store this one")
+    args = parser.parse_args()
+
+    result = run(args.module, args.repeat, args.top)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.save:
+        from benchmarks import results
+        timings = {'import.wall': result['wall_s'], 'import.total': result['total_ms'] / 1000}
+        results.compare(timings, results.previous("startup", module=args.module))
+        results.save("startup", timings, module=args.module)
@@ -0,0 +1,90 @@
+# benchmarks/results.py
+# Stored benchmark results, so runs from different versions can be compared.
+# Each suite appends one JSON line per run to benchmarks/results/<suite>.jsonl,
+# tagged with the git revision, the machine and the run's parameters.
+import json
+import os
+import platform
+import subprocess
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# Slower than the baseline by more than this share is flagged...
+REGRESSION_RATIO = 0.2
+# ...unless it's within timer noise
+NOISE_FLOOR_SECONDS = 0.002
+
+
+def git_revision():
+    """Short HEAD revision, with -dirty for uncommitted changes (None outside git)"""
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return rev + ("-dirty" if dirty else "")
+
+
+def _path(suite):
+    return os.path.join(RESULTS_DIR, f"{suite}.jsonl")
+
+
+def history(suite):
+    """Every stored run of suite, oldest first"""
+    try:
+        with open(_path(suite)) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def previous(suite, **params):
+    """The latest stored run of suite with the same params (None if there is none)"""
+    for record in reversed(history(suite)):
+        if all(record.get('params', {}).get(k) == v for k, v in params.items()):
+            return record
+    return None
+
+
+def save(suite, timings, **params):
+    """Append a run's timings (name -> seconds) and return the stored record"""
+    record = {
+        'recorded_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': f"{platform.node()} ({platform.machine()}, {os.cpu_count()} CPUs)",
+        'params': params,
+        'timings': timings,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(_path(suite), "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return record
+
+
+def compare(timings, baseline):
+    """Print timings next to a baseline record's; returns the names that regressed"""
+    base = (baseline or {}).get('timings', {})
+    if baseline:
+        print(f"\nBaseline: {baseline.get('revision')} recorded {baseline.get('recorded_at')}")
+    print(f"{'benchmark':<40}{'now (ms)':>12}{'before (ms)':>14}{'change':>10}")
+    regressions = []
+    for name, seconds in timings.items():
+        before = base.get(name)
+        if seconds is None:
+            print(f"{name:<40}{'skipped':>12}")
+            continue
+        if before is None:
+            print(f"{name:<40}{seconds * 1000:>12.1f}{'-':>14}")
+            continue
+        change = (seconds - before) / before if before else 0.0
+        flag = ""
+        if change > REGRESSION_RATIO and seconds - before > NOISE_FLOOR_SECONDS:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<40}{seconds * 1000:>12.1f}{before * 1000:>14.1f}{change:>+9.0%}{flag}")
+    return regressions
@@ -0,0 +1,124 @@
+# chart_renderer.py
+import asyncio
+import bisect
+import io
+import os
+import threading
+import time
+
+# Static image rendering for chart exports.
+# Kaleido renders through a headless Chromium, and starting one costs
+# seconds, so each worker process keeps a single browser open with a few
+# renderer tabs and feeds it requests from its own event-loop thread.
+# Every request gets its own future and its own bytes back (nothing is
+# written to a shared file), several charts can be rendered into one
+# multi-page PDF report, and render times are kept in a histogram.
+
+RENDER_POOL_SIZE = int(os.environ.get("CHART_RENDER_POOL", 2))
+RENDER_TIMEOUT_SECONDS = int(os.environ.get("CHART_RENDER_TIMEOUT", 90))
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """Render times counted per latency bucket (milliseconds)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last bucket is "slower than all"
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def as_dict(self):
+        with self._lock:
+            labels = [f"<={b}ms" for b in self.buckets] + [f">{self.buckets[-1]}ms"]
+            return {
+                'buckets': dict(zip(labels, self.counts)),
+                'count': self.count,
+                'avg_ms': self.total_ms / self.count if self.count else 0.0,
+                'max_ms': self.max_ms,
+            }
+
+
+class ChartRenderer:
+    def __init__(self, size=RENDER_POOL_SIZE):
+        self.size = size
+        self.latency = LatencyHistogram()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._kaleido = None
+        self._started = None
+
+    def start(self):
+        """Start the browser in the background (idempotent)"""
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name="chart-renderer", daemon=True).start()
+            self._started = asyncio.run_coroutine_threadsafe(self._open(), self._loop)
+
+    async def _open(self):
+        import kaleido
+        browser = kaleido.Kaleido(n=self.size, timeout=RENDER_TIMEOUT_SECONDS)
+        await browser.open()
+        self._kaleido = browser
+
+    def _ready(self):
+        self.start()
+        started = self._started
+        try:
+            started.result(timeout=RENDER_TIMEOUT_SECONDS)
+        except Exception:
+            # Let the next request try a fresh browser (e.g. once Chrome is installed)
+            with self._lock:
+                if self._started is started and self._loop is not None:
+                    self._loop.call_soon_threadsafe(self._loop.stop)
+                    self._loop = None
+            raise
+
+    def _submit(self, fig, fmt, width, height):
+        fig_dict = fig.to_dict() if hasattr(fig, "to_dict") else fig
+        opts = {'format': fmt, 'width': width, 'height': height}
+        return asyncio.run_coroutine_threadsafe(self._timed(fig_dict, opts), self._loop)
+
+    async def _timed(self, fig_dict, opts):
+        start = time.perf_counter()
+        try:
+            return await self._kaleido.calc_fig(fig_dict, opts)
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+    def render(self, fig, fmt="pdf", width=1000, height=600):
+        """fig rendered as fmt (pdf, png, svg, ...); returns the bytes"""
+        self._ready()
+        return self._submit(fig, fmt, width, height).result(timeout=RENDER_TIMEOUT_SECONDS)
+
+    def render_report(self, figs, width=1000, height=600):
+        """Render figs concurrently into one PDF, one chart per page"""
+        from pypdf import PdfWriter
+
+        self._ready()
+        futures = [self._submit(fig, "pdf", width, height) for fig in figs]
+        writer = PdfWriter()
+        for future in futures:
+            writer.append(io.BytesIO(future.result(timeout=RENDER_TIMEOUT_SECONDS)))
+        out = io.BytesIO()
+        writer.write(out)
+        return out.getvalue()
+
+    def stats(self):
+        return {'pool_size': self.size, 'running': self._kaleido is not None, 'latency': self.latency.as_dict()}
+
+
+# Chromium is started by the first render, not on import
+chart_renderer = ChartRenderer()
@@ -1,4 +1,15 @@
 # config_store.py
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+import uuid
 
 # Global variable to store user-submitted config
 # Mock config to bypass config check
@@ -9,3 +20,211 @@ db_config = {
     "user": "mock",
     "password": "mock"
 }
+
+# ---------------------- Session Store ----------------------
+# Connection configs (and datasets, see extract_store) are kept per browser
+# session under data/sessions/<session>/ so analysts don't overwrite each
+# other and every worker process sees the same state. db_config above is
+# only the fallback for sessions that haven't configured a connection.
+#
+# Session ids are issued by the server and signed, so a client can't pick
+# another session's id. Configs hold the database password and are
+# stored encrypted; they expire SESSION_TTL_HOURS after they were entered,
+# and session directories idle for that long are removed together with
+# their pooled engines. Reading a session's config or dataset counts as
+# activity (see touch_session), not only writing its files.
+
+SESSIONS_DIR = os.path.join("data", "sessions")
+SESSION_TTL_SECONDS = int(float(os.environ.get("SESSION_TTL_HOURS", 12)) * 3600)
+# Idle sessions are looked for at most this often per process
+SWEEP_INTERVAL_SECONDS = 600
+# A session in use has its directory's mtime bumped at most this often per process
+TOUCH_INTERVAL_SECONDS = 60
+# Shared by every worker (and the refresh CLI); generated on first use
+# unless set
+SECRET_PATH = os.path.join(SESSIONS_DIR, ".secret")
+_SESSION_RE = re.compile(r"^([0-9a-f]{32})\.([0-9a-f]{32})$")
+CONFIG_FILE = "config.enc"
+
+# Keys persisted to disk; the engine is rebuilt per process from conn_str
+_CONFIG_KEYS = ('server', 'port', 'service', 'username', 'password', 'conn_str', 'thick_mode')
+
+_secret = None
+_secret_lock = threading.Lock()
+_last_sweep = 0.0
+_last_touch = {}
+
+
+def _server_secret():
+    global _secret
+    with _secret_lock:
+        if _secret is None:
+            if os.environ.get("SESSION_SECRET"):
+                _secret = os.environ["SESSION_SECRET"].encode()
+            else:
+                _secret = _load_secret()
+        return _secret
+
+
+def _load_secret():
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    try:
+        fd = os.open(SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(SECRET_PATH, "rb") as f:
+            return f.read()
+    secret = secrets.token_hex(32).encode()
+    with os.fdopen(fd, "wb") as f:
+        f.write(secret)
+    return secret
+
+
+def _sign(key):
+    return hmac.new(_server_secret(), key.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def new_session_id():
+    """A fresh signed session id"""
+    key = uuid.uuid4().hex
+    return f"{key}.{_sign(key)}"
+
+
+def _session_key(session_id):
+    """The directory key of a signed session id, or None if it isn't one of ours"""
+    match = _SESSION_RE.match(session_id) if isinstance(session_id, str) else None
+    if match is None or not hmac.compare_digest(match.group(2), _sign(match.group(1))):
+        return None
+    return match.group(1)
+
+
+def session_dir(session_id):
+    """Directory for a session's files, or None for a missing/forged id"""
+    key = _session_key(session_id)
+    if key is None:
+        return None
+    return os.path.join(SESSIONS_DIR, key)
+
+
+def touch_session(session_id):
+    """Mark a session as in use, so sweep_sessions keeps it while it is only being read"""
+    directory = session_dir(session_id)
+    if directory is None:
+        return
+    now = time.time()
+    if now - _last_touch.get(directory, 0.0) < TOUCH_INTERVAL_SECONDS:
+        return
+    try:
+        os.utime(directory)
+    except OSError:
+        # Nothing saved for this session yet
+        return
+    _last_touch[directory] = now
+
+
+def _fernet():
+    from cryptography.fernet import Fernet
+
+    key = hashlib.sha256(_server_secret() + b"config").digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def set_config(session_id, config):
+    """Persist a session's connection config, encrypted (readable by the owner only)"""
+    directory = session_dir(session_id)
+    if directory is None:
+        raise ValueError(f"Invalid session id: {session_id!r}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, CONFIG_FILE)
+    tmp_path = path + ".tmp"
+    token = _fernet().encrypt(json.dumps({k: config[k] for k in _CONFIG_KEYS if k in config}).encode())
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(token)
+    os.replace(tmp_path, path)
+
+
+def _read_config(path):
+    """(config, age in seconds) of a stored config, or (None, None) if unreadable"""
+    from cryptography.fernet import InvalidToken
+
+    try:
+        with open(path, "rb") as f:
+            token = f.read()
+        fernet = _fernet()
+        config = json.loads(fernet.decrypt(token))
+        return config, time.time() - fernet.extract_timestamp(token)
+    except (OSError, ValueError, InvalidToken):
+        return None, None
+
+
+def _forget_config(path, config):
+    from db_pool import dispose_engine
+
+    if config and config.get('conn_str'):
+        dispose_engine(config['conn_str'])
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def get_config(session_id):
+    """The session's connection config with a pooled 'engine', else db_config"""
+    sweep_sessions()
+    directory = session_dir(session_id)
+    if directory is None:
+        return db_config
+    touch_session(session_id)
+    path = os.path.join(directory, CONFIG_FILE)
+    config, age = _read_config(path)
+    if config is None:
+        return db_config
+    if age > SESSION_TTL_SECONDS:
+        # Expired: the password has to be entered again
+        _forget_config(path, config)
+        return db_config
+
+    from db_pool import get_engine
+    config['engine'] = get_engine(config['conn_str'], config)
+    return config
+
+
+def _last_activity(directory):
+    latest = os.path.getmtime(directory)
+    for entry in os.scandir(directory):
+        try:
+            latest = max(latest, entry.stat().st_mtime)
+        except OSError:
+            pass
+    return latest
+
+
+def sweep_sessions(force=False):
+    """Remove session directories idle for longer than SESSION_TTL_SECONDS.
+
+    Runs at most once per SWEEP_INTERVAL_SECONDS per process unless forced;
+    returns the number of sessions removed.
+    """
+    global _last_sweep
+    now = time.time()
+    if not force and now - _last_sweep < SWEEP_INTERVAL_SECONDS:
+        return 0
+    _last_sweep = now
+    removed = 0
+    try:
+        entries = list(os.scandir(SESSIONS_DIR))
+    except OSError:
+        return 0
+    for entry in entries:
+        if not entry.is_dir():
+            continue
+        try:
+            if now - _last_activity(entry.path) <= SESSION_TTL_SECONDS:
+                continue
+        except OSError:
+            continue
+        path = os.path.join(entry.path, CONFIG_FILE)
+        _forget_config(path, _read_config(path)[0])
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    return removed
@@ -0,0 +1,212 @@
+# data_cache.py
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# Shared in-process cache for dashboard datasets.
+# Each entry keeps the parsed DataFrame together with the file signature
+# (mtime + size) it was built from, so a rewritten extract is picked up on
+# the next read while unchanged files are served straight from memory.
+# Entries are evicted least-recently-used once their combined size passes
+# the memory budget, so many sessions' datasets can share one process.
+# The budget is per process: with several gunicorn workers the datasets
+# can take up to workers x DATASET_CACHE_MAX_MB in total.
+
+CACHE_MAX_BYTES = int(os.environ.get("DATASET_CACHE_MAX_MB", 2048)) * 1024 * 1024
+
+
+_CONTAINERS = (dict, list, tuple, set, frozenset)
+
+
+def _sizeof(obj):
+    # DataFrames report their own footprint; derived structures may expose
+    # nbytes; plain containers (e.g. the dropdown hierarchy) are walked
+    if hasattr(obj, "memory_usage"):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, _CONTAINERS):
+        return _container_bytes(obj)
+    return int(getattr(obj, "nbytes", 0))
+
+
+def _container_bytes(obj):
+    """Size of nested containers and everything in them; shared objects count once"""
+    seen = set()
+    total = 0
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, _CONTAINERS):
+            pending.extend(item)
+    return total
+
+
+def _entry_bytes(entry):
+    # Frames and plain containers are measured once, when loaded. Other
+    # structures (cubes, derived indexes) may grow after they are built -
+    # FilterEngine builds its postings lazily - so they are measured again
+    # on every count.
+    data = entry['data']
+    fixed = hasattr(data, "memory_usage") or isinstance(data, _CONTAINERS)
+    size = entry['bytes'] if fixed else _sizeof(data)
+    return size + sum(_sizeof(value) for value in entry['derived'].values())
+
+
+class DatasetCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        # One lock per key so a slow load doesn't block other datasets
+        self._load_locks = {}
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def signature(path):
+        """Return (mtime_ns, size) for path, or None if it does not exist"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _fresh(self, key, sig):
+        entry = self._entries.get(key)
+        if entry is not None and sig is not None and entry['signature'] == sig:
+            self._entries.move_to_end(key)
+            return entry
+        return None
+
+    def _load_lock(self, key):
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def get(self, path, loader, variant=None, refresher=None):
+        """Return the cached frame for path, calling loader(path) when stale.
+
+        variant distinguishes different projections of the same file
+        (e.g. a column subset); all variants share the file's signature.
+        When the file changed, refresher(old_data, old_signature, signature)
+        may return an updated copy of the stale data instead of a full
+        reload (or None to fall back to loader).
+        """
+        key = (os.path.abspath(path), variant)
+        sig = self.signature(path)
+        with self._lock:
+            entry = self._fresh(key, sig)
+            if entry is not None:
+                self.hits += 1
+                # It may have grown since the last count
+                self._evict(keep=key)
+                return entry['data']
+
+        with self._load_lock(key):
+            with self._lock:
+                # Another thread may have loaded it while we waited
+                entry = self._fresh(key, sig)
+                if entry is not None:
+                    self.hits += 1
+                    return entry['data']
+                stale = self._entries.get(key)
+                if stale is not None:
+                    self.reloads += 1
+                else:
+                    self.misses += 1
+
+            data = None
+            if refresher is not None and stale is not None and sig is not None:
+                data = refresher(stale['data'], stale['signature'], sig)
+            if data is None:
+                data = loader(path)
+
+            with self._lock:
+                if sig is None:
+                    # Nothing on disk to key against; don't keep a stale entry around
+                    self._entries.pop(key, None)
+                else:
+                    self._entries[key] = {'signature': sig, 'data': data, 'derived': {},
+                                          'bytes': _sizeof(data)}
+                    self._entries.move_to_end(key)
+                    self._evict(keep=key)
+            return data
+
+    def derive(self, path, loader, name, builder, variant=None):
+        """Return builder(frame) for the current version of path.
+
+        Derived structures (indexes, aggregates, ...) are kept on the cache
+        entry, so they are built once per dataset version and dropped
+        together with the frame when the file changes.
+        """
+        key = (os.path.abspath(path), variant)
+        data = self.get(path, loader, variant)
+        with self._load_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None or entry['data'] is not data:
+                    entry = None
+                elif name in entry['derived']:
+                    # It may have grown since the last count
+                    self._evict(keep=key)
+                    return entry['derived'][name]
+
+            value = builder(data)
+
+            if entry is not None:
+                with self._lock:
+                    entry['derived'][name] = value
+                    self._evict(keep=key)
+            return value
+
+    def _evict(self, keep=None):
+        sizes = {key: _entry_bytes(entry) for key, entry in self._entries.items()}
+        total = sum(sizes.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._entries.pop(key)
+            total -= sizes[key]
+            self._load_locks.pop(key, None)
+            self.evictions += 1
+
+    def version(self, path, variant=None):
+        """Signature of the cached copy of path (None if not loaded)"""
+        with self._lock:
+            entry = self._entries.get((os.path.abspath(path), variant))
+            return entry['signature'] if entry else None
+
+    def invalidate(self, path=None):
+        """Drop every cached variant of path (or everything when path is None)"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                return
+            target = os.path.abspath(path)
+            for key in [k for k in self._entries if k[0] == target]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': sum(_entry_bytes(e) for e in self._entries.values()),
+            }
+
+
+# DATASET_CACHE_MAX_MB applies to this instance, i.e. once per worker process
+dataset_cache = DatasetCache()
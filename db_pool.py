@@ -0,0 +1,218 @@
+# db_pool.py
+import os
+import threading
+import time
+from oracle_client import ensure_thick_mode
+
+# One pooled SQLAlchemy engine per connection string, shared by the config
+# page, the SQL Query Interface and the main.py REPL. Handshakes to the ERP
+# database are expensive, so connections are kept open and reused instead
+# of building a new engine for every click.
+#
+# With DB_NATIVE_POOL=1 connections come from a python-oracledb session
+# pool instead of SQLAlchemy's QueuePool.
+#
+# The Oracle client (thick mode) is set up just before the first
+# connection is opened, not when the app starts. SQLAlchemy itself is
+# imported with the first engine.
+
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 3600))
+POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") != "0"
+NATIVE_POOL = os.environ.get("DB_NATIVE_POOL", "0") == "1"
+# Parsed statements kept per Oracle connection; the live dashboard re-runs a
+# small set of bind-variable statements
+STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STMT_CACHE_SIZE", 50))
+
+_engines = {}
+_lock = threading.Lock()
+_timed_pool_class = None
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.connections_created = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds):
+        self.wait_seconds += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def as_dict(self):
+        return {
+            'connections_created': self.connections_created,
+            'checked_out': self.checked_out,
+            'checkouts': self.checkouts,
+            'avg_wait_ms': 1000 * self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+            'max_wait_ms': 1000 * self.max_wait_seconds,
+        }
+
+
+def _timed_queue_pool():
+    """TimedQueuePool, defined on first use so SQLAlchemy isn't loaded at startup"""
+    global _timed_pool_class
+    if _timed_pool_class is not None:
+        return _timed_pool_class
+    from sqlalchemy.pool import QueuePool
+
+    class TimedQueuePool(QueuePool):
+        """QueuePool that records how long each checkout waited for a connection"""
+
+        def __init__(self, *args, metrics=None, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.metrics = metrics
+
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                self.metrics.record_wait(time.perf_counter() - start)
+
+        def recreate(self):
+            # Keep the same metrics object when SQLAlchemy rebuilds the pool
+            new_pool = super().recreate()
+            new_pool.metrics = self.metrics
+            return new_pool
+
+    _timed_pool_class = TimedQueuePool
+    return _timed_pool_class
+
+
+def _attach_metrics(engine, metrics):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        metrics.connections_created += 1
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        metrics.checked_out += 1
+        metrics.checkouts += 1
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        metrics.checked_out -= 1
+
+
+def _init_client_on_connect(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "do_connect")
+    def _on_do_connect(dialect, conn_rec, cargs, cparams):
+        ensure_thick_mode()
+
+
+def _native_engine(conn_str, params, metrics):
+    import oracledb
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+
+    ensure_thick_mode()
+    session_pool = oracledb.create_pool(
+        user=params['username'], password=params['password'],
+        dsn=f"{params['server']}:{params['port']}/{params['service']}",
+        min=1, max=POOL_SIZE + MAX_OVERFLOW, increment=1,
+        timeout=POOL_RECYCLE, wait_timeout=POOL_TIMEOUT * 1000,
+        ping_interval=60 if POOL_PRE_PING else -1,
+        stmtcachesize=STATEMENT_CACHE_SIZE,
+    )
+
+    def acquire():
+        start = time.perf_counter()
+        try:
+            return session_pool.acquire()
+        finally:
+            metrics.record_wait(time.perf_counter() - start)
+
+    # The session pool does the pooling; SQLAlchemy just hands connections back
+    engine = create_engine("oracle+oracledb://", creator=acquire, poolclass=NullPool)
+    engine.session_pool = session_pool
+    return engine
+
+
+def get_engine(conn_str, params=None):
+    """Shared pooled engine for conn_str, created on first use.
+
+    params (server/port/service/username/password) is only needed for the
+    native oracledb session pool.
+    """
+    with _lock:
+        engine = _engines.get(conn_str)
+        if engine is not None:
+            return engine
+
+        from sqlalchemy import create_engine
+        metrics = PoolMetrics()
+        if NATIVE_POOL and params and conn_str.startswith("oracle"):
+            engine = _native_engine(conn_str, params, metrics)
+        else:
+            engine = create_engine(
+                conn_str,
+                poolclass=_timed_queue_pool(),
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_timeout=POOL_TIMEOUT,
+                pool_recycle=POOL_RECYCLE,
+                pool_pre_ping=POOL_PRE_PING,
+                connect_args={'stmtcachesize': STATEMENT_CACHE_SIZE} if conn_str.startswith("oracle") else {},
+            )
+            engine.pool.metrics = metrics
+            if conn_str.startswith("oracle"):
+                _init_client_on_connect(engine)
+        _attach_metrics(engine, metrics)
+        engine.pool_metrics = metrics
+        _engines[conn_str] = engine
+        return engine
+
+
+def dispose_engine(conn_str):
+    with _lock:
+        engine = _engines.pop(conn_str, None)
+    if engine is not None:
+        engine.dispose()
+        session_pool = getattr(engine, "session_pool", None)
+        if session_pool is not None:
+            session_pool.close(force=True)
+
+
+def interrupt(dbapi_conn):
+    """Abort the statement running on a raw DBAPI connection"""
+    # oracledb exposes cancel(), sqlite interrupt()
+    for name in ("cancel", "interrupt"):
+        hook = getattr(dbapi_conn, name, None)
+        if hook:
+            hook()
+            return
+
+
+def pool_stats(engine):
+    """Metrics for a pooled engine, plus SQLAlchemy's own pool status line"""
+    metrics = getattr(engine, "pool_metrics", None)
+    stats = metrics.as_dict() if metrics else {}
+    stats['pool_status'] = engine.pool.status()
+    session_pool = getattr(engine, "session_pool", None)
+    if session_pool is not None:
+        stats['pool_status'] = f"Session pool: {session_pool.busy} busy / {session_pool.opened} open"
+    return stats
+
+
+def reset_after_fork():
+    """Forget connections inherited from a parent process (e.g. gunicorn preload).
+
+    Sockets must never be shared between worker processes, so each worker
+    starts with empty pools and opens its own connections.
+    """
+    with _lock:
+        for conn_str, engine in list(_engines.items()):
+            if getattr(engine, "session_pool", None) is not None:
+                # oracledb session pools can't be carried across a fork
+                del _engines[conn_str]
+            else:
+                engine.dispose(close=False)
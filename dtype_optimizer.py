@@ -0,0 +1,98 @@
+# dtype_optimizer.py
+import os
+import numpy as np
+import pandas as pd
+
+# Compact in-memory dtypes for sales extracts.
+# Query results arrive as one string per cell for every dimension and as
+# 64-bit numbers for every measure. Repeated text (customers, addresses,
+# items, ...) becomes categorical and measures are narrowed only where
+# every value survives the round trip. Column names, date parsing and the
+# declared dtypes are extract_schema's job; this runs on conformed frames.
+#
+# Fractional measures stay float64: float32 keeps single values only
+# approximately and loses cents once they are summed. Integer columns are
+# narrowed, but some pandas groupbys sum in the column's own dtype, so
+# aggregations go through widen() first.
+
+# Text columns with at most this share of distinct values become categorical
+CATEGORY_MAX_RATIO = float(os.environ.get("DTYPE_CATEGORY_MAX_RATIO", 0.5))
+
+
+def frame_bytes(df):
+    """Resident size of df, including the strings it points to"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _is_text(values):
+    return pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)
+
+
+def _compact_category(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    # An all-null column has no type to go by (it would become a
+    # dictionary of nulls, which later values can't be cast to)
+    if _is_text(values) and values.notna().any():
+        if values.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(values):
+            return values.astype("category")
+    return values
+
+
+def _downcast(values):
+    """values in the narrowest numeric dtype that holds every value exactly"""
+    if pd.api.types.is_bool_dtype(values) or not pd.api.types.is_numeric_dtype(values):
+        return values
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_numeric(values, downcast="integer")
+    if pd.api.types.is_float_dtype(values):
+        array = values.to_numpy()
+        if len(array) and np.isfinite(array).all() and (array == np.trunc(array)).all() \
+                and np.abs(array).max() < 2 ** 53:
+            # Whole numbers stored as floats (e.g. Oracle NUMBER quantities)
+            return pd.to_numeric(values.astype(np.int64), downcast="integer")
+    return values
+
+
+def widen(data):
+    """Series/DataFrame with narrowed integers back as int64, for summing"""
+    if isinstance(data, pd.Series):
+        return data.astype(np.int64) if _is_narrow_int(data) else data
+    narrow = {col: np.int64 for col in data.columns if _is_narrow_int(data[col])}
+    return data.astype(narrow) if narrow else data
+
+
+def _is_narrow_int(values):
+    return pd.api.types.is_integer_dtype(values) and not pd.api.types.is_extension_array_dtype(values) \
+        and values.dtype.itemsize < 8
+
+
+def optimize_dtypes(df, downcast=True):
+    """df with categorical text and (with downcast) narrowed numbers.
+
+    Returns a new frame; df is not modified. downcast=False keeps numeric
+    dtypes as they are, for writers that need a stable schema across chunks.
+    """
+    df = df.copy()
+    for col in df.columns:
+        values = df[col]
+        converted = _compact_category(values)
+        if downcast:
+            converted = _downcast(converted)
+        if converted is not values:
+            df[col] = converted
+    return df
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:,.0f} {unit}" if unit == "B" else f"{n:,.1f} {unit}"
+        n /= 1024
+    return f"{n:,.1f} GB"
+
+
+def format_report(report):
+    before, after = report['before'], report['after']
+    ratio = f" ({before / after:.1f}x smaller)" if after else ""
+    return f"{format_bytes(before)} -> {format_bytes(after)}{ratio}"
@@ -1,58 +1,375 @@
 # erp_salesdatagen.py
+import csv
+import io
 import pandas as pd
 import sqlite3
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, request, jsonify
 import os
+from extract_schema import SALES_SCHEMA, SchemaError, parse_datetime
 
 app = Flask(__name__)
 DB = 'erp_sales.db'
 TABLE = 'sales_data'
 
+# Rows parsed from an upload and inserted per executemany call
+UPLOAD_CHUNK_ROWS = int(os.environ.get('UPLOAD_CHUNK_ROWS', 100000))
+SQLITE_CACHE_MB = int(os.environ.get('SQLITE_CACHE_MB', 256))
+# An invoice line: invoice numbers are unique per company and location
+KEY_COLUMNS = [c.strip() for c in os.environ.get(
+    'UPLOAD_KEY_COLUMNS', 't_code,location_code,Invoice_Number,item_name').split(',') if c.strip()]
+UPLOAD_MODES = ('replace', 'append', 'upsert')
+# Rows fetched from the cursor per block of a /gen_csv response (and per Parquet row group)
+EXPORT_FETCH_ROWS = int(os.environ.get('EXPORT_FETCH_ROWS', 50000))
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# invoice_date is kept as uploaded ('DD-MON-YYYY' from SQL query.txt);
+# invoice_day is the same date as YYYY-MM-DD text, which sorts and
+# compares correctly, so date filters are plain indexed range scans
+DAY_COLUMN = 'invoice_day'
+DATE_FORMATS = SALES_SCHEMA['invoice_date']['formats']
+
+COLUMNS = {
+    'state_name': 'TEXT', 'city_name': 'TEXT', 'Party_Name': 'TEXT', 'item_name': 'TEXT',
+    'qty': 'REAL', 'Taxable_Value': 'REAL', 'cgst_amount': 'REAL', 'sgst_amount': 'REAL',
+    'igst_amount': 'REAL', 'tcs_amount': 'REAL', 'invoice_value': 'REAL',
+    't_code': 'TEXT', 'location_code': 'TEXT', 'invoice_date': 'TEXT', 'Invoice_Number': 'TEXT',
+    DAY_COLUMN: 'TEXT',
+}
+KEY_INDEX = 'idx_sales_key'
+INDEXES = {
+    KEY_INDEX: KEY_COLUMNS,
+    # /gen_csv filters narrow the rows through an index: t_code and
+    # location with a day range, location alone with a day range, or the
+    # day range alone. t_code without a location narrows on t_code only.
+    # The rows themselves are then read from the table by rowid; an index
+    # covering the exported columns would be a second copy of the table.
+    'idx_sales_filter': ['t_code', 'location_code', DAY_COLUMN],
+    'idx_sales_location': ['location_code', DAY_COLUMN],
+    'idx_sales_day': [DAY_COLUMN],
+}
+
+
+def connect():
+    # Transactions are explicit (BEGIN/COMMIT), not opened by the driver
+    conn = sqlite3.connect(DB, timeout=60, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _table_columns(conn):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({TABLE})')]
+
+
+def _create_table(conn):
+    columns = ', '.join(f'{_quote(c)} {t}' for c, t in COLUMNS.items())
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {TABLE} ({columns})')
+    existing = {c.lower() for c in _table_columns(conn)}
+    for col, kind in COLUMNS.items():
+        if col.lower() not in existing:
+            conn.execute(f'ALTER TABLE {TABLE} ADD COLUMN {_quote(col)} {kind}')
+            if col == DAY_COLUMN and 'invoice_date' in existing:
+                _backfill_days(conn)
+
+
+def _invoice_days(values):
+    """invoice_date values as YYYY-MM-DD text (None where missing).
+
+    Raises SchemaError for dates in none of the schema's formats.
+    """
+    days = parse_datetime(values, DATE_FORMATS).dt.strftime('%Y-%m-%d')
+    return days.astype(object).where(days.notna(), None)
+
+
+def _backfill_days(conn):
+    # Tables loaded before invoice_day existed: each distinct date is
+    # parsed once; dates that don't parse are left without a day
+    dates = [r[0] for r in conn.execute(f'SELECT DISTINCT invoice_date FROM {TABLE} WHERE invoice_date IS NOT NULL')]
+    try:
+        days = _invoice_days(pd.Series(dates, dtype=object)).tolist()
+    except SchemaError:
+        days = []
+        for date in dates:
+            try:
+                days.append(_invoice_days(pd.Series([date], dtype=object))[0])
+            except SchemaError:
+                days.append(None)
+    conn.execute('CREATE TEMP TABLE day_map (invoice_date TEXT PRIMARY KEY, day TEXT)')
+    conn.executemany('INSERT INTO temp.day_map VALUES (?, ?)', zip(dates, days))
+    conn.execute(f'UPDATE {TABLE} SET {DAY_COLUMN} = '
+                 f'(SELECT day FROM temp.day_map m WHERE m.invoice_date = {TABLE}.invoice_date)')
+    conn.execute('DROP TABLE temp.day_map')
+
+
+def _create_indexes(conn):
+    existing = {c.lower() for c in _table_columns(conn)}
+    for name, columns in INDEXES.items():
+        if all(c.lower() in existing for c in columns):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {TABLE} ({", ".join(map(_quote, columns))})')
+
+
+def _drop_indexes(conn, keep=()):
+    for name in INDEXES:
+        if name not in keep:
+            conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+
 def init_db():
-    conn = sqlite3.connect(DB)
-    conn.execute(f'''
-      CREATE TABLE IF NOT EXISTS {TABLE} (
-        state_name TEXT, city_name TEXT, Party_Name TEXT, item_name TEXT,
-        qty INTEGER, Taxable_Value REAL, cgst_amount REAL, sgst_amount REAL,
-        igst_amount REAL, tcs_amount REAL, invoice_value REAL,
-        t_code TEXT, location_code TEXT, invoice_date TEXT
-      )
-    ''')
-    conn.commit(); conn.close()
+    conn = connect()
+    _create_table(conn)
+    _create_indexes(conn)
+    conn.close()
+
+
+def _upload_columns(conn, header):
+    """Table column for each CSV column (matched case-insensitively); new ones are added as TEXT"""
+    table = {c.lower(): c for c in _table_columns(conn)}
+    columns = []
+    for name in header:
+        name = str(name).strip()
+        col = table.get(name.lower())
+        if col is None:
+            conn.execute(f'ALTER TABLE {TABLE} ADD COLUMN {_quote(name)} TEXT')
+            col = table[name.lower()] = name
+        columns.append(col)
+    duplicates = sorted({c for c in columns if columns.count(c) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate columns in upload: {', '.join(duplicates)}")
+    return columns
+
+
+def _rows(chunk):
+    """Parameter tuples for executemany, with None for missing values"""
+    columns = []
+    for col in chunk:
+        values = chunk[col]
+        if values.hasnans:
+            values = values.where(values.notna(), None)
+        columns.append(values.tolist())
+    return zip(*columns)
+
+
+def _load(conn, stream, mode):
+    """Insert the CSV in stream chunk by chunk; the caller owns the transaction"""
+    # Secondary indexes are rebuilt once at the end instead of being
+    # updated row by row; upserts need the key index to find old rows
+    _drop_indexes(conn, keep=(KEY_INDEX,) if mode == 'upsert' else ())
+    if mode == 'replace':
+        conn.execute(f'DELETE FROM {TABLE}')
+
+    rows = 0
+    columns = insert = None
+    # Values are bound as text and converted by the columns' INTEGER/REAL affinity
+    reader = pd.read_csv(stream, chunksize=UPLOAD_CHUNK_ROWS, dtype=object, keep_default_na=False, na_values=[''])
+    for chunk in reader:
+        if columns is None:
+            columns = _upload_columns(conn, chunk.columns)
+        chunk.columns = columns
+        if 'invoice_date' in chunk:
+            chunk[DAY_COLUMN] = _invoice_days(chunk['invoice_date'])
+        if insert is None:
+            names = ', '.join(map(_quote, chunk.columns))
+            params = ', '.join('?' * len(chunk.columns))
+            if mode == 'upsert':
+                missing = [c for c in KEY_COLUMNS if c.lower() not in {n.lower() for n in chunk.columns}]
+                if missing:
+                    raise ValueError(f"Upsert needs the key columns {', '.join(missing)}")
+                if KEY_INDEX not in {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}:
+                    _create_indexes(conn)
+                conn.execute('DROP TABLE IF EXISTS temp.upload_stage')
+                conn.execute(f'CREATE TEMP TABLE upload_stage AS SELECT {names} FROM {TABLE} WHERE 0')
+                match = ' AND '.join(f't.{_quote(c)} = s.{_quote(c)}' for c in KEY_COLUMNS)
+                insert = f'INSERT INTO temp.upload_stage ({names}) VALUES ({params})'
+            else:
+                insert = f'INSERT INTO {TABLE} ({names}) VALUES ({params})'
+        if mode == 'upsert':
+            # Last occurrence of a key wins, within the upload and over the table.
+            # Rows with an empty key column never match and are appended.
+            chunk = chunk.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+            conn.execute('DELETE FROM temp.upload_stage')
+            conn.executemany(insert, _rows(chunk))
+            conn.execute(f'DELETE FROM {TABLE} WHERE rowid IN (SELECT t.rowid FROM {TABLE} t '
+                         f'JOIN temp.upload_stage s ON {match})')
+            conn.execute(f'INSERT INTO {TABLE} ({names}) SELECT {names} FROM temp.upload_stage')
+        else:
+            conn.executemany(insert, _rows(chunk))
+        rows += len(chunk)
+
+    if mode == 'upsert' and insert is not None:
+        conn.execute('DROP TABLE temp.upload_stage')
+    _create_indexes(conn)
+    return rows
+
+
+def ingest(stream, mode='replace'):
+    """Load a CSV stream into the sales table in one transaction.
+
+    replace: the upload becomes the table's contents; append: rows are
+    added; upsert: rows replace existing rows with the same KEY_COLUMNS.
+    Returns the number of rows read from the upload.
+    """
+    if mode not in UPLOAD_MODES:
+        raise ValueError(f"mode must be one of {', '.join(UPLOAD_MODES)}")
+    conn = connect()
+    try:
+        _create_table(conn)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = _load(conn, stream, mode)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+    return rows
+
 
 @app.route('/upload', methods=['POST'])
 def upload_csv():
-    # 1) Receive CSV
+    # 1) Receive CSV (spooled to a temp file by werkzeug, read in chunks)
     f = request.files.get('file')
     if not f:
         return jsonify({'error':'No file uploaded'}),400
-    df = pd.read_csv(f)
+    mode = request.form.get('mode') or request.args.get('mode') or 'replace'
 
     # 2) Write to SQLite
-    conn = sqlite3.connect(DB)
-    df.to_sql(TABLE, conn, if_exists='replace', index=False)
-    conn.close()
-    return jsonify({'status':'OK, data loaded to DB'}),200
+    start = time.perf_counter()
+    try:
+        rows = ingest(f.stream, mode)
+    except (ValueError, pd.errors.ParserError) as e:
+        return jsonify({'error': str(e)}),400
+    return jsonify({'status':'OK, data loaded to DB', 'mode': mode, 'rows': rows,
+                    'seconds': round(time.perf_counter() - start, 2)}),200
+
+def export_query(conn, args):
+    """(SELECT, bound parameters, columns) for /gen_csv's filters.
+
+    Raises ValueError for a date that can't be read.
+    """
+    where, params = [], []
+    for p in ('t_code', 'location_code'):
+        v = args.get(p)
+        if v:
+            where.append(f'{p} = ?')
+            params.append(v)
+    for p, op in (('from_date', '>='), ('to_date', '<=')):
+        v = args.get(p)
+        if v:
+            where.append(f'{DAY_COLUMN} {op} ?')
+            params.append(pd.Timestamp(v).strftime('%Y-%m-%d'))
+    columns = [(name, kind) for _, name, kind, *_ in conn.execute(f'PRAGMA table_info({TABLE})')
+               if name != DAY_COLUMN]
+    sql = f"SELECT {', '.join(_quote(c) for c, _ in columns)} FROM {TABLE}"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    return sql, params, columns
+
+
+def _csv_blocks(cursor, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow([c for c, _ in columns])
+    yield buffer.getvalue()
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_ROWS)
+        if not rows:
+            break
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+class _BlockSink:
+    """Write-only file object collecting what ParquetWriter writes until it is taken"""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def _parquet_blocks(cursor, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    # INTEGER affinity still stores fractions as REAL (qty in KGS or MTR,
+    # in tables created when qty was declared INTEGER), so both are float64
+    # like the CSV export's values
+    types = {'INTEGER': pa.float64(), 'REAL': pa.float64()}
+    schema = pa.schema([(c, types.get(kind.upper(), pa.string())) for c, kind in columns])
+    sink = _BlockSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_ROWS)
+        if not rows:
+            break
+        # One row group per fetched block
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
 
 @app.route('/gen_csv', methods=['GET'])
 def gen_csv():
-    # 3) Parameterized SQL
-    sql = "SELECT * FROM sales_data WHERE 1=1 "
-    for p in ('t_code','location_code','from_date','to_date'):
-        v = request.args.get(p)
-        if v:
-            if p in ('from_date','to_date'):
-                op = '>=' if p=='from_date' else '<='
-                sql += f" AND date(invoice_date){op}date('{v}') "
-            else:
-                sql += f" AND {p}='{v}' "
-    # 4) Export CSV
-    conn = sqlite3.connect(DB)
-    df = pd.read_sql(sql, conn)
-    conn.close()
-    df.to_csv('erp_sales_data.csv', index=False)
-    return jsonify({'rows':len(df)}),200
+    # 3) Parameterized SQL over the indexed columns
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}),400
+    conn = connect()
+    try:
+        sql, params, columns = export_query(conn, request.args)
+        cursor = conn.execute(sql, params)
+    except ValueError as e:
+        conn.close()
+        return jsonify({'error': str(e)}),400
+    except BaseException:
+        conn.close()
+        raise
+
+    # 4) Stream the export straight from the cursor, one block at a time
+    def blocks():
+        try:
+            yield from (_parquet_blocks if fmt == 'parquet' else _csv_blocks)(cursor, columns)
+        finally:
+            conn.close()
+
+    mimetype = 'application/vnd.apache.parquet' if fmt == 'parquet' else 'text/csv'
+    return Response(blocks(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=erp_sales_data.{fmt}'})
 
 if __name__ == '__main__':
+    init_db()
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5050)))
 
@@ -0,0 +1,233 @@
+# export_store.py
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask import Blueprint, Response, abort, request
+from extract_schema import conform
+from extract_store import ExtractWriter
+from job_runner import JOB_RETENTION_SECONDS, job_runner, DONE
+
+# Streaming data exports for the dashboards.
+# The selected rows are read from the extract a batch at a time and
+# written straight to a per-job temp file, so an export never holds the
+# whole selection (or an in-memory workbook) at once. The finished file
+# is streamed to the browser from a plain Flask route rather than
+# base64-encoded into a callback response.
+#
+# Each export gets its own directory under EXPORTS_DIR. It is removed once
+# the file has been sent, when the export fails or is cancelled, and, for
+# files nobody downloads, once the job (and with it the download link)
+# has expired.
+
+EXPORT_BATCH_ROWS = int(os.environ.get("EXPORT_BATCH_ROWS", 50000))
+EXCEL_MAX_ROWS = 1048576  # per sheet, including the header row
+EXPORTS_DIR = os.path.join(tempfile.gettempdir(), "erp_exports")
+
+
+def iter_selection(path, rows=None, expected_rows=None, batch_rows=EXPORT_BATCH_ROWS, row_groups=None):
+    """Yield the given row ids of an extract as DataFrame chunks.
+
+    rows must be sorted ascending (None selects everything). Ids count
+    through row_groups (all row groups when None) in order. expected_rows
+    is the row count the ids were computed against; a mismatch means the
+    extract was rewritten in between.
+    """
+    if path.endswith(".csv"):
+        yield from _iter_csv_selection(path, rows, batch_rows)
+        return
+
+    parquet = pq.ParquetFile(path)
+    if row_groups is None:
+        row_groups = range(parquet.num_row_groups)
+    total_rows = sum(parquet.metadata.row_group(i).num_rows for i in row_groups)
+    if expected_rows is not None and total_rows != expected_rows:
+        raise ValueError("The dataset changed while preparing the export; please try again")
+
+    offset = 0
+    for i in row_groups:
+        group_rows = parquet.metadata.row_group(i).num_rows
+        lo = 0 if rows is None else np.searchsorted(rows, offset)
+        hi = 0 if rows is None else np.searchsorted(rows, offset + group_rows)
+        if rows is None or hi > lo:
+            # Row groups without selected rows are never read
+            batch_offset = offset
+            for batch in parquet.iter_batches(batch_size=batch_rows, row_groups=[i]):
+                if rows is not None:
+                    start = np.searchsorted(rows, batch_offset)
+                    end = np.searchsorted(rows, batch_offset + batch.num_rows)
+                    local = rows[start:end] - batch_offset
+                    batch_offset += batch.num_rows
+                    if len(local) == 0:
+                        continue
+                    batch = batch.take(pa.array(local))
+                yield batch.to_pandas()
+        offset += group_rows
+
+
+def _iter_csv_selection(path, rows, batch_rows):
+    offset = 0
+    for chunk in pd.read_csv(path, chunksize=batch_rows):
+        chunk = conform(chunk)
+        if rows is not None:
+            start = np.searchsorted(rows, offset)
+            end = np.searchsorted(rows, offset + len(chunk))
+            local = rows[start:end] - offset
+            offset += len(chunk)
+            if len(local) == 0:
+                continue
+            chunk = chunk.take(local)
+        yield chunk
+
+
+def write_xlsx(chunks, filename):
+    # Imported here: openpyxl is only needed once someone exports to Excel
+    from openpyxl import Workbook
+
+    # Write-only workbooks stream rows to disk instead of building cells in memory
+    wb = Workbook(write_only=True)
+    ws = None
+    sheet_rows = EXCEL_MAX_ROWS
+    for chunk in chunks:
+        values = chunk.astype(object).where(chunk.notna(), None).to_numpy()
+        start = 0
+        while start < len(values):
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                # Excel caps a sheet at ~1M rows; continue on a new one
+                ws = wb.create_sheet(f"Sales Data {len(wb.worksheets) + 1}" if wb.worksheets else "Sales Data")
+                ws.append(list(chunk.columns))
+                sheet_rows = 1
+            take = min(len(values) - start, EXCEL_MAX_ROWS - sheet_rows)
+            for row in values[start:start + take].tolist():
+                ws.append(row)
+            sheet_rows += take
+            start += take
+    if ws is None:
+        wb.create_sheet("Sales Data")
+    wb.save(filename)
+
+
+def write_csv_gz(chunks, filename):
+    with gzip.open(filename, "wt", newline="", compresslevel=6) as f:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+
+
+def write_parquet(chunks, filename):
+    with ExtractWriter(filename) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    if not os.path.exists(filename):
+        # Nothing selected: still hand back a valid (empty) file
+        pq.write_table(pa.table({}), filename)
+
+
+# format -> (file name, writer)
+EXPORT_FORMATS = {
+    "xlsx": ("Filtered_Sales_Data.xlsx", write_xlsx),
+    "csv.gz": ("Filtered_Sales_Data.csv.gz", write_csv_gz),
+    "parquet": ("Filtered_Sales_Data.parquet", write_parquet),
+}
+
+
+def _last_modified(directory):
+    latest = os.path.getmtime(directory)
+    for entry in os.scandir(directory):
+        latest = max(latest, entry.stat().st_mtime)
+    return latest
+
+
+def sweep_exports(max_age=JOB_RETENTION_SECONDS):
+    """Remove export directories untouched for max_age seconds; returns how many"""
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(EXPORTS_DIR))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if not entry.is_dir() or _last_modified(entry.path) >= cutoff:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def new_export_dir():
+    """A fresh directory for one export (expired ones are swept first)"""
+    sweep_exports()
+    os.makedirs(EXPORTS_DIR, exist_ok=True)
+    return tempfile.mkdtemp(prefix="export_", dir=EXPORTS_DIR)
+
+
+def export_selection(job, path, rows, fmt, directory, expected_rows=None, row_groups=None):
+    """Write the selected rows of an extract to directory in fmt; returns the file path.
+
+    directory (see new_export_dir) belongs to this export and is removed if
+    the export fails or is cancelled.
+    """
+    name, writer = EXPORT_FORMATS[fmt]
+    filename = os.path.join(directory, name)
+
+    def chunks():
+        written = 0
+        for chunk in iter_selection(path, rows, expected_rows, row_groups=row_groups):
+            job.check_cancelled()
+            yield chunk
+            written += len(chunk)
+            job.update_progress(rows=written)
+
+    try:
+        writer(chunks(), filename)
+    except BaseException:
+        # Nobody will download a failed or cancelled export
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return filename
+
+
+# ---------------------- Download Route ----------------------
+exports_blueprint = Blueprint("exports", __name__)
+
+
+@exports_blueprint.route("/exports/<job_id>")
+def download_export(job_id):
+    # The link carries the job's own token (see pages/sales.py), never the
+    # session id
+    job = job_runner.get_by_token(job_id, request.args.get("token"))
+    if job is None or job.status != DONE or job.name != "data-export":
+        abort(404)
+    filename = job.result
+    if not filename or not os.path.isfile(filename):
+        abort(404)
+    return Response(
+        _stream_and_cleanup(filename),
+        mimetype="application/octet-stream",
+        headers={
+            "Content-Disposition": f"attachment; filename={os.path.basename(filename)}",
+            "Content-Length": str(os.path.getsize(filename)),
+        },
+    )
+
+
+def _stream_and_cleanup(filename, block_size=1024 * 1024):
+    # Each export lives in its own temp directory; drop it once sent
+    try:
+        with open(filename, "rb") as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                yield block
+    finally:
+        shutil.rmtree(os.path.dirname(filename), ignore_errors=True)
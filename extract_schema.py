@@ -0,0 +1,142 @@
+# extract_schema.py
+import pandas as pd
+
+# Declared schema of the sales extract.
+# Oracle hands back column names in whatever case the query (or the
+# driver) chose - Invoice_Date, INVOICE_DATE, invoice_date - and dates as
+# text in the query's own format ('DD-MON-YYYY' from SQL query.txt).
+# Every extract is conformed to this schema once, when it is written:
+# known columns get their canonical names, dates are parsed with the
+# declared formats, numbers and codes get their declared dtypes. Values
+# that don't fit raise SchemaError naming the column instead of turning
+# into an empty dashboard later. Columns the schema doesn't know are kept
+# as they are.
+
+# dtype: "category" (repeated text/codes), "string" (mostly distinct
+# text), "float" (measures) or "datetime" (parsed with formats, in order)
+SALES_SCHEMA = {
+    "state_name": {'dtype': "category"},
+    "city_name": {'dtype': "category"},
+    "Party_Name": {'dtype': "category"},
+    "party_address": {'dtype': "category"},
+    "Party_Gstn_No": {'dtype': "category"},
+    "t_code": {'dtype': "category"},
+    "location_code": {'dtype': "category"},
+    "Invoice_Number": {'dtype': "string"},
+    "invoice_date": {'dtype': "datetime", 'formats': ["%d-%b-%Y", "ISO8601"]},
+    "Month": {'dtype': "category"},
+    "Place_of_Supply": {'dtype': "category"},
+    "sale_item": {'dtype': "category"},
+    "item_name": {'dtype': "category"},
+    "uom": {'dtype': "category"},
+    "Sale_Type": {'dtype': "category"},
+    "invoice_value": {'dtype': "float"},
+    "qty": {'dtype': "float"},
+    "gst_Rate": {'dtype': "float"},
+    "Taxable_Value": {'dtype': "float"},
+    "cgst_amount": {'dtype': "float"},
+    "sgst_amount": {'dtype': "float"},
+    "igst_amount": {'dtype': "float"},
+    "tcs_amount": {'dtype': "float"},
+}
+
+_CANONICAL = {name.lower(): name for name in SALES_SCHEMA}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def canonical_name(name):
+    """The schema's spelling of a column name (other names unchanged)"""
+    return _CANONICAL.get(str(name).lower(), name)
+
+
+def normalize_columns(df):
+    """df with schema columns renamed to their canonical case"""
+    names = [canonical_name(c) for c in df.columns]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise SchemaError(f"Columns differ only in case: {', '.join(duplicates)}")
+    return df.set_axis(names, axis=1) if names != list(df.columns) else df
+
+
+def _examples(values, limit=3):
+    return ", ".join(repr(v) for v in values[:limit])
+
+
+def parse_datetime(values, formats, column="invoice_date"):
+    """values parsed with the first format that fits every one of them.
+
+    Dates repeat across invoice lines, so each distinct value is parsed
+    once and the result mapped back.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    uniques = pd.Index(uniques)
+    if not pd.api.types.is_object_dtype(uniques) and not pd.api.types.is_string_dtype(uniques):
+        raise SchemaError(f"{column}: expected dates or date text, got {values.dtype}")
+    text = uniques.astype(str).str.strip()
+    for fmt in formats:
+        parsed = pd.to_datetime(text, format=fmt, errors="coerce")
+        if not parsed.isna().any():
+            return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT),
+                             index=values.index, name=values.name)
+    bad = text[pd.to_datetime(text, format=formats[0], errors="coerce").isna()]
+    raise SchemaError(f"{column}: {len(bad):,} distinct values match none of the formats "
+                      f"{', '.join(formats)}, e.g. {_examples(bad)}")
+
+
+def _as_float(values, column):
+    if pd.api.types.is_float_dtype(values):
+        return values
+    if pd.api.types.is_bool_dtype(values):
+        raise SchemaError(f"{column}: expected numbers, got {values.dtype}")
+    converted = pd.to_numeric(values, errors="coerce")
+    bad = values[converted.isna() & values.notna()]
+    if len(bad):
+        raise SchemaError(f"{column}: {len(bad):,} values are not numbers, e.g. {_examples(bad.unique())}")
+    return converted.astype("float64")
+
+
+def _as_text(values):
+    if pd.api.types.is_string_dtype(values) and not pd.api.types.is_object_dtype(values):
+        return values
+    # Codes fetched as NUMBER (e.g. location 100001) are compared as text
+    return values.where(values.isna(), values.astype(str)).astype("str")
+
+
+def conform(df, schema=SALES_SCHEMA):
+    """df with canonical column names and every schema column in its declared dtype.
+
+    Raises SchemaError when a column's values don't fit. Already conformed
+    columns are passed through, so this is cheap on a stored extract.
+    """
+    df = normalize_columns(df)
+    columns = {}
+    for col in df.columns:
+        spec = schema.get(col)
+        if spec is None:
+            continue
+        values = df[col]
+        kind = spec['dtype']
+        if kind == "datetime":
+            converted = parse_datetime(values, spec['formats'], col)
+        elif kind == "float":
+            converted = _as_float(values, col)
+        elif kind == "category":
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                converted = values
+            else:
+                converted = _as_text(values).astype("category")
+        else:
+            converted = _as_text(values)
+        if converted is not values:
+            columns[col] = converted
+    if not columns:
+        return df
+    df = df.copy()
+    for col, values in columns.items():
+        df[col] = values
+    return df
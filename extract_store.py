@@ -0,0 +1,564 @@
+# extract_store.py
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import config_store
+from dtype_optimizer import frame_bytes, optimize_dtypes
+from extract_schema import canonical_name, conform
+
+# Columnar storage for query extracts.
+# Extracts are written as compressed Parquet with the repeated string
+# dimensions stored dictionary-encoded, so they round-trip as typed,
+# categorical columns and readers can pull just the columns they need.
+# Frames are conformed to the declared schema (see extract_schema) when
+# they are written, so readers get typed columns without parsing them
+# again, in compact dtypes (see dtype_optimizer).
+#
+# Published extracts are also partitioned: rows are ordered by invoice
+# month, t_code and location_code, each partition gets its own row
+# groups, and a manifest next to the file lists every partition with its
+# row groups and statistics. Readers use the manifest to skip partitions
+# that can't match a date range or t_code/location filter.
+
+DATA_DIR = "data"
+EXTRACT_PATH = os.path.join(DATA_DIR, "erp_sales_data.parquet")
+LEGACY_CSV_PATH = os.path.join(DATA_DIR, "erp_sales_data.csv")
+
+COMPRESSION = "zstd"
+
+DATE_COLUMN = "invoice_date"
+# Partition keys after the invoice month, when the extract has them
+PARTITION_COLUMNS = ["t_code", "location_code"]
+PARTITION_MAX_ROWS = int(os.environ.get("EXTRACT_PARTITION_MAX_ROWS", 1_000_000))
+STAT_COLUMNS = ["invoice_value", "qty", "Taxable_Value"]
+MONTH_KEY = "month"
+
+
+def _prepare(df):
+    # Categorical text is stored dictionary-encoded; numbers keep their
+    # width so chunks written one after another share a schema
+    return optimize_dtypes(conform(df), downcast=False)
+
+
+def _loaded(df):
+    # conform() passes typed columns straight through; it only does work
+    # for legacy CSV dumps and extracts written before the schema existed
+    return optimize_dtypes(conform(df))
+
+
+def write_extract(df, path=EXTRACT_PATH):
+    """Write df as a compressed, dictionary-encoded, partitioned Parquet extract"""
+    return write_partitioned(pa.Table.from_pandas(_prepare(df), preserve_index=False), path)
+
+
+# ---------------------- Partitioning ----------------------
+def manifest_path(path):
+    return path + ".manifest.json"
+
+
+def _signature(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _partition_by(schema):
+    """Partition keys an extract with this schema gets (month + PARTITION_COLUMNS)"""
+    keys = []
+    if DATE_COLUMN in schema.names and pa.types.is_timestamp(schema.field(DATE_COLUMN).type):
+        keys.append(MONTH_KEY)
+    return keys + [col for col in PARTITION_COLUMNS if col in schema.names]
+
+
+def _key_values(table, key):
+    """Per-row values of one partition key, as text (categories ordered as text)"""
+    if key == MONTH_KEY:
+        # Formatting every row is slow; only the distinct months are
+        months = pc.floor_temporal(table[DATE_COLUMN], unit="month").to_pandas()
+        codes, uniques = pd.factorize(months, use_na_sentinel=True)
+        values = pd.Series(pd.Categorical.from_codes(codes, pd.DatetimeIndex(uniques).strftime("%Y-%m")))
+    else:
+        values = table[key].to_pandas()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.cat.reorder_categories(sorted(values.cat.categories, key=str))
+    return values
+
+
+def _partition_keys(table):
+    """Sort order and per-row partition keys (month + PARTITION_COLUMNS)"""
+    keys = pd.DataFrame(index=pd.RangeIndex(table.num_rows))
+    for key in _partition_by(table.schema):
+        keys[key] = _key_values(table, key)
+    if keys.columns.empty:
+        return None, keys
+    order = keys.sort_values(list(keys.columns), kind="stable", na_position="last").index.to_numpy()
+    return order, keys.take(order).reset_index(drop=True)
+
+
+def _runs(keys, rows):
+    """(start, end, key values) of each run of equal keys in sorted keys"""
+    if keys.columns.empty or not len(keys):
+        return [(0, rows, {})] if rows else []
+    group_ids = keys.groupby(list(keys.columns), sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]])
+    ends = np.r_[starts[1:], len(group_ids)]
+    runs = []
+    for start, end in zip(starts, ends):
+        values = {col: (None if pd.isna(v) else str(v)) for col, v in keys.iloc[start].items()}
+        runs.append((int(start), int(end), values))
+    return runs
+
+
+def _scalar(value):
+    value = value.as_py()
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _partition_stats(part):
+    stats = {}
+    if DATE_COLUMN in part.column_names and pa.types.is_timestamp(part.schema.field(DATE_COLUMN).type):
+        bounds = pc.min_max(part[DATE_COLUMN])
+        stats['min_date'] = _scalar(bounds['min'])
+        stats['max_date'] = _scalar(bounds['max'])
+    for col in STAT_COLUMNS:
+        if col not in part.column_names:
+            continue
+        kind = part.schema.field(col).type
+        if pa.types.is_floating(kind) or pa.types.is_integer(kind):
+            stats[f"sum_{col}"] = _scalar(pc.sum(part[col]))
+    return stats
+
+
+def _compact_dictionaries(part):
+    # A slice keeps the whole table's dictionaries, which Parquet would
+    # store again with every row group; re-encode to the values it uses
+    columns = []
+    for field, column in zip(part.schema, part.columns):
+        if pa.types.is_dictionary(field.type):
+            column = pa.chunked_array([_used_dictionary(chunk) for chunk in column.chunks], field.type)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=part.schema)
+
+
+def _used_dictionary(array):
+    """A dictionary array re-encoded against the dictionary values it uses"""
+    used = pc.unique(array.indices).drop_null()
+    indices = pc.index_in(array.indices, value_set=used).cast(array.type.index_type)
+    return pa.DictionaryArray.from_arrays(indices, array.dictionary.take(used))
+
+
+def _sort_key(values):
+    # Partition order: keys as text, missing values last
+    return tuple((v is None, v or "") for v in values)
+
+
+def _sorted_parts(tables):
+    """(partition table, key values, None) for each run of tables sorted by partition key"""
+    for table in tables:
+        order, keys = _partition_keys(table)
+        if order is not None:
+            table = table.take(pa.array(order))
+        for start, end, values in _runs(keys, table.num_rows):
+            yield _compact_dictionaries(table.slice(start, end - start)), values, None
+
+
+def _write_parts(parts, schema, path):
+    """Write (table, key values, stats) parts, in order, as an extract plus its manifest (atomically).
+
+    Each part becomes one partition; stats None computes its statistics.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write next to the target and swap in atomically so readers never
+    # see a half-written file
+    tmp_path = path + ".tmp"
+    partitions = []
+    row_group = offset = 0
+    with pq.ParquetWriter(tmp_path, schema, compression=COMPRESSION) as writer:
+        for part, values, stats in parts:
+            # Each write starts new row groups, so partitions never share one
+            writer.write_table(part, row_group_size=PARTITION_MAX_ROWS)
+            groups = -(-part.num_rows // PARTITION_MAX_ROWS)
+            partitions.append({
+                **values,
+                'row_groups': list(range(row_group, row_group + groups)),
+                'offset': offset,
+                'rows': part.num_rows,
+                **(_partition_stats(part) if stats is None else stats),
+            })
+            row_group += groups
+            offset += part.num_rows
+        if not offset:
+            writer.write_table(schema.empty_table())
+    os.replace(tmp_path, path)
+
+    manifest = {
+        'signature': _signature(path),
+        'rows': offset,
+        'partition_by': _partition_by(schema),
+        'partitions': partitions,
+    }
+    tmp_manifest = manifest_path(path) + ".tmp"
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, manifest_path(path))
+    return path
+
+
+def _write_sorted(tables, schema, path):
+    """Write tables, in order, as a partitioned extract plus its manifest.
+
+    Each table is sorted by its partition keys before it is written, so
+    no partition may span two of them.
+    """
+    return _write_parts(_sorted_parts(tables), schema, path)
+
+
+def write_partitioned(table, path=EXTRACT_PATH):
+    """Write an in-memory table as a partitioned extract plus its manifest"""
+    return _write_sorted([table], table.schema, path)
+
+
+def _spilled(parquet, key, spill_dir):
+    """Tables of parquet's rows, one per value of key, in key order.
+
+    Row groups are read one at a time and their rows appended to a spill
+    file per key value (an Arrow stream: cheap to append to, and each
+    write keeps only the dictionary values it uses). Each spill file is
+    read back and removed when its turn comes, so only one key's rows are
+    in memory at a time.
+    """
+    schema = parquet.schema_arrow
+    spills = {}
+    try:
+        for i in range(parquet.num_row_groups):
+            table = parquet.read_row_group(i)
+            codes, uniques = pd.factorize(_key_values(table, key), use_na_sentinel=True)
+            for code in range(-1, len(uniques)):
+                rows = np.flatnonzero(codes == code)
+                if not len(rows):
+                    continue
+                value = None if code < 0 else str(uniques[code])
+                if value not in spills:
+                    spill_path = os.path.join(spill_dir, f"{len(spills)}.arrows")
+                    sink = pa.OSFile(spill_path, "wb")
+                    spills[value] = (spill_path, sink, pa.ipc.new_stream(sink, schema))
+                spills[value][2].write_table(_compact_dictionaries(table.take(pa.array(rows))))
+    finally:
+        for _, sink, writer in spills.values():
+            writer.close()
+            sink.close()
+
+    # Same order as _partition_keys: text order, missing values last
+    for value in sorted(spills, key=lambda v: (v is None, v or "")):
+        spill_path = spills[value][0]
+        with pa.OSFile(spill_path, "rb") as source:
+            table = pa.ipc.open_stream(source).read_all()
+        os.remove(spill_path)
+        yield table
+
+
+def publish_extract(src_path, path=EXTRACT_PATH):
+    """Make an already written Parquet file the current extract, partitioned.
+
+    src_path is partitioned a month (the first partition key) at a time,
+    through spill files next to path, so memory stays bounded by the
+    largest month rather than the whole extract.
+    """
+    parquet = pq.ParquetFile(src_path)
+    schema = parquet.schema_arrow
+    partition_by = _partition_by(schema)
+    if not partition_by:
+        tables = (parquet.read_row_group(i) for i in range(parquet.num_row_groups))
+        return _write_sorted(tables, schema, path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    spill_dir = tempfile.mkdtemp(prefix=".partition-", dir=os.path.dirname(path) or ".")
+    try:
+        return _write_sorted(_spilled(parquet, partition_by[0], spill_dir), schema, path)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def read_manifest(path):
+    """The partition manifest of an extract, or None if missing or stale"""
+    try:
+        with open(manifest_path(path)) as f:
+            manifest = json.load(f)
+        if manifest['signature'] != _signature(path):
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return manifest
+
+
+def prune_partitions(path, equals=None, date_range=None):
+    """Row groups that can hold rows matching the filters.
+
+    equals maps column -> value (only partition columns prune); date_range
+    is (from_date, to_date). Returns None when every row group has to be
+    read (no manifest, or no filter that prunes anything).
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        return None
+    equals = {col: value for col, value in (equals or {}).items() if col in manifest['partition_by']}
+    if date_range is not None:
+        lo, hi = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+    if not equals and (date_range is None or MONTH_KEY not in manifest['partition_by']):
+        return None
+
+    row_groups = []
+    for part in manifest['partitions']:
+        if any(part.get(col) != str(value) for col, value in equals.items()):
+            continue
+        if date_range is not None and MONTH_KEY in manifest['partition_by']:
+            if part.get('min_date') is None or \
+                    pd.Timestamp(part['max_date']) < lo or pd.Timestamp(part['min_date']) > hi:
+                continue
+        row_groups.extend(part['row_groups'])
+    return row_groups
+
+
+def partitions_holding(manifest, df):
+    """Manifest partitions with the partition keys of any row in df"""
+    table = pa.Table.from_pandas(_prepare(df), preserve_index=False)
+    partition_by = manifest['partition_by']
+    if any(key not in _partition_by(table.schema) for key in partition_by):
+        # df can't be placed; every partition may hold its rows
+        return list(manifest['partitions'])
+    keys = pd.DataFrame({key: _key_values(table, key) for key in partition_by}).drop_duplicates()
+    wanted = {tuple(None if pd.isna(v) else str(v) for v in row) for row in keys.itertuples(index=False)}
+    return [p for p in manifest['partitions'] if tuple(p.get(key) for key in partition_by) in wanted]
+
+
+def replace_partitions(df, replaced, path=EXTRACT_PATH):
+    """Rewrite an extract with the manifest partitions in replaced swapped for df's rows.
+
+    df's rows are partitioned as in write_extract and take the place of
+    every replaced partition. The other partitions are copied a partition
+    at a time as Arrow row groups, keeping their manifest entries and
+    statistics, without being converted, merged or sorted again.
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise ValueError(f"{path} has no current manifest")
+    parquet = pq.ParquetFile(path)
+    schema = parquet.schema_arrow
+    partition_by = manifest['partition_by']
+    table = _fit(pa.Table.from_pandas(_prepare(df), preserve_index=False), schema)
+    replaced_groups = {g for p in replaced for g in p['row_groups']}
+    layout = {'row_groups', 'offset', 'rows', *partition_by}
+
+    def copy(entry):
+        part = parquet.read_row_groups(entry['row_groups'])
+        values = {key: entry.get(key) for key in partition_by}
+        return part, values, {k: v for k, v in entry.items() if k not in layout}
+
+    # (sort key, tie-breaker, part maker); copied partitions are read only when their turn comes
+    kept = [(_sort_key(p.get(key) for key in partition_by), i, lambda p=p: copy(p))
+            for i, p in enumerate(manifest['partitions']) if not replaced_groups & set(p['row_groups'])]
+    new = [(_sort_key(part[1].get(key) for key in partition_by), -1, lambda part=part: part)
+           for part in _sorted_parts([table])]
+    ordered = sorted(kept + new, key=lambda item: item[:2])
+    return _write_parts((make() for _, _, make in ordered), schema, path)
+
+
+def _is_null(kind):
+    return pa.types.is_null(kind) or (pa.types.is_dictionary(kind) and pa.types.is_null(kind.value_type))
+
+
+def _fit(table, schema):
+    """table cast to schema; all-null columns become nulls of the schema's type"""
+    columns = []
+    for field in schema:
+        column = table[field.name]
+        if _is_null(column.type):
+            column = pa.nulls(table.num_rows, field.type)
+        columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class ExtractWriter:
+    """Append DataFrame chunks to a Parquet extract without holding them all.
+
+    The schema is fixed by the first chunk, widened so later chunks still
+    fit: dictionary columns use int32 indices, integers int64 and all-null
+    columns text. An integer column that a later chunk brings fractions
+    for is rewritten as float64. The file is swapped into place on a clean
+    close and discarded on error. memory tracks the chunks' resident size
+    as fetched and with compact dtypes.
+    """
+
+    def __init__(self, path=EXTRACT_PATH):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.rows = 0
+        self.columns = None
+        self.memory = {'before': 0, 'after': 0}
+        self._writer = None
+        self._schema = None
+        self._rewrites = 0
+
+    def _schema_for(self, table):
+        fields = []
+        for field in table.schema:
+            if _is_null(field.type):
+                # All-null in the first chunk; text is the safest guess
+                text = pa.dictionary(pa.int32(), pa.string()) if pa.types.is_dictionary(field.type) else pa.string()
+                field = field.with_type(text)
+            elif pa.types.is_dictionary(field.type):
+                field = field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+            elif pa.types.is_integer(field.type):
+                # Exact for ids beyond float64's 2**53
+                field = field.with_type(pa.int64())
+            fields.append(field)
+        return pa.schema(fields, metadata=table.schema.metadata)
+
+    def _widen(self, table):
+        """Make integer columns that table has as floats float64, rewriting what was written"""
+        # Oracle NUMBER comes back as int when every value in a fetch is
+        # whole; a later fetch may have fractions. Whole values are
+        # narrowed back to integers on load.
+        floats = {f.name for f in table.schema if pa.types.is_floating(f.type)}
+        widened = [f.with_type(pa.float64()) if f.name in floats and pa.types.is_integer(f.type) else f
+                   for f in self._schema]
+        schema = pa.schema(widened, metadata=self._schema.metadata)
+        if schema.equals(self._schema):
+            return False
+        self._writer.close()
+        written = self.tmp_path
+        self._rewrites += 1
+        self.tmp_path = f"{self.path}.{self._rewrites}.tmp"
+        self._schema = schema
+        self._writer = pq.ParquetWriter(self.tmp_path, schema, compression=COMPRESSION)
+        parquet = pq.ParquetFile(written)
+        for i in range(parquet.num_row_groups):
+            self._writer.write_table(_fit(parquet.read_row_group(i), schema))
+        parquet.close()
+        os.remove(written)
+        return True
+
+    def write(self, df):
+        prepared = _prepare(df)
+        self.memory['before'] += frame_bytes(df)
+        self.memory['after'] += frame_bytes(optimize_dtypes(prepared))
+        table = pa.Table.from_pandas(prepared, preserve_index=False)
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._schema = self._schema_for(table)
+            self.columns = list(df.columns)
+            self._writer = pq.ParquetWriter(self.tmp_path, self._schema, compression=COMPRESSION)
+        try:
+            fitted = _fit(table, self._schema)
+        except pa.ArrowInvalid:
+            # Fractions (or values out of int64's range) for an integer column
+            if not self._widen(table):
+                raise
+            fitted = _fit(table, self._schema)
+        self._writer.write_table(fitted)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self.tmp_path, self.path)
+            self._writer = None
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def session_extract_path(session_id):
+    """Where a session's own extract lives (None without a valid session)"""
+    directory = config_store.session_dir(session_id)
+    if directory is None:
+        return None
+    return os.path.join(directory, os.path.basename(EXTRACT_PATH))
+
+
+def extract_path(session_id=None):
+    """Path of the current extract for a session.
+
+    Falls back to the shared extract (e.g. written by main.py), and from
+    there to a legacy CSV dump.
+    """
+    session_path = session_extract_path(session_id)
+    if session_path and os.path.exists(session_path):
+        config_store.touch_session(session_id)
+        return session_path
+    if os.path.exists(EXTRACT_PATH) or not os.path.exists(LEGACY_CSV_PATH):
+        return EXTRACT_PATH
+    return LEGACY_CSV_PATH
+
+
+def _project(columns, available):
+    """Stored names of the requested columns, in request order.
+
+    Files written before the schema existed may spell names differently
+    (Invoice_Date); they are matched case-insensitively and renamed on load.
+    """
+    if not columns:
+        return None
+    stored = {}
+    for name in available:
+        stored.setdefault(canonical_name(name), name)
+    return [stored[c] for c in columns if c in stored]
+
+
+def read_extract(path=None, columns=None, row_groups=None):
+    """Read an extract (with compact dtypes), optionally projecting to the given columns.
+
+    Requested columns that are not in the extract are skipped. row_groups
+    (see prune_partitions) limits a Parquet read to those row groups.
+    """
+    path = path or extract_path()
+    if path.endswith(".csv"):
+        usecols = _project(columns, pd.read_csv(path, nrows=0).columns)
+        return _loaded(pd.read_csv(path, usecols=usecols))
+
+    columns = _project(columns, pq.read_schema(path).names)
+    if row_groups is not None:
+        return _loaded(pq.ParquetFile(path).read_row_groups(row_groups, columns=columns).to_pandas())
+    return _loaded(pd.read_parquet(path, columns=columns))
+
+
+def iter_extract(path=None, columns=None, chunk_rows=PARTITION_MAX_ROWS):
+    """Yield an extract in chunks of whole row groups (or CSV rows)"""
+    path = path or extract_path()
+    if path.endswith(".csv"):
+        usecols = _project(columns, pd.read_csv(path, nrows=0).columns)
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows):
+            yield _loaded(chunk)
+        return
+
+    parquet = pq.ParquetFile(path)
+    columns = _project(columns, parquet.schema_arrow.names)
+    # Small neighbouring row groups (e.g. one month of one location) are
+    # read together, up to chunk_rows at a time
+    batch, batch_rows = [], 0
+    for i in range(parquet.num_row_groups):
+        batch.append(i)
+        batch_rows += parquet.metadata.row_group(i).num_rows
+        if batch_rows >= chunk_rows:
+            yield _loaded(parquet.read_row_groups(batch, columns=columns).to_pandas())
+            batch, batch_rows = [], 0
+    if batch or parquet.num_row_groups == 0:
+        yield _loaded(parquet.read_row_groups(batch, columns=columns).to_pandas())
@@ -0,0 +1,86 @@
+# figure_cache.py
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# LRU cache of rendered Plotly figures for the dashboards.
+# Analysts flip between chart types and metrics with the same filters, so
+# each (dataset version, filters, chart type, metric) figure is built once
+# and replayed afterwards. Figures are stored as their serialized JSON,
+# which is also what the size budget is measured in; hits come back as
+# plain figure dicts, which dcc.Graph and plotly.io accept like Figures.
+
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("FIGURE_CACHE_MAX_MB", 64)) * 1024 * 1024
+
+
+def _freeze(value):
+    # Multi-select dropdowns send lists; keys must be hashable
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class FigureCache:
+    def __init__(self, max_bytes=FIGURE_CACHE_MAX_BYTES):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(*parts):
+        return tuple(_freeze(p) for p in parts)
+
+    def get_or_build(self, key, builder):
+        """Cached figure for key, else builder() (stored unless larger than the budget)"""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(payload)
+            self.misses += 1
+
+        fig = builder()
+        payload = (fig.to_json() if hasattr(fig, "to_json") else json.dumps(fig)).encode()
+        size = len(payload)
+        if size <= self.max_bytes:
+            with self._lock:
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self.bytes -= len(previous)
+                self._entries[key] = payload
+                self.bytes += size
+                self._evict()
+        return fig
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._entries:
+            _, payload = self._entries.popitem(last=False)
+            self.bytes -= len(payload)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+            }
+
+
+# The sales page's figures; each worker caches the ones it has built
+figure_cache = FigureCache()
@@ -0,0 +1,105 @@
+# filter_engine.py
+import numpy as np
+import pandas as pd
+
+# Row-id index for the sales filters.
+# Each dimension column is reduced to categorical codes and a sorted array
+# of row ids per value; invoice_date gets a sort order so a date range is
+# two binary searches. A query intersects the row-id sets of the selected
+# predicates and materializes the frame only once at the end.
+
+DATE_COLUMN = "invoice_date"
+
+
+class FilterEngine:
+    def __init__(self, df):
+        self.df = df
+        self._postings = {}
+        self._dates = None
+        self._nbytes = 0
+        # int32 row ids halve the index size for anything below 2B rows
+        self._id_dtype = np.int32 if len(df) < np.iinfo(np.int32).max else np.int64
+
+    # ---------------------- Index Building ----------------------
+    def _column_postings(self, col):
+        # Built lazily, so columns nobody filters on cost nothing
+        postings = self._postings.get(col)
+        if postings is None:
+            cat = self.df[col]
+            if not isinstance(cat.dtype, pd.CategoricalDtype):
+                cat = cat.astype("category")
+            codes = cat.cat.codes.to_numpy()
+            # Stable sort keeps row ids ascending within each value
+            order = np.argsort(codes, kind="stable").astype(self._id_dtype)
+            bounds = np.searchsorted(codes[order], np.arange(len(cat.cat.categories) + 1))
+            postings = {
+                value: order[bounds[i]:bounds[i + 1]]
+                for i, value in enumerate(cat.cat.categories)
+            }
+            self._postings[col] = postings
+            self._nbytes += order.nbytes
+        return postings
+
+    def _date_index(self):
+        if self._dates is None:
+            values = self.df[DATE_COLUMN].to_numpy()
+            order = np.argsort(values, kind="stable").astype(self._id_dtype)
+            self._dates = (values[order], order)
+            self._nbytes += self._dates[0].nbytes + order.nbytes
+        return self._dates
+
+    @property
+    def nbytes(self):
+        """Memory held by the indexes built so far (not the frame itself)"""
+        # Kept as a running total: caches ask for it on every lookup
+        return self._nbytes
+
+    # ---------------------- Queries ----------------------
+    def rows_for(self, col, value):
+        """Sorted row ids where col == value"""
+        return self._column_postings(col).get(value, np.empty(0, dtype=self._id_dtype))
+
+    def rows_between(self, from_date, to_date):
+        """Sorted row ids with from_date <= invoice_date <= to_date"""
+        column = self.df[DATE_COLUMN]
+        if not pd.api.types.is_datetime64_dtype(column):
+            # Unparsed or timezone-aware dates: fall back to a plain comparison
+            mask = (column >= from_date) & (column <= to_date)
+            return np.flatnonzero(mask.to_numpy()).astype(self._id_dtype)
+        sorted_dates, order = self._date_index()
+        lo = pd.Timestamp(from_date).to_datetime64().astype(sorted_dates.dtype)
+        hi = pd.Timestamp(to_date).to_datetime64().astype(sorted_dates.dtype)
+        start = np.searchsorted(sorted_dates, lo, side="left")
+        end = np.searchsorted(sorted_dates, hi, side="right")
+        return np.sort(order[start:end])
+
+    def select(self, equals=None, date_range=None):
+        """Row ids matching all predicates, or None when nothing is selected.
+
+        equals maps column -> value; date_range is (from_date, to_date).
+        """
+        candidates = [self.rows_for(col, value) for col, value in (equals or {}).items()]
+        if date_range is not None:
+            candidates.append(self.rows_between(*date_range))
+        if not candidates:
+            return None
+
+        # Intersect smallest-first so each step works on the fewest ids
+        candidates.sort(key=len)
+        rows = candidates[0]
+        for other in candidates[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def filter(self, equals=None, date_range=None, frame=None):
+        """Materialize the selection from frame (defaults to the indexed frame).
+
+        frame must have the same rows, in the same order, as the indexed one.
+        """
+        frame = self.df if frame is None else frame
+        rows = self.select(equals, date_range)
+        if rows is None:
+            return frame
+        return frame.take(rows)
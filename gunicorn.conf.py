@@ -0,0 +1,24 @@
+# gunicorn.conf.py
+import os
+
+# Production server settings, see wsgi.py.
+# Several worker processes serve callbacks in parallel; each runs a few
+# threads so slow chart callbacks don't block the cheap ones.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8050)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = 120
+# Import and warm up the app once, then fork the workers from it
+preload_app = True
+wsgi_app = "wsgi:server"
+
+
+def post_fork(server, worker):
+    # Database connections opened in the master must not be shared
+    import db_pool
+    db_pool.reset_after_fork()
+    # Each worker gets its own warm chart renderer (a browser can't be forked)
+    from chart_renderer import chart_renderer
+    chart_renderer.start()
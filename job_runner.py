@@ -0,0 +1,274 @@
+# job_runner.py
+import hmac
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Background jobs for long-running callbacks (SQL extracts, exports).
+# Callbacks submit work and return immediately; the page then polls the
+# job's status. Jobs run on a shared thread pool, report progress through
+# job.update_progress(), and can be cancelled: queued jobs never start,
+# running jobs see job.cancelled and have their registered cancel hooks
+# called (e.g. to abort an in-flight Oracle statement).
+#
+# Job state is mirrored to data/jobs/ so that, with several server worker
+# processes, a poll or cancel that lands on another worker still sees the
+# job. Results must therefore be JSON-serializable.
+#
+# Every job belongs to the session that submitted it; polling or
+# cancelling it takes the same session id, so a job id alone is useless
+# to anyone else. Results fetched outside a callback (export downloads)
+# use the job's random token instead, so the session id, which unlocks
+# the session's saved connection, never has to appear in a URL.
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+MAX_JOBS_PER_USER = int(os.environ.get("MAX_JOBS_PER_USER", 2))
+JOB_RETENTION_SECONDS = 15 * 60
+JOBS_DIR = os.path.join("data", "jobs")
+# Running jobs refresh their snapshot this often; one that goes quiet for
+# much longer belonged to a worker that died
+HEARTBEAT_SECONDS = 2
+STALE_SECONDS = 60
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobLimitError(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _snapshot_path(job_id):
+    if not _JOB_ID_RE.match(job_id):
+        raise ValueError(f"Invalid job id: {job_id!r}")
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def _cancel_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.cancel")
+
+
+class Job:
+    def __init__(self, owner, name):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.name = name
+        self.token = secrets.token_urlsafe(32)
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+        self._cancel_hooks = []
+        self._future = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def on_cancel(self, hook):
+        """Register hook() to be called if the job is cancelled while running"""
+        self._cancel_hooks.append(hook)
+        if self._cancel.is_set():
+            hook()
+
+    def update_progress(self, **values):
+        self.progress.update(values)
+        self.save()
+
+    def save(self):
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        snapshot = {
+            'id': self.id, 'owner': self.owner, 'name': self.name, 'token': self.token, 'status': self.status,
+            'progress': self.progress, 'result': self.result, 'error': self.error,
+            'submitted': self.submitted, 'finished': self.finished,
+            'cancelled': self.cancelled,
+        }
+        path = _snapshot_path(self.id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f, default=str)
+        os.replace(tmp_path, path)
+
+
+class JobSnapshot:
+    """Read-only view of a job owned by another worker process"""
+
+    def __init__(self, data, updated):
+        self.__dict__.update(data)
+        if self.status in (QUEUED, RUNNING) and time.time() - updated > STALE_SECONDS:
+            self.status = FAILED
+            self.error = "The server worker running this job stopped"
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+
+def _load_snapshot(job_id):
+    try:
+        path = _snapshot_path(job_id)
+        updated = os.stat(path).st_mtime
+        with open(path) as f:
+            return JobSnapshot(json.load(f), updated)
+    except (OSError, ValueError):
+        return None
+
+
+class JobRunner:
+    def __init__(self, workers=JOB_WORKERS, per_user=MAX_JOBS_PER_USER):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self.per_user = per_user
+
+    def _active_for(self, owner):
+        # Count across all workers, from the shared snapshots
+        count = 0
+        if not os.path.isdir(JOBS_DIR):
+            return 0
+        for name in os.listdir(JOBS_DIR):
+            if name.endswith(".json"):
+                job = _load_snapshot(name[:-5])
+                if job is not None and job.owner == owner and job.active:
+                    count += 1
+        return count
+
+    def submit(self, owner, name, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs); raises JobLimitError if owner is at the limit"""
+        with self._lock:
+            self._purge()
+            active = self._active_for(owner)
+            if active >= self.per_user:
+                raise JobLimitError(f"You already have {active} jobs running; wait for one to finish")
+            job = Job(owner, name)
+            self._jobs[job.id] = job
+            job.save()
+            self._start_watcher()
+        job._future = self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            return
+        job.status = RUNNING
+        job.save()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = CANCELLED if job.cancelled else DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = CANCELLED if job.cancelled else FAILED
+        finally:
+            job.finished = time.time()
+            job.save()
+
+    def _find(self, job_id):
+        job = self._jobs.get(job_id)
+        return job if job is not None else _load_snapshot(job_id)
+
+    def get(self, job_id, owner):
+        """owner's job (or, if another worker runs it, a snapshot of it); None for anyone else's"""
+        if not job_id or not owner:
+            return None
+        job = self._find(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def get_by_token(self, job_id, token):
+        """Like get(), but for whoever holds the job's token (e.g. a download link)"""
+        if not job_id or not token:
+            return None
+        job = self._find(job_id)
+        if job is None or not hmac.compare_digest(getattr(job, "token", ""), str(token)):
+            return None
+        return job
+
+    def cancel(self, job_id, owner):
+        """Cancel owner's job; False if it isn't theirs or is no longer active"""
+        job = self._jobs.get(job_id) if job_id else None
+        if job is not None and job.owner != owner:
+            return False
+        if job is None:
+            # Run by another worker: leave a flag for its watcher
+            snapshot = self.get(job_id, owner)
+            if snapshot is None or not snapshot.active:
+                return False
+            open(_cancel_path(job_id), "w").close()
+            return True
+        if not job.active:
+            return False
+        job._cancel.set()
+        if job._future is not None and job._future.cancel():
+            job.status = CANCELLED
+            job.finished = time.time()
+            job.save()
+            return True
+        job.save()
+        for hook in list(job._cancel_hooks):
+            try:
+                hook()
+            except Exception:
+                pass
+        return True
+
+    def _start_watcher(self):
+        # Started on first use, so a preloading master never owns the thread
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = threading.Thread(target=self._watch, name="job-watcher", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            for job in [j for j in list(self._jobs.values()) if j.active]:
+                if os.path.exists(_cancel_path(job.id)):
+                    self.cancel(job.id, job.owner)
+                else:
+                    try:
+                        os.utime(_snapshot_path(job.id))
+                    except OSError:
+                        pass
+
+    def _purge(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+        if os.path.isdir(JOBS_DIR):
+            for name in os.listdir(JOBS_DIR):
+                path = os.path.join(JOBS_DIR, name)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+
+# Jobs run on this worker's pool; other workers see them through JOBS_DIR
+job_runner = JobRunner()
@@ -0,0 +1,249 @@
+# live_query.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+import pandas as pd
+from extract_schema import canonical_name, conform
+
+# Live backend for the sales dashboard.
+# Instead of charting the last extract, the dashboard's filters, metric
+# and grouping are compiled into one aggregate query over the sales
+# source query, run against the session's database. Only the aggregated
+# rows come back (one per item, or per item and period for the time
+# series), so tenants too large to extract can still use the dashboard.
+#
+# Filter values are always bind variables: a statement's text depends only
+# on which filters are set, so Oracle re-uses the parsed cursor from its
+# statement cache, and statements are built once per shape here. Results
+# are cached for a short time keyed on the statement and its bind values.
+# SQLAlchemy is imported where statements are built, not at startup.
+
+LIVE_SOURCE_SQL = os.environ.get("LIVE_SOURCE_SQL")
+LIVE_RESULT_TTL_SECONDS = int(os.environ.get("LIVE_RESULT_TTL_SECONDS", 300))
+LIVE_CACHE_ENTRIES = int(os.environ.get("LIVE_CACHE_ENTRIES", 256))
+
+DATE_COLUMN = "invoice_date"
+FILTER_COLUMNS = ["state_name", "city_name", "Party_Name", "t_code", "location_code"]
+INDEX_COLUMNS = ["state_name", "city_name", "Party_Name", "t_code", "location_code"]
+# SQL query.txt returns Invoice_Date as TO_CHAR(..., 'DD-MON-YYYY') text
+ORACLE_DATE_FORMAT = "DD-MON-YYYY"
+
+
+class LiveQueryError(Exception):
+    pass
+
+
+def source_sql(session_id=None, extract_path=None):
+    """The sales query the live backend aggregates over.
+
+    LIVE_SOURCE_SQL (a SELECT or a table/view name) wins; otherwise the
+    query that produced the session's extract, as remembered for refreshes.
+    """
+    if LIVE_SOURCE_SQL:
+        return LIVE_SOURCE_SQL
+    from refresh_store import load_state
+    state = load_state(extract_path) if extract_path else None
+    if state and state.get('query'):
+        return state['query']
+    raise LiveQueryError("No source query for live mode: run the sales query on the SQL page once "
+                         "or set LIVE_SOURCE_SQL")
+
+
+def _sql_literal(value):
+    # Format masks are inlined: Oracle rejects GROUP BY expressions that
+    # contain bind variables (ORA-00979)
+    from sqlalchemy import literal_column
+
+    return literal_column("'" + value.replace("'", "''") + "'")
+
+
+def _date_bucket(col, freq, dialect):
+    """col truncated to the start of its day/week(Monday)/month, per dialect"""
+    from sqlalchemy import func
+
+    if dialect == "oracle":
+        return func.trunc(col) if freq == "D" else func.trunc(col, _sql_literal("IW" if freq == "W" else "MM"))
+    if dialect == "postgresql":
+        return func.date_trunc(_sql_literal({"D": "day", "W": "week", "M": "month"}[freq]), col)
+    if dialect == "sqlite":
+        if freq == "D":
+            return func.date(col)
+        if freq == "W":
+            return func.date(col, _sql_literal("-6 days"), _sql_literal("weekday 1"))
+        return func.strftime(_sql_literal("%Y-%m-01"), col)
+    raise LiveQueryError(f"Live time series aren't supported on {dialect}")
+
+
+class LiveBackend:
+    def __init__(self, ttl=LIVE_RESULT_TTL_SECONDS, max_entries=LIVE_CACHE_ENTRIES):
+        self._sources = {}
+        self._statements = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    # ---------------------- Statements ----------------------
+    def _source(self, engine, sql):
+        """(source subquery, {canonical name: column}) for sql, probed once"""
+        key = (str(engine.url), sql)
+        with self._lock:
+            source = self._sources.get(key)
+        if source is not None:
+            return source
+
+        from sqlalchemy import column, func, text
+        body = sql.strip().rstrip(";")
+        if " " not in body:
+            body = f"SELECT * FROM {body}"  # a bare table or view name
+        with engine.connect() as conn:
+            result = conn.execute(text(f"SELECT * FROM ({body}) live_probe WHERE 1 = 0"))
+            description = result.cursor.description or []
+            result.close()
+
+        dbapi = engine.dialect.dbapi
+        text_type = getattr(dbapi, "STRING", None)
+        # Lower-case names compile unquoted, i.e. case-insensitively
+        names = [d[0].lower() for d in description]
+        sub = text(body).columns(*[column(n) for n in names]).subquery("live_src")
+        columns = {}
+        for name, desc in zip(names, description):
+            col = sub.c[name]
+            canonical = canonical_name(name)
+            if canonical == DATE_COLUMN and engine.dialect.name == "oracle" and \
+                    text_type is not None and desc[1] == text_type:
+                col = func.to_date(col, _sql_literal(ORACLE_DATE_FORMAT))
+            columns[canonical] = col
+        source = (sub, columns)
+        with self._lock:
+            self._sources[key] = source
+        return source
+
+    def _statement(self, engine, sql, shape):
+        """Select for one statement shape, built once and reused"""
+        key = (str(engine.url), sql, shape)
+        with self._lock:
+            statement = self._statements.get(key)
+        if statement is not None:
+            return statement
+
+        from sqlalchemy import bindparam, func, select
+        sub, columns = self._source(engine, sql)
+        kind, filters, has_dates, metric, freq = shape
+        where = [columns[col] == bindparam(f"f_{i}") for i, col in enumerate(filters)]
+        if has_dates:
+            where += [columns[DATE_COLUMN] >= bindparam("from_date"),
+                      columns[DATE_COLUMN] < bindparam("to_date")]
+
+        if kind == "index":
+            present = [col for col in INDEX_COLUMNS if col in columns]
+            statement = select(*[columns[col].label(col.lower()) for col in present]).distinct()
+        elif kind == "span":
+            statement = select(func.min(columns[DATE_COLUMN]).label("min_date"),
+                               func.max(columns[DATE_COLUMN]).label("max_date"))
+        else:
+            keys = [columns["item_name"].label("item_name")]
+            if kind == "time":
+                keys.append(_date_bucket(columns[DATE_COLUMN], freq, engine.dialect.name).label(DATE_COLUMN))
+            statement = select(*keys, func.sum(columns[metric]).label(metric.lower())) \
+                .group_by(*[k.element for k in keys])
+        if where:
+            statement = statement.where(*where)
+        with self._lock:
+            self._statements[key] = statement
+        return statement
+
+    def _shape(self, engine, sql, kind, equals, date_range, metric=None, freq=None):
+        _, columns = self._source(engine, sql)
+        needed = ["item_name", metric] if kind in ("item", "time") else []
+        if kind in ("time", "span"):
+            needed.append(DATE_COLUMN)
+        missing = [c for c in needed if c not in columns]
+        if missing:
+            raise LiveQueryError(f"The source query has no {', '.join(missing)} column")
+        filters = tuple(col for col in FILTER_COLUMNS if equals.get(col))
+        has_dates = date_range is not None
+        # A filter the source can't apply must not silently widen the answer
+        missing = [c for c in filters + ((DATE_COLUMN,) if has_dates else ()) if c not in columns]
+        if missing:
+            raise LiveQueryError(f"The source query has no {', '.join(missing)} column to filter on")
+        binds = {f"f_{i}": equals[col] for i, col in enumerate(filters)}
+        if has_dates:
+            binds['from_date'] = pd.Timestamp(date_range[0]).normalize().to_pydatetime()
+            # Inclusive end date: everything before the next midnight
+            binds['to_date'] = (pd.Timestamp(date_range[1]).normalize() + timedelta(days=1)).to_pydatetime()
+        return (kind, filters, has_dates, metric, freq), binds
+
+    # ---------------------- Execution ----------------------
+    def _run(self, engine, sql, shape, binds):
+        key = (str(engine.url), sql, shape, tuple(sorted(binds.items())))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > now:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        statement = self._statement(engine, sql, shape)
+        with engine.connect() as conn:
+            frame = pd.read_sql(statement, conn, params=binds)
+        frame = conform(frame)
+
+        with self._lock:
+            self._results[key] = (now + self.ttl, frame)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return frame
+
+    def item_summary(self, engine, sql, equals, date_range, metric):
+        """metric summed per item_name for the filters"""
+        shape, binds = self._shape(engine, sql, "item", equals, date_range, metric)
+        return self._run(engine, sql, shape, binds)
+
+    def time_summary(self, engine, sql, equals, date_range, metric, freq):
+        """metric summed per item_name and freq period (D/W/M) for the filters"""
+        shape, binds = self._shape(engine, sql, "time", equals, date_range, metric, freq)
+        frame = self._run(engine, sql, shape, binds)
+        if not frame.empty and not pd.api.types.is_datetime64_any_dtype(frame[DATE_COLUMN]):
+            # sqlite hands buckets back as text
+            frame = frame.assign(**{DATE_COLUMN: pd.to_datetime(frame[DATE_COLUMN])})
+        return frame
+
+    def date_span(self, engine, sql, equals):
+        """(first, last) invoice date matching the filters"""
+        shape, binds = self._shape(engine, sql, "span", equals, None)
+        frame = self._run(engine, sql, shape, binds)
+        if frame.empty or frame.iloc[0].isna().any():
+            return None
+        return pd.Timestamp(frame.iloc[0, 0]), pd.Timestamp(frame.iloc[0, 1])
+
+    def index_frame(self, engine, sql):
+        """Distinct state/city/customer/t_code/location combinations"""
+        shape, binds = self._shape(engine, sql, "index", {}, None)
+        return self._run(engine, sql, shape, binds)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._results),
+                'statements': len(self._statements),
+            }
+
+
+# Statements and short-lived results for every session's live dashboard in this worker
+live_backend = LiveBackend()
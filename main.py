@@ -1,9 +1,12 @@
 # main.py
 import pandas as pd
-from sqlalchemy import create_engine
+from db_pool import get_engine
 import os
-import oracledb
-oracledb.init_oracle_client(lib_dir="D:\\oracle\\instantclient_21_11")
+from dtype_optimizer import format_report, frame_bytes, optimize_dtypes
+from extract_schema import conform
+from extract_store import EXTRACT_PATH, write_extract
+# The client itself is loaded on the first connection (oracle_client.py)
+os.environ.setdefault("ORACLE_CLIENT_LIB_DIR", "D:\\oracle\\instantclient_21_11")
 os.environ["PATH"] = "D:\\oracle\\instantclient_21_11;" + os.environ.get("PATH", "")
 os.environ["TNS_ADMIN"] = "D:\\oracle\\instantclient_21_11"
 
@@ -16,7 +19,7 @@ DB_NAME = 'ORCL'
 
 # Create Oracle connection string
 conn_str = f'oracle+oracledb://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
-engine = create_engine(conn_str)
+engine = get_engine(conn_str)
 
 print("✅ Connected to Oracle DB")
 print("Please paste your SQL query below (must return invoice_date, item_name, invoice_value, etc.):")
@@ -36,14 +39,14 @@ while True:
         if df.empty:
             print("⚠️ No records returned.")
         else:
-            # Ensure the data directory exists
-            os.makedirs("data", exist_ok=True)
+            # Typed and compacted once, then saved as the columnar extract for the dashboard
+            memory = {'before': frame_bytes(df)}
+            df = optimize_dtypes(conform(df))
+            memory['after'] = frame_bytes(df)
+            output_path = write_extract(df, EXTRACT_PATH)
 
-            # Save to CSV for the dashboard
-            output_path = os.path.join("data", "erp_sales_data.csv")
-            df.to_csv(output_path, index=False)
-
-            print("✅ Query executed and saved to data/erp_sales_data.csv")
+            print(f"✅ Query executed and saved to {output_path}")
             print(f"💡 Columns: {list(df.columns)}")
+            print(f"📦 Memory: {format_report(memory)}")
     except Exception as e:
         print(f"❌ Error while running query: {e}")
@@ -0,0 +1,134 @@
+# oracle_client.py
+import json
+import os
+import threading
+import time
+
+# python-oracledb setup, done once per process on the first Oracle
+# connection instead of when the app is imported.
+# Thick mode needs the Oracle Instant Client libraries, which used to be
+# searched for (and loaded) at import time, at every start. The outcome
+# of the search - the directory that worked, or that none did - is kept
+# in a small JSON file, so later starts go straight to that directory.
+# The search is redone when the client directories on disk change or the
+# cached directory stops working.
+
+# Tried first, e.g. D:\oracle\instantclient_21_11
+CLIENT_LIB_DIR_ENV = "ORACLE_CLIENT_LIB_DIR"
+PROBE_CACHE_PATH = os.environ.get("ORACLE_CLIENT_CACHE", os.path.join("data", "oracle_client.json"))
+# Rows per network round trip for every cursor (see the SQL Query Interface)
+FETCH_ARRAYSIZE = int(os.environ.get("SQL_FETCH_ARRAYSIZE", 5000))
+
+# Common Oracle Instant Client installation paths
+CLIENT_PATHS = [
+    "C:\\oracle\\instantclient_23_8",
+    "C:\\oracle\\instantclient_21_3",
+    "C:\\oracle\\instantclient_19_3",
+    "C:\\oracle\\instantclient_12_2",
+    "C:\\instantclient_23_8",
+    "C:\\instantclient_21_3",
+    "C:\\instantclient_19_3",
+    "C:\\instantclient_12_2",
+    "/opt/oracle/instantclient_23_8",  # Linux paths
+    "/opt/oracle/instantclient_21_3",
+    "/usr/lib/oracle/23/client64/lib",  # Ubuntu/Debian
+    "/usr/lib/oracle/21/client64/lib",
+    "/usr/lib/oracle/19.3/client64/lib",
+]
+
+_lock = threading.Lock()
+# None until the first connection decides
+_thick_mode = None
+
+
+def candidate_paths():
+    lib_dir = os.environ.get(CLIENT_LIB_DIR_ENV)
+    return ([lib_dir] if lib_dir else []) + [p for p in CLIENT_PATHS if p != lib_dir]
+
+
+def _read_cache():
+    try:
+        with open(PROBE_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(entry):
+    try:
+        os.makedirs(os.path.dirname(PROBE_CACHE_PATH) or ".", exist_ok=True)
+        tmp_path = PROBE_CACHE_PATH + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, PROBE_CACHE_PATH)
+    except OSError as e:
+        # Only costs a search on the next start
+        print(f"Could not cache the Oracle client probe: {e}")
+
+
+def _cached_probe(present):
+    """The cached search result if it was made with the same directories on disk"""
+    cache = _read_cache()
+    if cache and cache.get('present') == present:
+        return cache
+    return None
+
+
+def cached_mode():
+    """True/False from the last search, without loading anything (None if unknown)"""
+    if _thick_mode is not None:
+        return _thick_mode
+    cache = _cached_probe([p for p in candidate_paths() if os.path.exists(p)])
+    return None if cache is None else cache.get('lib_dir') is not None
+
+
+def thick_mode_enabled():
+    return bool(_thick_mode)
+
+
+def ensure_thick_mode():
+    """Initialize python-oracledb, in thick mode if an Instant Client is found.
+
+    Safe to call before every connection: only the first call does any work.
+    Returns whether thick mode is enabled.
+    """
+    global _thick_mode
+    if _thick_mode is not None:
+        return _thick_mode
+    with _lock:
+        if _thick_mode is not None:
+            return _thick_mode
+
+        import oracledb
+        oracledb.defaults.arraysize = FETCH_ARRAYSIZE
+        oracledb.defaults.prefetchrows = FETCH_ARRAYSIZE
+
+        present = [p for p in candidate_paths() if os.path.exists(p)]
+        cache = _cached_probe(present)
+        if cache is not None and cache.get('lib_dir') is None:
+            # Nothing worked last time and nothing new has been installed
+            order = []
+        elif cache is not None:
+            order = [cache['lib_dir']] + [p for p in present if p != cache['lib_dir']]
+        else:
+            order = present
+
+        lib_dir = None
+        start = time.perf_counter()
+        for client_path in order:
+            try:
+                oracledb.init_oracle_client(lib_dir=client_path)
+                lib_dir = client_path
+                break
+            except Exception as e:
+                print(f"Failed to initialize Oracle client at {client_path}: {e}")
+
+        if cache is None or cache.get('lib_dir') != lib_dir:
+            _write_cache({'present': present, 'lib_dir': lib_dir, 'probed_at': time.time()})
+        if lib_dir:
+            print(f"✅ Oracle thick mode initialized with {lib_dir} "
+                  f"in {time.perf_counter() - start:.2f}s")
+        else:
+            print("❌ Warning: Could not initialize Oracle thick mode. Thick mode requires Oracle Instant Client.")
+        _thick_mode = lib_dir is not None
+        return _thick_mode
@@ -3,54 +3,20 @@ import dash
 import dash_bootstrap_components as dbc
 from dash import html, dcc, Input, Output, State, callback, ctx
 import config_store
-import oracledb
-import os
-from sqlalchemy import create_engine, text
+from db_pool import dispose_engine, get_engine
+from oracle_client import cached_mode, thick_mode_enabled
 
-# Global variable to track if thick mode is initialized
-_thick_mode_initialized = False
+# Thick mode is set up on the first connection (oracle_client.py); until
+# then the status shows the last start's result, without loading the client
+def _mode_status():
+    thick = cached_mode()
+    if thick is None:
+        return "Oracle Connection Mode: detected on first connection", "info"
+    if thick:
+        return "Oracle Connection Mode: ✅ Thick Mode Enabled", "success"
+    return "Oracle Connection Mode: ⚠️ Thin Mode (Limited Compatibility)", "warning"
 
-def ensure_thick_mode():
-    """Ensure Oracle thick mode is properly initialized"""
-    global _thick_mode_initialized
-    
-    if _thick_mode_initialized:
-        return True
-    
-    # Common Oracle Instant Client installation paths
-    ORACLE_CLIENT_PATHS = [
-        "C:\\oracle\\instantclient_23_8",
-        "C:\\oracle\\instantclient_21_3", 
-        "C:\\oracle\\instantclient_19_3",
-        "C:\\oracle\\instantclient_12_2",
-        "C:\\instantclient_23_8",
-        "C:\\instantclient_21_3",
-        "C:\\instantclient_19_3",
-        "C:\\instantclient_12_2",
-        "/opt/oracle/instantclient_23_8",  # Linux paths
-        "/opt/oracle/instantclient_21_3",
-        "/usr/lib/oracle/23/client64/lib", # Ubuntu/Debian
-        "/usr/lib/oracle/21/client64/lib",
-        "/usr/lib/oracle/19.3/client64/lib"
-    ]
-    
-    for client_path in ORACLE_CLIENT_PATHS:
-        try:
-            if os.path.exists(client_path):
-                print(f"Attempting to initialize Oracle thick mode with: {client_path}")
-                oracledb.init_oracle_client(lib_dir=client_path)
-                print(f"✅ Oracle thick mode initialized successfully with: {client_path}")
-                _thick_mode_initialized = True
-                return True
-        except Exception as e:
-            print(f"Failed to initialize Oracle client at {client_path}: {e}")
-            continue
-    
-    print("❌ Warning: Could not initialize Oracle thick mode. Thick mode requires Oracle Instant Client.")
-    return False
-
-# Try to initialize thick mode when module loads
-thick_mode_available = ensure_thick_mode()
+mode_text, mode_color = _mode_status()
 
 # Register this as the /config page
 dash.register_page(__name__, path="/config", name="Database Configuration")
@@ -77,8 +43,8 @@ layout = html.Div([
                     # Oracle Thick Mode Status
                     dbc.Alert([
                         html.I(className="fas fa-info-circle me-2"),
-                        "Oracle Connection Mode: " + ("✅ Thick Mode Enabled" if thick_mode_available else "⚠️ Thin Mode (Limited Compatibility)")
-                    ], color="success" if thick_mode_available else "warning", className="mb-0")
+                        mode_text
+                    ], color=mode_color, className="mb-0")
                 ]),
                 
                 dbc.CardBody([
@@ -247,9 +213,12 @@ def toggle_help_section(n_clicks, is_open):
     State("service-input", "value"),
     State("username-input", "value"),
     State("password-input", "value"),
+    State("session-id", "data"),
     prevent_initial_call=True
 )
-def handle_connection_actions(test_clicks, submit_clicks, server, port, service, username, password):
+def handle_connection_actions(test_clicks, submit_clicks, server, port, service, username, password, session_id):
+    from sqlalchemy import text
+
     triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
     # Validate required fields
@@ -261,27 +230,28 @@ def handle_connection_actions(test_clicks, submit_clicks, server, port, service,
     
     # Create connection string
     conn_str = f'oracle+oracledb://{username}:{password}@{server}:{port}/{service}'
+    params = {'server': server, 'port': port, 'service': service, 'username': username, 'password': password}
     
     if triggered_id == "test-connection-btn":
         try:
-            # Create engine for testing
-            engine = create_engine(conn_str, pool_pre_ping=True, pool_recycle=3600)
+            # Shared pooled engine; the tested connection stays open for Submit
+            engine = get_engine(conn_str, params)
             
             # Test connection
             with engine.connect() as conn:
                 result = conn.execute(text("SELECT 1 FROM DUAL"))
                 result.fetchone()
             
-            engine.dispose()  # Clean up test connection
-            
             # Success message
-            mode_info = "Thick Mode" if _thick_mode_initialized else "Thin Mode"
+            mode_info = "Thick Mode" if thick_mode_enabled() else "Thin Mode"
             return dbc.Alert([
                 html.I(className="fas fa-check-circle me-2"),
                 f"Connection successful using {mode_info}! You can now proceed."
             ], color="success"), False
             
         except Exception as e:
+            # Don't keep an engine around for credentials that don't work
+            dispose_engine(conn_str)
             error_msg = str(e)
             if "DPY-3010" in error_msg:
                 return dbc.Alert([
@@ -305,29 +275,29 @@ def handle_connection_actions(test_clicks, submit_clicks, server, port, service,
     
     elif triggered_id == "submit-proceed-btn":
         try:
-            # Create and test engine
-            engine = create_engine(conn_str, pool_pre_ping=True, pool_recycle=3600)
+            # Reuse the pooled engine from Test Connection (or create it)
+            engine = get_engine(conn_str, params)
             
             with engine.connect() as conn:
                 result = conn.execute(text("SELECT 1 FROM DUAL"))
                 result.fetchone()
             
-            # Store configuration
-            config_store.db_config = {
+            # Store configuration for this browser session only
+            config_store.set_config(session_id, {
                 'server': server,
                 'port': port,
                 'service': service,
                 'username': username,
                 'password': password,
                 'conn_str': conn_str,
-                'engine': engine,
-                'thick_mode': _thick_mode_initialized
-            }
+                'thick_mode': thick_mode_enabled()
+            })
             
             # Redirect to data fetching page
             return dcc.Location(pathname="/data-fetching", id="redirect-to-data-fetching"), True
             
         except Exception as e:
+            dispose_engine(conn_str)
             error_msg = str(e)
             return dbc.Alert([
                 html.I(className="fas fa-times-circle me-2"),
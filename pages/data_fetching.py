@@ -1,15 +1,27 @@
 # pages/data_fetching.py
 import dash
 import dash_bootstrap_components as dbc
-from dash import html, dcc, Input, Output, State, callback
+from dash import html, dcc, dash_table, Input, Output, State, callback, ctx, no_update
 import pandas as pd
 import config_store
-from sqlalchemy import text
+from data_cache import dataset_cache
+from db_pool import interrupt, pool_stats
+from dtype_optimizer import format_report
+from extract_store import EXTRACT_PATH, ExtractWriter, publish_extract, session_extract_path
+from job_runner import job_runner, JobLimitError, CANCELLED, FAILED, QUEUED
+from refresh_store import incremental_refresh, record_full_extract
+from result_grid import GRID_PAGE_SIZE, result_grid
+from result_store import evict, get_result, new_handle, result_path
 import os
-from datetime import datetime
+import time
 
 dash.register_page(__name__, path="/data-fetching", name="Data Fetching")
 
+# ---------------------- Fetch Tuning ----------------------
+# Rows per DataFrame chunk written to disk; rows per network round trip
+# (SQL_FETCH_ARRAYSIZE) are set with the Oracle client, in oracle_client.py
+FETCH_CHUNK_ROWS = int(os.environ.get("SQL_FETCH_CHUNK_ROWS", 50000))
+
 layout = html.Div([
     # Full screen with modern background
     html.Div([
@@ -95,12 +107,22 @@ from HRD_CATG_PARA''',
                             className="me-3",
                             style={'borderRadius': '25px', 'paddingLeft': '30px', 'paddingRight': '30px'}
                         ),
+                        dbc.Button(
+                            [html.I(className="fas fa-sync-alt me-2"), "Refresh New Rows"],
+                            id="refresh-sql-btn",
+                            color="primary",
+                            size="lg",
+                            outline=True,
+                            className="me-3",
+                            style={'borderRadius': '25px', 'paddingLeft': '30px', 'paddingRight': '30px'}
+                        ),
                         dbc.Button(
                             [html.I(className="fas fa-download me-2"), "Download CSV"],
                             id="download-results-btn",
                             color="success",
                             size="lg",
                             disabled=True,
+                            external_link=True,
                             className="me-3",
                             style={'borderRadius': '25px', 'paddingLeft': '30px', 'paddingRight': '30px'}
                         ),
@@ -115,6 +137,20 @@ from HRD_CATG_PARA''',
                     ], className="text-center mb-4"),
                     
                     # Status and Results Section
+                    html.Div([
+                        html.Div(id="query-job-progress"),
+                        html.Div(
+                            dbc.Button(
+                                [html.I(className="fas fa-stop me-2"), "Cancel Query"],
+                                id="cancel-sql-btn",
+                                color="danger",
+                                size="sm",
+                                outline=True,
+                                style={'borderRadius': '25px'}
+                            ),
+                            className="text-center"
+                        )
+                    ], id="query-job-container", className="mb-3", style={'display': 'none'}),
                     html.Div(id="sql-execution-status"),
                     html.Div(id="query-results-preview", className="mt-4")
                 ])
@@ -141,21 +177,29 @@ from HRD_CATG_PARA''',
     }),
     
     # Hidden components
-    dcc.Download(id="download-csv-file"),
-    dcc.Store(id="executed-query-data")
+    dcc.Store(id="executed-query-data"),
+    dcc.Store(id="query-job"),
+    dcc.Interval(id="query-job-interval", interval=1000, disabled=True)
 ])
 
 @callback(
     Output("connection-info", "children"),
-    Input("connection-info", "id")
+    Input("session-id", "data")
 )
-def display_connection_info(_):
-    if config_store.db_config:
-        server = config_store.db_config.get('server', 'Unknown')
-        service = config_store.db_config.get('service', 'Unknown')
-        username = config_store.db_config.get('username', 'Unknown')
-        mode = "Thick Mode" if config_store.db_config.get('thick_mode', False) else "Thin Mode"
-        return f"Server: {server} | Service: {service} | User: {username} | Mode: {mode}"
+def display_connection_info(session_id):
+    db_config = config_store.get_config(session_id)
+    if db_config:
+        server = db_config.get('server', 'Unknown')
+        service = db_config.get('service', 'Unknown')
+        username = db_config.get('username', 'Unknown')
+        mode = "Thick Mode" if db_config.get('thick_mode', False) else "Thin Mode"
+        info = f"Server: {server} | Service: {service} | User: {username} | Mode: {mode}"
+        engine = db_config.get('engine')
+        if engine is not None:
+            stats = pool_stats(engine)
+            info += (f" | Pool: {stats.get('checked_out', 0)} in use, "
+                     f"{stats.get('connections_created', 0)} opened")
+        return info
     return "Connection information not available"
 
 @callback(
@@ -166,163 +210,283 @@ def display_connection_info(_):
 def clear_sql_query(n_clicks):
     return ""
 
+# ---------------------- Query Job ----------------------
+def run_query(job, engine, query, session_id):
+    """Background job: stream the result set into a server-side result file"""
+    from sqlalchemy import text
+
+    handle = new_handle()
+    job.update_progress(rows=0, started=time.time())
+    with engine.connect().execution_options(stream_results=True, yield_per=FETCH_CHUNK_ROWS) as conn:
+        dbapi_conn = conn.connection.dbapi_connection
+        job.on_cancel(lambda: interrupt(dbapi_conn))
+        # Nothing is kept in memory; the result grid pages through the file
+        with ExtractWriter(result_path(handle)) as writer:
+            for chunk in pd.read_sql(text(query), conn, chunksize=FETCH_CHUNK_ROWS):
+                job.check_cancelled()
+                if chunk.empty:
+                    continue
+                writer.write(chunk)
+                job.update_progress(rows=writer.rows)
+
+    if writer.rows == 0:
+        return None
+
+    evict(keep=writer.path)
+
+    # The result also becomes this session's dashboard extract
+    output_path = publish_extract(writer.path, session_extract_path(session_id) or EXTRACT_PATH)
+    dataset_cache.invalidate(output_path)
+    # Remembered so later refreshes only fetch rows past the high-water mark
+    record_full_extract(output_path, query)
+    # Plain JSON so any worker process can pick up the finished job
+    return {
+        'handle': handle,
+        'rows': writer.rows,
+        'columns': writer.columns,
+        'memory': writer.memory,
+        'output_path': output_path,
+    }
+
+def run_refresh(job, engine, session_id):
+    """Background job: merge rows added since the last query into the extract"""
+    return incremental_refresh(job, engine, session_extract_path(session_id) or EXTRACT_PATH)
+
+def _progress_message(job):
+    rows = job.progress.get('rows', 0)
+    if job.status == QUEUED:
+        message = "Query queued, waiting for a free worker..."
+    elif job.cancelled:
+        message = "Cancelling query..."
+    elif not rows:
+        message = "Executing query..."
+    else:
+        elapsed = max(time.time() - job.progress['started'], 1e-6)
+        message = f"Fetched {rows:,} rows so far ({rows / elapsed:,.0f} rows/s)"
+    return dbc.Alert([dbc.Spinner(size="sm", spinner_class_name="me-2"), message], color="info")
+
+def _grid_columns(result):
+    path = get_result(result['handle'])
+    if path is None:
+        return [{'name': c, 'id': c} for c in result['columns']]
+    return result_grid.columns(result['handle'], path)
+
+def _preview_card(result):
+    preview_card = dbc.Card([
+        dbc.CardHeader([
+            html.H5([
+                html.I(className="fas fa-table me-2"),
+                "Query Results"
+            ], className="mb-0")
+        ]),
+        dbc.CardBody([
+            # Results summary
+            dbc.Row([
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.H4(f"{result['rows']:,}", className="text-primary mb-0"),
+                            html.P("Total Rows", className="mb-0 text-muted")
+                        ], className="text-center")
+                    ])
+                ], md=4),
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.H4(str(len(result['columns'])), className="text-success mb-0"),
+                            html.P("Columns", className="mb-0 text-muted")
+                        ], className="text-center")
+                    ])
+                ], md=4),
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.H4(f"{GRID_PAGE_SIZE}", className="text-info mb-0"),
+                            html.P("Rows per Page", className="mb-0 text-muted")
+                        ], className="text-center")
+                    ])
+                ], md=4)
+            ], className="mb-4"),
+            
+            # Column information
+            html.Div([
+                html.H6("Columns:", className="fw-bold"),
+                html.P(", ".join(result['columns']), className="text-muted small"),
+                html.P(f"In memory: {format_report(result['memory'])} with compact dtypes",
+                       className="text-muted small") if result.get('memory') else None
+            ], className="mb-3"),
+            
+            # Result grid: pages, sorting and filters are served from the
+            # stored result, one page at a time
+            html.Div(id="query-grid-status", className="text-muted small mb-2"),
+            dash_table.DataTable(
+                id="query-results-grid",
+                columns=_grid_columns(result),
+                data=[],
+                page_current=0,
+                page_size=GRID_PAGE_SIZE,
+                page_action="custom",
+                sort_action="custom",
+                sort_mode="multi",
+                sort_by=[],
+                filter_action="custom",
+                filter_query="",
+                style_table={'overflowX': 'auto'},
+                style_cell={'fontSize': '13px', 'padding': '4px 8px', 'textAlign': 'left'},
+                style_header={'fontWeight': 'bold'},
+            )
+        ])
+    ], style={'borderRadius': '10px'})
+    return preview_card
+
+def _error_alert(error):
+    error_alert = dbc.Alert([
+        html.H5([html.I(className="fas fa-times-circle me-2"), "Query Execution Failed"], className="mb-3"),
+        html.P(f"Error: {error}"),
+        html.Hr(),
+        html.P("Suggestions:", className="fw-bold mb-2"),
+        html.Ul([
+            html.Li("Check your SQL syntax"),
+            html.Li("Verify table and column names exist"),
+            html.Li("Ensure you have proper database permissions"),
+            html.Li("Check if the database connection is still active")
+        ]),
+        html.Small("If the error persists, contact your database administrator.", className="text-muted")
+    ], color="danger")
+    return error_alert
+
+def _finished(status, preview="", data=None, href=None):
+    # Outputs once a query is over (or never started): stop polling, show results
+    return (status, preview, data, href is None, href,
+            None, True, {'display': 'none'}, "", False)
+
+def _waiting(job):
+    # Outputs while a job is queued or running: keep results as they are, poll
+    return (no_update, no_update, no_update, no_update, no_update,
+            job.id, False, {'display': 'block'}, _progress_message(job), True)
+
 @callback(
     [Output("sql-execution-status", "children"),
      Output("query-results-preview", "children"),
      Output("executed-query-data", "data"),
-     Output("download-results-btn", "disabled")],
+     Output("download-results-btn", "disabled"),
+     Output("download-results-btn", "href"),
+     Output("query-job", "data"),
+     Output("query-job-interval", "disabled"),
+     Output("query-job-container", "style"),
+     Output("query-job-progress", "children"),
+     Output("execute-sql-btn", "disabled")],
     Input("execute-sql-btn", "n_clicks"),
+    Input("query-job-interval", "n_intervals"),
+    Input("cancel-sql-btn", "n_clicks"),
+    Input("refresh-sql-btn", "n_clicks"),
     State("sql-query-textarea", "value"),
+    State("query-job", "data"),
+    State("session-id", "data"),
     prevent_initial_call=True
 )
-def execute_sql_query(n_clicks, query):
-    if not query or not query.strip():
-        return (
-            dbc.Alert([
-                html.I(className="fas fa-exclamation-triangle me-2"),
-                "Please enter a SQL query to execute"
-            ], color="warning"),
-            "",
-            None,
-            True
-        )
-    
-    if not config_store.db_config:
-        return (
-            dbc.Alert([
-                html.I(className="fas fa-times-circle me-2"),
-                "Database configuration not found. Please reconfigure the database connection."
-            ], color="danger"),
-            "",
-            None,
-            True
-        )
-    
-    try:
-        engine = config_store.db_config['engine']
-        
-        # Execute the query
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn)
-        
-        if df.empty:
-            return (
-                dbc.Alert([
-                    html.I(className="fas fa-info-circle me-2"),
-                    "Query executed successfully but returned no data"
-                ], color="info"),
-                "",
-                None,
-                True
-            )
-        
-        # Save to data/erp_sales_data.csv
-        os.makedirs("data", exist_ok=True)
-        output_path = os.path.join("data", "erp_sales_data.csv")
-        df.to_csv(output_path, index=False)
-        
-        # Create enhanced preview
-        preview_card = dbc.Card([
-            dbc.CardHeader([
-                html.H5([
-                    html.I(className="fas fa-table me-2"),
-                    f"Query Results Preview"
-                ], className="mb-0")
-            ]),
-            dbc.CardBody([
-                # Results summary
-                dbc.Row([
-                    dbc.Col([
-                        dbc.Card([
-                            dbc.CardBody([
-                                html.H4(str(len(df)), className="text-primary mb-0"),
-                                html.P("Total Rows", className="mb-0 text-muted")
-                            ], className="text-center")
-                        ])
-                    ], md=4),
-                    dbc.Col([
-                        dbc.Card([
-                            dbc.CardBody([
-                                html.H4(str(len(df.columns)), className="text-success mb-0"),
-                                html.P("Columns", className="mb-0 text-muted")
-                            ], className="text-center")
-                        ])
-                    ], md=4),
-                    dbc.Col([
-                        dbc.Card([
-                            dbc.CardBody([
-                                html.H4(f"{len(df.head(10))}", className="text-info mb-0"),
-                                html.P("Preview Rows", className="mb-0 text-muted")
-                            ], className="text-center")
-                        ])
-                    ], md=4)
-                ], className="mb-4"),
-                
-                # Column information
-                html.Div([
-                    html.H6("Columns:", className="fw-bold"),
-                    html.P(", ".join(df.columns.tolist()), className="text-muted small")
-                ], className="mb-3"),
-                
-                # Data table preview
-                html.Div([
-                    dbc.Table.from_dataframe(
-                        df.head(10), 
-                        striped=True, 
-                        bordered=True, 
-                        hover=True,
-                        size="sm",
-                        responsive=True,
-                        className="mb-0"
-                    )
-                ], style={'maxHeight': '400px', 'overflowY': 'auto'})
-            ])
-        ], style={'borderRadius': '10px'})
-        
-        # Success status
+def execute_sql_query(n_clicks, n_intervals, cancel_clicks, refresh_clicks, query, job_id, session_id):
+    triggered_id = ctx.triggered_id
+
+    if triggered_id == "cancel-sql-btn":
+        job_runner.cancel(job_id, session_id)
+        job = job_runner.get(job_id, session_id)
+        return _waiting(job) if job and job.active else (no_update,) * 10
+
+    if triggered_id == "query-job-interval":
+        job = job_runner.get(job_id, session_id)
+        if job is None:
+            return _finished(dbc.Alert("The query job is no longer available. Please run it again.",
+                                       color="warning"))
+        if job.active:
+            return _waiting(job)
+        if job.status == FAILED:
+            return _finished(_error_alert(job.error))
+        if job.status == CANCELLED:
+            return _finished(dbc.Alert([
+                html.I(className="fas fa-ban me-2"),
+                "Query cancelled"
+            ], color="secondary"))
+
+        result = job.result
+        if job.name == "sql-refresh":
+            return _finished(dbc.Alert([
+                html.I(className="fas fa-check-circle me-2"),
+                f"Refresh complete: fetched {result['delta_rows']:,} new or changed rows "
+                f"({result['replaced_rows']:,} replaced). The extract now has {result['rows']:,} rows, "
+                f"up to {result['watermark']}."
+            ], color="success"))
+        if result is None:
+            return _finished(dbc.Alert([
+                html.I(className="fas fa-info-circle me-2"),
+                "Query executed successfully but returned no data"
+            ], color="info"))
+
         success_status = dbc.Alert([
             html.I(className="fas fa-check-circle me-2"),
-            f"Query executed successfully! Retrieved {len(df)} rows with {len(df.columns)} columns. Saved to data/erp_sales_data.csv"
+            f"Query executed successfully! Retrieved {result['rows']:,} rows with {len(result['columns'])} columns. Saved to {result['output_path']}"
         ], color="success")
-        
-        return success_status, preview_card, df.to_dict('records'), False
-        
-    except Exception as e:
-        error_msg = str(e)
-        error_alert = dbc.Alert([
-            html.H5([html.I(className="fas fa-times-circle me-2"), "Query Execution Failed"], className="mb-3"),
-            html.P(f"Error: {error_msg}"),
-            html.Hr(),
-            html.P("Suggestions:", className="fw-bold mb-2"),
-            html.Ul([
-                html.Li("Check your SQL syntax"),
-                html.Li("Verify table and column names exist"),
-                html.Li("Ensure you have proper database permissions"),
-                html.Li("Check if the database connection is still active")
-            ]),
-            html.Small("If the error persists, contact your database administrator.", className="text-muted")
-        ], color="danger")
-        
-        return error_alert, "", None, True
+        # The full result stays on the server; the browser only gets its handle
+        return _finished(success_status, _preview_card(result),
+                         {'handle': result['handle'], 'rows': result['rows']},
+                         f"/results/{result['handle']}.csv")
 
-@callback(
-    Output("download-csv-file", "data"),
-    Input("download-results-btn", "n_clicks"),
-    State("executed-query-data", "data"),
-    prevent_initial_call=True
-)
-def download_query_results(n_clicks, data):
-    if not data:
-        return None
-    
-    # Convert back to DataFrame
-    df = pd.DataFrame(data)
+    if triggered_id != "refresh-sql-btn" and (not query or not query.strip()):
+        return _finished(dbc.Alert([
+            html.I(className="fas fa-exclamation-triangle me-2"),
+            "Please enter a SQL query to execute"
+        ], color="warning"))
     
-    # Generate filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"sql_query_results_{timestamp}.csv"
+    db_config = config_store.get_config(session_id)
+    if not db_config or 'engine' not in db_config:
+        return _finished(dbc.Alert([
+            html.I(className="fas fa-times-circle me-2"),
+            "Database configuration not found. Please reconfigure the database connection."
+        ], color="danger"))
     
-    # Save to temporary file for download
-    df.to_csv(filename, index=False)
-    
-    return dcc.send_file(filename)
\ No newline at end of file
+    try:
+        if triggered_id == "refresh-sql-btn":
+            job = job_runner.submit(session_id, "sql-refresh", run_refresh, db_config['engine'], session_id)
+        else:
+            job = job_runner.submit(session_id, "sql-query", run_query, db_config['engine'], query, session_id)
+    except JobLimitError as e:
+        return _finished(dbc.Alert([
+            html.I(className="fas fa-hourglass-half me-2"),
+            str(e)
+        ], color="warning"))
+    return _waiting(job)
+
+# ---------------------- Result Grid ----------------------
+@callback(
+    Output("query-results-grid", "data"),
+    Output("query-results-grid", "page_count"),
+    Output("query-results-grid", "page_current"),
+    Output("query-grid-status", "children"),
+    Input("query-results-grid", "page_current"),
+    Input("query-results-grid", "page_size"),
+    Input("query-results-grid", "sort_by"),
+    Input("query-results-grid", "filter_query"),
+    State("executed-query-data", "data")
+)
+def update_result_grid(page_current, page_size, sort_by, filter_query, result):
+    # Only the requested page crosses the wire, however large the result
+    path = get_result(result['handle']) if result else None
+    if path is None:
+        return [], 0, 0, "This result has expired; run the query again."
+    if any(p.endswith((".sort_by", ".filter_query")) for p in ctx.triggered_prop_ids or {}):
+        page_current = 0  # a new sort or filter starts from the top
+    page_size = page_size or GRID_PAGE_SIZE
+    try:
+        records, matching, total = result_grid.page(result['handle'], path, page_current, page_size,
+                                                    sort_by, filter_query)
+    except ValueError as e:
+        return [], 0, 0, f"Filter not applied: {e}"
+    page_count = max(-(-matching // page_size), 1)
+    start = (page_current or 0) * page_size
+    if matching:
+        status = f"Rows {start + 1:,}-{start + len(records):,} of {matching:,}"
+    else:
+        status = "No rows match the filter"
+    if matching != total:
+        status += f" (filtered from {total:,})"
+    return records, page_count, page_current or 0, status
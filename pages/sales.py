@@ -1,19 +1,143 @@
 import dash
-from dash import dcc, html, Input, Output, State, callback
+from dash import dcc, html, Input, Output, State, callback, ctx, no_update
 import dash_bootstrap_components as dbc
 import pandas as pd
-import plotly.express as px
-import plotly.io as pio
+import os
+from data_cache import dataset_cache
+from dtype_optimizer import widen
+from extract_schema import SchemaError
+from figure_cache import figure_cache
+from chart_renderer import chart_renderer
+from extract_store import extract_path, iter_extract, prune_partitions, read_extract
+from export_store import export_selection, new_export_dir
+from refresh_store import changed_dates_between, load_state
+from sales_index import build_hierarchy, merge_hierarchy
+from filter_engine import FilterEngine
+from sales_cube import SalesCube
+from timeseries import bucket_series, choose_frequency
+from live_query import LiveQueryError, live_backend, source_sql
+import config_store
+from job_runner import job_runner, JobLimitError, DONE
 
-dash.register_page(__name__, path="/", name="Sales")
+dash.register_page(__name__, path="/sales", name="Sales")
 
 # ---------------------- Load Data ----------------------
-def load_data():
+# Columns the interactive filters and charts need; exports read everything
+DASHBOARD_COLUMNS = [
+    "state_name", "city_name", "Party_Name", "t_code", "location_code",
+    "invoice_date", "item_name", "invoice_value", "qty", "Taxable_Value",
+]
+
+# Columns behind the cascading dropdowns
+INDEX_COLUMNS = ["state_name", "city_name", "Party_Name", "t_code", "location_code"]
+
+def _variant(columns, row_groups=None):
+    variant = tuple(columns) if columns else None
+    return variant if row_groups is None else (variant, tuple(row_groups))
+
+def load_data(columns=None, session_id=None, row_groups=None):
+    # Parsed once per column set (and partition selection) and shared across
+    # callbacks; reloaded when the session's extract file changes
     try:
-        return pd.read_csv("data/erp_sales_data.csv", parse_dates=["invoice_date"])
-    except:
+        return dataset_cache.get(extract_path(session_id), lambda p: read_extract(p, columns, row_groups),
+                                 variant=_variant(columns, row_groups))
+    except FileNotFoundError:
+        # No extract yet; schema errors in one that exists surface as they are
         return pd.DataFrame()
 
+def load_derived(name, builder, session_id=None, row_groups=None):
+    # Structure built from the dashboard columns once per dataset version
+    try:
+        return dataset_cache.derive(extract_path(session_id),
+                                    lambda p: read_extract(p, DASHBOARD_COLUMNS, row_groups),
+                                    name, builder, variant=_variant(DASHBOARD_COLUMNS, row_groups))
+    except FileNotFoundError:
+        return builder(pd.DataFrame())
+
+def load_index(session_id=None, source=None):
+    if source == LIVE:
+        try:
+            engine, sql = _live_source(session_id)
+            return build_hierarchy(live_backend.index_frame(engine, sql))
+        except _live_errors():
+            # The chart shows the reason
+            return build_hierarchy(pd.DataFrame())
+    path = extract_path(session_id)
+
+    def refresh(previous, old_signature, signature):
+        # A refresh merge replaces rows by key; when the key includes every
+        # dropdown column it can only add combinations, so only the days it
+        # touched are read
+        changed = changed_dates_between(path, old_signature, signature)
+        state = load_state(path)
+        if changed is None or not set(INDEX_COLUMNS) <= set(state['key_columns']):
+            return None
+        row_groups = prune_partitions(path, date_range=(min(changed), max(changed))) if changed else []
+        return merge_hierarchy(previous, build_hierarchy(read_extract(path, INDEX_COLUMNS, row_groups)))
+
+    # Built from a narrow projection that isn't kept around
+    try:
+        return dataset_cache.get(path, lambda p: build_hierarchy(read_extract(p, INDEX_COLUMNS)),
+                                 variant='hierarchy', refresher=refresh)
+    except FileNotFoundError:
+        return build_hierarchy(pd.DataFrame())
+
+def load_cube(session_id=None):
+    path = extract_path(session_id)
+
+    def build(p):
+        # Aggregated a chunk of partitions at a time; the invoice lines
+        # themselves are never all in memory
+        return SalesCube.from_parts(iter_extract(p, DASHBOARD_COLUMNS))
+
+    def refresh(previous, old_signature, signature):
+        # After an incremental refresh only the days it touched are re-aggregated
+        changed = changed_dates_between(path, old_signature, signature)
+        if changed is None:
+            return None
+        row_groups = prune_partitions(path, date_range=(min(changed), max(changed))) if changed else []
+        return SalesCube.refreshed(previous, read_extract(path, DASHBOARD_COLUMNS, row_groups), changed)
+
+    try:
+        return dataset_cache.get(path, build, variant='cube', refresher=refresh)
+    except FileNotFoundError:
+        return SalesCube(pd.DataFrame())
+
+# ---------------------- Live Mode ----------------------
+# In live mode the charts are aggregated by the database (see live_query)
+# instead of from the extract
+LIVE = 'live'
+
+def _live_errors():
+    """Exceptions a live query reports in the chart (SQLAlchemy is only loaded once one runs)"""
+    from sqlalchemy.exc import SQLAlchemyError
+    return (LiveQueryError, SQLAlchemyError)
+
+def _live_source(session_id=None):
+    config = config_store.get_config(session_id)
+    engine = config.get('engine') if config else None
+    if engine is None:
+        raise LiveQueryError("Live mode needs a configured database connection")
+    return engine, source_sql(session_id, extract_path(session_id))
+
+def live_item_summary(state, city, customer, tcode, locn, from_date, to_date, metric, session_id=None):
+    equals, date_range = _predicates(state, city, customer, tcode, locn, from_date, to_date)
+    engine, sql = _live_source(session_id)
+    return live_backend.item_summary(engine, sql, equals, date_range, metric)
+
+def live_time_summary(state, city, customer, tcode, locn, from_date, to_date, metric, session_id=None):
+    # Bucketed by the database at the frequency the span calls for
+    equals, date_range = _predicates(state, city, customer, tcode, locn, from_date, to_date)
+    engine, sql = _live_source(session_id)
+    span = date_range or live_backend.date_span(engine, sql, equals)
+    if span is None:
+        return pd.DataFrame()
+    freq = choose_frequency(*span)
+    series = live_backend.time_summary(engine, sql, equals, date_range, metric, freq)
+    if series.empty:
+        return series
+    return bucket_series(series, metric, freq=freq)
+
 # ---------------------- Layout ----------------------
 layout = dbc.Container([
     html.H2("📊 Sales Dashboard", className="text-center mb-4"),
@@ -82,15 +206,45 @@ layout = dbc.Container([
                 value='bar',
                 labelStyle={'display': 'inline-block', 'margin-right': '15px'}
             )
-        ])
+        ], md=6),
+
+        dbc.Col([
+            html.Label("Data Source"),
+            dcc.RadioItems(
+                id='data-source',
+                options=[
+                    {'label': 'Extract', 'value': 'extract'},
+                    {'label': 'Live database', 'value': LIVE}
+                ],
+                value='extract',
+                labelStyle={'display': 'inline-block', 'margin-right': '15px'}
+            )
+        ], md=6)
     ], className="mb-4"),
 
     dbc.Row([
         dbc.Col([
-            html.Button("Export to Excel", id='export-excel-btn', className="btn btn-success me-3"),
-            dcc.Download(id="download-excel"),
-            html.Button("Export to PDF", id='export-pdf-btn', className="btn btn-danger"),
-            dcc.Download(id="download-pdf")
+            html.Div(
+                dcc.Dropdown(
+                    id='export-format',
+                    options=[
+                        {'label': 'Excel (.xlsx)', 'value': 'xlsx'},
+                        {'label': 'CSV (.csv.gz)', 'value': 'csv.gz'},
+                        {'label': 'Parquet', 'value': 'parquet'}
+                    ],
+                    value='xlsx',
+                    clearable=False
+                ),
+                style={'display': 'inline-block', 'width': '170px', 'verticalAlign': 'middle'},
+                className="me-2"
+            ),
+            html.Button("Export Data", id='export-data-btn', className="btn btn-success me-3"),
+            html.Button("Export to PDF", id='export-pdf-btn', className="btn btn-danger me-3"),
+            html.Button("PDF Report (all charts)", id='export-report-btn', className="btn btn-outline-danger"),
+            dcc.Download(id="download-pdf"),
+            html.Div(id="export-status", className="mt-3"),
+            dcc.Store(id="export-job"),
+            dcc.Interval(id="export-job-interval", interval=1000, disabled=True)
         ])
     ], className="mb-4"),
 
@@ -98,46 +252,89 @@ layout = dbc.Container([
 ])
 
 # ---------------------- Dropdown Callbacks ----------------------
-@callback(Output('state-dd', 'options'), Input('sales-graph', 'id'))
-def populate_states(_):
-    df = load_data()
-    return [{'label': i, 'value': i} for i in df['state_name'].dropna().unique()]
-
-@callback(Output('city-dd', 'options'), Input('state-dd', 'value'))
-def populate_cities(state):
-    df = load_data()
+@callback(Output('state-dd', 'options'), Input('session-id', 'data'), Input('data-source', 'value'))
+def populate_states(session_id, source=None):
+    return load_index(session_id, source)['states']
+
+@callback(Output('city-dd', 'options'), Input('state-dd', 'value'), State('session-id', 'data'),
+          State('data-source', 'value'))
+def populate_cities(state, session_id, source=None):
     if state:
-        return [{'label': i, 'value': i} for i in df[df['state_name'] == state]['city_name'].dropna().unique()]
+        return load_index(session_id, source)['cities'].get(state, [])
     return []
 
-@callback(Output('cust-dd', 'options'), Input('state-dd', 'value'), Input('city-dd', 'value'))
-def populate_customers(state, city):
-    df = load_data()
+@callback(Output('cust-dd', 'options'), Input('state-dd', 'value'), Input('city-dd', 'value'),
+          State('session-id', 'data'), State('data-source', 'value'))
+def populate_customers(state, city, session_id, source=None):
     if state and city:
-        return [{'label': i, 'value': i} for i in df[(df['state_name'] == state) & (df['city_name'] == city)]['Party_Name'].dropna().unique()]
+        return load_index(session_id, source)['customers'].get((state, city), [])
     return []
 
-@callback(Output('tcode-dd', 'options'), Input('sales-graph', 'id'))
-def populate_tcodes(_):
-    df = load_data()
-    return [{'label': i, 'value': i} for i in df['t_code'].dropna().unique()]
+@callback(Output('tcode-dd', 'options'), Input('session-id', 'data'), Input('data-source', 'value'))
+def populate_tcodes(session_id, source=None):
+    return load_index(session_id, source)['t_codes']
 
-@callback(Output('locn-dd', 'options'), Input('sales-graph', 'id'))
-def populate_locns(_):
-    df = load_data()
-    return [{'label': i, 'value': i} for i in df['location_code'].dropna().unique()]
+@callback(Output('locn-dd', 'options'), Input('session-id', 'data'), Input('data-source', 'value'))
+def populate_locns(session_id, source=None):
+    return load_index(session_id, source)['location_codes']
 
 # ---------------------- Filtering Function ----------------------
-def filter_df(state, city, customer, tcode, locn, from_date, to_date):
-    df = load_data()
-    if state: df = df[df['state_name'] == state]
-    if city: df = df[df['city_name'] == city]
-    if customer: df = df[df['Party_Name'] == customer]
-    if tcode: df = df[df['t_code'] == tcode]
-    if locn: df = df[df['location_code'] == locn]
-    if from_date and to_date:
-        df = df[(df['invoice_date'] >= from_date) & (df['invoice_date'] <= to_date)]
-    return df
+def _predicates(state, city, customer, tcode, locn, from_date, to_date):
+    equals = {}
+    if state: equals['state_name'] = state
+    if city: equals['city_name'] = city
+    if customer: equals['Party_Name'] = customer
+    if tcode: equals['t_code'] = tcode
+    if locn: equals['location_code'] = locn
+    date_range = (from_date, to_date) if from_date and to_date else None
+    return equals, date_range
+
+def _prune(equals, date_range, session_id=None):
+    # Row groups of the partitions that can match; None reads everything
+    try:
+        return prune_partitions(extract_path(session_id), equals, date_range)
+    except (OSError, ValueError):
+        return None
+
+def filter_df(state, city, customer, tcode, locn, from_date, to_date, columns=None, session_id=None):
+    equals, date_range = _predicates(state, city, customer, tcode, locn, from_date, to_date)
+
+    # Only the partitions the date/t_code/location filters can match are read
+    row_groups = _prune(equals, date_range, session_id)
+    df = load_data(columns, session_id, row_groups)
+    if df.empty:
+        return df
+    engine = load_derived('filter_engine', FilterEngine, session_id, row_groups)
+    if len(engine.df) != len(df):
+        # Extract changed between the two reads; index this copy directly
+        engine = FilterEngine(df)
+    return engine.filter(equals, date_range, frame=df)
+
+def item_summary(state, city, customer, tcode, locn, from_date, to_date, metric, session_id=None):
+    # Answer from the pre-aggregated cube; fall back to raw invoice lines
+    # for anything it doesn't cover
+    equals, date_range = _predicates(state, city, customer, tcode, locn, from_date, to_date)
+    summary = load_cube(session_id).query(equals, date_range, metric)
+    if summary is not None:
+        return summary
+    df = filter_df(state, city, customer, tcode, locn, from_date, to_date, DASHBOARD_COLUMNS, session_id)
+    if df.empty:
+        return df
+    return widen(df[["item_name", metric]]).groupby("item_name", observed=True)[metric].sum().reset_index()
+
+def time_summary(state, city, customer, tcode, locn, from_date, to_date, metric, session_id=None):
+    # Day-level cube cells are enough to bucket by day/week/month; raw rows otherwise
+    equals, date_range = _predicates(state, city, customer, tcode, locn, from_date, to_date)
+    cube = load_cube(session_id)
+    if cube.has_dates:
+        df = cube.cells(equals, date_range, metric)
+    else:
+        df = None
+    if df is None:
+        df = filter_df(state, city, customer, tcode, locn, from_date, to_date, DASHBOARD_COLUMNS, session_id)
+    if df.empty:
+        return df
+    return bucket_series(df, metric)
 
 # ---------------------- Chart Callback ----------------------
 @callback(
@@ -150,56 +347,156 @@ def filter_df(state, city, customer, tcode, locn, from_date, to_date):
     Input('date-picker', 'start_date'),
     Input('date-picker', 'end_date'),
     Input('chart-type', 'value'),
-    Input('metric-dd', 'value')
+    Input('metric-dd', 'value'),
+    Input('session-id', 'data'),
+    Input('data-source', 'value')
 )
-def update_graph(state, city, customer, tcode, locn, from_date, to_date, chart_type, metric):
-    df = filter_df(state, city, customer, tcode, locn, from_date, to_date)
-    if df.empty:
-        return px.bar(title="No data available")
-
-    if chart_type == 'bar':
-        summary = df.groupby("item_name")[metric].sum().reset_index()
-        fig = px.bar(summary, x='item_name', y=metric, title=f"{metric} by Item")
-    elif chart_type == 'pie':
-        summary = df.groupby("item_name")[metric].sum().reset_index()
-        fig = px.pie(summary, names='item_name', values=metric, title=f"{metric} Distribution")
-    elif chart_type == 'line':
-        summary = df.groupby("item_name")[metric].sum().reset_index()
-        fig = px.line(summary, x='item_name', y=metric, title=f"{metric} by Item")
+def update_graph(state, city, customer, tcode, locn, from_date, to_date, chart_type, metric, session_id=None,
+                 source=None):
+    # Imported on the first chart, not at startup
+    import plotly.express as px
+
+    if source == LIVE:
+        # Not figure-cached: live answers go stale, the backend caches them briefly
+        try:
+            return build_figure(state, city, customer, tcode, locn, from_date, to_date, chart_type, metric,
+                                session_id, source)
+        except _live_errors() as e:
+            return px.bar(title=f"Live query failed: {e}")
+
+    # Same filters on the same extract always give the same figure
+    path = extract_path(session_id)
+    key = figure_cache.key(path, dataset_cache.signature(path), state, city, customer, tcode, locn,
+                           from_date, to_date, chart_type, metric)
+    try:
+        return figure_cache.get_or_build(key, lambda: build_figure(state, city, customer, tcode, locn,
+                                                                   from_date, to_date, chart_type, metric,
+                                                                   session_id))
+    except SchemaError as e:
+        # Shown instead of an empty chart; not cached, so a fixed extract shows up at once
+        return px.bar(title=f"The sales extract doesn't match the expected schema: {e}")
+
+def build_figure(state, city, customer, tcode, locn, from_date, to_date, chart_type, metric, session_id=None,
+                 source=None):
+    import plotly.express as px
+
+    live = source == LIVE
+    if chart_type in ('bar', 'pie', 'line'):
+        summarize = live_item_summary if live else item_summary
+        summary = summarize(state, city, customer, tcode, locn, from_date, to_date, metric, session_id)
+        if summary.empty:
+            return px.bar(title="No data available")
+        if chart_type == 'bar':
+            fig = px.bar(summary, x='item_name', y=metric, title=f"{metric} by Item")
+        elif chart_type == 'pie':
+            fig = px.pie(summary, names='item_name', values=metric, title=f"{metric} Distribution")
+        else:
+            fig = px.line(summary, x='item_name', y=metric, title=f"{metric} by Item")
     else:
-        fig = px.line(df, x='invoice_date', y=metric, color='item_name', title=f"{metric} Over Time")
+        summarize = live_time_summary if live else time_summary
+        series = summarize(state, city, customer, tcode, locn, from_date, to_date, metric, session_id)
+        if series.empty:
+            return px.bar(title="No data available")
+        fig = px.line(series, x='invoice_date', y=metric, color='item_name', title=f"{metric} Over Time")
 
     fig.update_layout(transition_duration=500)
     return fig
 
-# ---------------------- Export Callbacks ----------------------
-@callback(
-    Output("download-excel", "data"),
-    Input("export-excel-btn", "n_clicks"),
-    State('state-dd', 'value'), State('city-dd', 'value'),
-    State('cust-dd', 'value'), State('tcode-dd', 'value'),
-    State('locn-dd', 'value'), State('date-picker', 'start_date'),
-    State('date-picker', 'end_date'),
-    prevent_initial_call=True
-)
-def export_excel(n_clicks, state, city, cust, tcode, locn, from_d, to_d):
-    df = filter_df(state, city, cust, tcode, locn, from_d, to_d)
-    filename = "Filtered_Sales_Data.xlsx"
-    df.to_excel(filename, index=False)
-    return dcc.send_file(filename)
+# ---------------------- Export Jobs ----------------------
+# Exports run on the background job pool; data exports write into their
+# own temp directory and PDFs are rendered in memory, so concurrent exports
+# never share a file
+def build_data_export(job, state, city, cust, tcode, locn, from_d, to_d, fmt, session_id=None):
+    # Only the matching row ids are computed up front; the rows themselves
+    # (all columns) are streamed from the extract into the export file
+    equals, date_range = _predicates(state, city, cust, tcode, locn, from_d, to_d)
+    row_groups = _prune(equals, date_range, session_id)
+    engine = load_derived('filter_engine', FilterEngine, session_id, row_groups)
+    rows = engine.select(equals, date_range)
+    return export_selection(job, extract_path(session_id), rows, fmt, new_export_dir(),
+                            expected_rows=len(engine.df), row_groups=row_groups)
+
+# Charts rendered into the multi-page PDF report, in page order
+REPORT_CHART_TYPES = ['bar', 'pie', 'line', 'time']
+
+def build_pdf_export(job, s, c, p, t, l, fd, td, chart_type, metric, session_id=None, source=None):
+    # Usually a cache hit: the chart on screen was built with the same inputs
+    fig = update_graph(s, c, p, t, l, fd, td, chart_type, metric, session_id, source)
+    return dcc.send_bytes(chart_renderer.render(fig, "pdf"), "chart_export.pdf")
 
+def build_pdf_report(job, s, c, p, t, l, fd, td, metric, session_id=None, source=None):
+    figs = [update_graph(s, c, p, t, l, fd, td, chart_type, metric, session_id, source)
+            for chart_type in REPORT_CHART_TYPES]
+    return dcc.send_bytes(chart_renderer.render_report(figs), "sales_report.pdf")
+
+# ---------------------- Export Callbacks ----------------------
 @callback(
     Output("download-pdf", "data"),
+    Output("export-job", "data"),
+    Output("export-job-interval", "disabled"),
+    Output("export-status", "children"),
+    Input("export-data-btn", "n_clicks"),
     Input("export-pdf-btn", "n_clicks"),
+    Input("export-report-btn", "n_clicks"),
+    Input("export-job-interval", "n_intervals"),
     State('state-dd', 'value'), State('city-dd', 'value'),
     State('cust-dd', 'value'), State('tcode-dd', 'value'),
     State('locn-dd', 'value'), State('date-picker', 'start_date'),
     State('date-picker', 'end_date'), State('chart-type', 'value'),
-    State('metric-dd', 'value'),
+    State('metric-dd', 'value'), State('export-format', 'value'),
+    State("export-job", "data"), State("session-id", "data"),
+    State('data-source', 'value'),
     prevent_initial_call=True
 )
-def export_pdf(n, s, c, p, t, l, fd, td, chart_type, metric):
-    fig = update_graph(s, c, p, t, l, fd, td, chart_type, metric)
-    filename = "chart_export.pdf"
-    pio.write_image(fig, filename, format='pdf', width=1000, height=600)
-    return dcc.send_file(filename)
+def handle_exports(data_clicks, pdf_clicks, report_clicks, n_intervals, s, c, p, t, l, fd, td, chart_type, metric, fmt,
+                   job_id, session_id, source=None):
+    triggered_id = ctx.triggered_id
+    job = job_runner.get(job_id, session_id)
+
+    if triggered_id == "export-job-interval":
+        if job is None:
+            return no_update, None, True, ""
+        if job.active:
+            rows = job.progress.get('rows')
+            if rows is None:
+                return no_update, no_update, False, no_update
+            return no_update, no_update, False, html.Div(
+                [dbc.Spinner(size="sm", spinner_class_name="me-2"), f"Exporting... {rows:,} rows written"],
+                className="text-muted")
+        if job.status != DONE:
+            error = dbc.Alert(f"Export failed: {job.error or job.status}", color="danger")
+            return no_update, None, True, error
+        if job.name == "data-export":
+            # Large files are streamed by the /exports route, not sent through the callback
+            link = dbc.Alert([
+                "Your export is ready. ",
+                html.A(f"Download {os.path.basename(job.result)}", href=f"/exports/{job.id}?token={job.token}",
+                       download=os.path.basename(job.result), className="alert-link"),
+            ], color="success")
+            return no_update, None, True, link
+        # PDFs are rendered in memory and come back ready for dcc.Download
+        return job.result, None, True, ""
+
+    if job is not None and job.active:
+        return no_update, no_update, no_update, dbc.Alert("An export is already in progress", color="warning")
+
+    if triggered_id == "export-data-btn" and source == LIVE:
+        # Invoice lines only exist in the extract; live mode holds aggregates
+        return no_update, no_update, no_update, dbc.Alert(
+            "Data exports come from the extract; switch the data source to Extract to export rows",
+            color="warning")
+
+    try:
+        if triggered_id == "export-data-btn":
+            job = job_runner.submit(session_id, "data-export", build_data_export, s, c, p, t, l, fd, td,
+                                    fmt or 'xlsx', session_id)
+        elif triggered_id == "export-report-btn":
+            job = job_runner.submit(session_id, "pdf-report", build_pdf_report, s, c, p, t, l, fd, td,
+                                    metric, session_id, source)
+        else:
+            job = job_runner.submit(session_id, "pdf-export", build_pdf_export, s, c, p, t, l, fd, td,
+                                    chart_type, metric, session_id, source)
+    except JobLimitError as e:
+        return no_update, no_update, no_update, dbc.Alert(str(e), color="warning")
+    status = html.Div([dbc.Spinner(size="sm", spinner_class_name="me-2"), "Preparing export..."], className="text-muted")
+    return no_update, job.id, False, status
@@ -0,0 +1,229 @@
+# result_grid.py
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from extract_store import read_extract
+
+# Server-side paging, sorting and filtering for stored query results.
+# The SQL page's result table only ever receives the rows on screen: the
+# stored result is loaded once per worker, a filter/sort combination is
+# turned into an array of row ids once (and kept for the next pages), and
+# each page request is a slice of that array. Payload size per page is the
+# same for a 200-row result as for a 2M-row one.
+#
+# Results are immutable (every query gets a new handle), so loaded frames
+# are keyed by handle rather than by file signature; the result store
+# touches a file's mtime on every access to keep it alive.
+
+GRID_PAGE_SIZE = int(os.environ.get("RESULT_GRID_PAGE_SIZE", 50))
+GRID_CACHE_MAX_BYTES = int(os.environ.get("RESULT_GRID_CACHE_MB", 512)) * 1024 * 1024
+# Filter/sort combinations remembered per result
+GRID_MAX_VIEWS = 16
+
+# One DataTable filter expression, e.g. {qty} >= 5 or {item_name} icontains "bolt"
+_FILTER_RE = re.compile(
+    r"^\{(?P<column>[^}]+)\}\s+(?P<case>[si]?)(?P<op>>=|<=|!=|<|>|=|eq|ne|lt|le|gt|ge|contains|datestartswith)\s+"
+    r"(?P<value>.+)$"
+)
+_OPERATORS = {"eq": "=", "ne": "!=", "lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+
+
+def parse_filter_query(filter_query):
+    """[(column, operator, value, case_sensitive)] for a DataTable filter_query"""
+    terms = []
+    for part in (filter_query or "").split(" && "):
+        part = part.strip()
+        if not part:
+            continue
+        match = _FILTER_RE.match(part)
+        if match is None:
+            raise ValueError(f"Unsupported filter: {part}")
+        value = match.group("value").strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'`":
+            value = value[1:-1]
+        op = _OPERATORS.get(match.group("op"), match.group("op"))
+        terms.append((match.group("column"), op, value, match.group("case") != "i"))
+    return terms
+
+
+def _text_mask(values, op, value, case_sensitive):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Test each distinct label once, then map back through the codes
+        labels = pd.Series(values.cat.categories.astype(str))
+        hits = _text_mask(labels, op, value, case_sensitive).to_numpy()
+        codes = values.cat.codes.to_numpy()
+        return pd.Series(np.where(codes >= 0, hits[np.maximum(codes, 0)], False), index=values.index)
+    text = values.astype("str")
+    if not case_sensitive:
+        text, value = text.str.lower(), value.lower()
+    if op == "contains":
+        mask = text.str.contains(value, regex=False)
+    elif op == "=":
+        mask = text == value
+    elif op == "!=":
+        mask = text != value
+    else:
+        mask = {"<": text < value, "<=": text <= value, ">": text > value, ">=": text >= value}[op]
+    return mask.fillna(False).astype(bool)
+
+
+def _date_mask(values, op, value):
+    if op == "datestartswith" or op == "contains":
+        # "2024", "2024-03" or "2024-03-05": everything inside that period
+        freq = {4: "Y", 7: "M"}.get(len(value), "D")
+        period = pd.Period(value, freq=freq)
+        return (values >= period.start_time) & (values <= period.end_time)
+    bound = pd.Timestamp(value)
+    return {"=": values == bound, "!=": values != bound, "<": values < bound, "<=": values <= bound,
+            ">": values > bound, ">=": values >= bound}[op]
+
+
+def _number_mask(values, op, value):
+    if op == "contains":
+        return _text_mask(values.astype("str"), op, value, True)
+    number = float(value)
+    return {"=": values == number, "!=": values != number, "<": values < number, "<=": values <= number,
+            ">": values > number, ">=": values >= number}[op]
+
+
+def filter_mask(frame, terms):
+    """Boolean mask of the rows matching every term (None when there are none)"""
+    mask = None
+    for column, op, value, case_sensitive in terms:
+        if column not in frame.columns:
+            continue
+        values = frame[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            term = _date_mask(values, op, value)
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            term = _number_mask(values, op, value)
+        else:
+            term = _text_mask(values, op, value, case_sensitive)
+        term = term.to_numpy(dtype=bool)
+        mask = term if mask is None else mask & term
+    return mask
+
+
+def _sort_key(values):
+    # Categories come back from Parquet in order of appearance; rank the
+    # labels so a categorical column sorts alphabetically
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        ranks = np.argsort(np.argsort(values.cat.categories.astype(str))).astype(float)
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, ranks[np.maximum(codes, 0)], np.nan)
+    return values.to_numpy()
+
+
+def sorted_rows(frame, rows, sort_by):
+    """rows (ids into frame) ordered by sort_by, DataTable-style [{column_id, direction}]"""
+    sort_by = [s for s in (sort_by or []) if s.get('column_id') in frame.columns]
+    if not sort_by or len(rows) == 0:
+        return rows
+    subset = frame.iloc[rows]
+    keys = pd.DataFrame({i: _sort_key(subset[s['column_id']]) for i, s in enumerate(sort_by)})
+    order = keys.sort_values(list(keys.columns), ascending=[s.get('direction') != "desc" for s in sort_by],
+                             kind="stable", na_position="last").index.to_numpy()
+    return rows[order]
+
+
+def _page_records(page):
+    page = page.copy()
+    for col in page.columns:
+        values = page[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            has_time = bool((values.dropna() != values.dropna().dt.normalize()).any())
+            page[col] = values.dt.strftime("%Y-%m-%d %H:%M:%S" if has_time else "%Y-%m-%d")
+    page = page.astype(object)
+    return page.where(page.notna(), None).to_dict("records")
+
+
+def column_specs(frame):
+    """DataTable column definitions for frame"""
+    specs = []
+    for col in frame.columns:
+        values = frame[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            kind = "datetime"
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            kind = "numeric"
+        else:
+            kind = "text"
+        specs.append({'name': str(col), 'id': str(col), 'type': kind})
+    return specs
+
+
+class ResultGrid:
+    def __init__(self, max_bytes=GRID_CACHE_MAX_BYTES, max_views=GRID_MAX_VIEWS):
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.max_bytes = max_bytes
+        self.max_views = max_views
+
+    def _entry(self, handle, path):
+        with self._lock:
+            entry = self._results.get(handle)
+            if entry is not None:
+                self._results.move_to_end(handle)
+                return entry
+            load_lock = self._load_locks.setdefault(handle, threading.Lock())
+        with load_lock:
+            with self._lock:
+                entry = self._results.get(handle)
+                if entry is not None:
+                    return entry
+            frame = read_extract(path)
+            entry = {'frame': frame, 'views': OrderedDict(), 'lock': threading.Lock(),
+                     'bytes': int(frame.memory_usage(deep=True).sum())}
+            with self._lock:
+                self._results[handle] = entry
+                self._evict(keep=handle)
+            return entry
+
+    def _evict(self, keep=None):
+        total = sum(e['bytes'] for e in self._results.values())
+        for handle in list(self._results):
+            if total <= self.max_bytes:
+                break
+            if handle == keep:
+                continue
+            total -= self._results.pop(handle)['bytes']
+            self._load_locks.pop(handle, None)
+
+    def _rows(self, entry, filter_query, sort_by):
+        key = (filter_query or "", tuple((s.get('column_id'), s.get('direction')) for s in (sort_by or [])))
+        with entry['lock']:
+            rows = entry['views'].get(key)
+            if rows is not None:
+                entry['views'].move_to_end(key)
+                return rows
+        frame = entry['frame']
+        mask = filter_mask(frame, parse_filter_query(filter_query))
+        rows = np.arange(len(frame)) if mask is None else np.flatnonzero(mask)
+        rows = sorted_rows(frame, rows, sort_by)
+        with entry['lock']:
+            entry['views'][key] = rows
+            while len(entry['views']) > self.max_views:
+                entry['views'].popitem(last=False)
+        return rows
+
+    def columns(self, handle, path):
+        return column_specs(self._entry(handle, path)['frame'])
+
+    def page(self, handle, path, page_current=0, page_size=GRID_PAGE_SIZE, sort_by=None, filter_query=None):
+        """(records on the page, matching rows, total rows) for one grid request.
+
+        Raises ValueError for filters the grid can't evaluate.
+        """
+        entry = self._entry(handle, path)
+        rows = self._rows(entry, filter_query, sort_by)
+        start = max(page_current or 0, 0) * page_size
+        page = entry['frame'].iloc[rows[start:start + page_size]]
+        return _page_records(page), len(rows), len(entry['frame'])
+
+
+# Results the SQL page pages through, loaded at most GRID_CACHE_MAX_BYTES per worker
+result_grid = ResultGrid()
@@ -0,0 +1,107 @@
+# result_store.py
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+import pyarrow.parquet as pq
+from flask import Blueprint, Response, abort
+
+# Server-side store for SQL Query Interface results.
+# Each result is a Parquet file named by an opaque handle; the browser only
+# ever holds the handle. Files live on disk (so every worker process sees
+# them), the file mtime doubles as the last-access time, and old or
+# oversized results are evicted when new ones are added.
+
+RESULTS_DIR = os.path.join("data", "results")
+RESULT_TTL_SECONDS = int(os.environ.get("RESULT_TTL_SECONDS", 3600))
+RESULT_STORE_MAX_BYTES = int(os.environ.get("RESULT_STORE_MAX_MB", 2048)) * 1024 * 1024
+CSV_BATCH_ROWS = 50000
+
+_HANDLE_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def new_handle():
+    return uuid.uuid4().hex
+
+
+def result_path(handle):
+    """Path of the Parquet file behind handle (raises ValueError if malformed)"""
+    if not handle or not _HANDLE_RE.match(handle):
+        raise ValueError(f"Invalid result handle: {handle!r}")
+    return os.path.join(RESULTS_DIR, f"{handle}.parquet")
+
+
+def get_result(handle):
+    """Path of a live result, refreshing its TTL; None if missing or expired"""
+    try:
+        path = result_path(handle)
+        st = os.stat(path)
+    except (ValueError, OSError):
+        return None
+    if time.time() - st.st_mtime > RESULT_TTL_SECONDS:
+        _remove(path)
+        return None
+    os.utime(path)
+    return path
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict(keep=None):
+    """Drop expired results, then least recently used ones over the size budget"""
+    if not os.path.isdir(RESULTS_DIR):
+        return
+    now = time.time()
+    entries = []
+    for name in os.listdir(RESULTS_DIR):
+        if not name.endswith(".parquet"):
+            continue
+        path = os.path.join(RESULTS_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if now - st.st_mtime > RESULT_TTL_SECONDS:
+            _remove(path)
+        else:
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= RESULT_STORE_MAX_BYTES:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        _remove(path)
+        total -= size
+
+
+def iter_csv(path, batch_rows=CSV_BATCH_ROWS):
+    """Yield a stored result as CSV text, one record batch at a time"""
+    header = True
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+        yield batch.to_pandas().to_csv(index=False, header=header)
+        header = False
+
+
+# ---------------------- Download Route ----------------------
+results_blueprint = Blueprint("results", __name__)
+
+
+@results_blueprint.route("/results/<handle>.csv")
+def download_result_csv(handle):
+    path = get_result(handle)
+    if path is None:
+        abort(404)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(
+        iter_csv(path),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=sql_query_results_{timestamp}.csv"},
+    )
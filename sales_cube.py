@@ -0,0 +1,146 @@
+# sales_cube.py
+import pandas as pd
+from dtype_optimizer import widen
+from filter_engine import FilterEngine
+
+# Pre-aggregated cube for the item-level charts.
+# Invoice lines are summed once per dataset version down to one row per
+# (state, city, customer, t_code, location, item, day). Bar/pie/line charts
+# then filter and aggregate the cube instead of the raw extract; anything
+# the cube can't answer exactly returns None so callers fall back to raw rows.
+
+CUBE_DIMENSIONS = ["state_name", "city_name", "Party_Name", "t_code", "location_code", "item_name"]
+CUBE_MEASURES = ["invoice_value", "qty", "Taxable_Value"]
+DATE_COLUMN = "invoice_date"
+
+
+def _aggregate(df):
+    """(dimensions, measures, covers_dates, day-level frame) for invoice lines"""
+    dimensions = [c for c in CUBE_DIMENSIONS if c in df.columns]
+    measures = [c for c in CUBE_MEASURES if c in df.columns]
+    has_dates = DATE_COLUMN in df.columns and pd.api.types.is_datetime64_dtype(df[DATE_COLUMN])
+    # Day buckets answer date ranges exactly only if no row carries a time of day
+    if has_dates:
+        dates = df[DATE_COLUMN]
+        covers_dates = bool((dates.isna() | (dates == dates.dt.normalize())).all())
+    else:
+        covers_dates = False
+
+    keys = list(dimensions)
+    if has_dates:
+        keys.append(DATE_COLUMN)
+        if not covers_dates:
+            df = df.assign(**{DATE_COLUMN: df[DATE_COLUMN].dt.normalize()})
+    if "item_name" in dimensions and measures:
+        frame = widen(df[keys + measures]).groupby(keys, observed=True, dropna=False)[measures].sum().reset_index()
+    else:
+        frame = pd.DataFrame(columns=keys + measures)
+    return dimensions, measures, covers_dates, frame
+
+
+def _concat(frames, dimensions):
+    frame = pd.concat(frames, ignore_index=True)
+    for col in dimensions:
+        # concat falls back to object when the category sets differ
+        if not isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype("category")
+    return frame
+
+
+class SalesCube:
+    def __init__(self, df):
+        dimensions, measures, covers_dates, frame = _aggregate(df)
+        self._assign(dimensions, measures, DATE_COLUMN in frame.columns, covers_dates, frame, len(df))
+
+    def _assign(self, dimensions, measures, has_dates, covers_dates, frame, source_rows):
+        self.dimensions = dimensions
+        self.measures = measures
+        self.has_dates = has_dates
+        self.covers_dates = covers_dates
+        self.frame = frame
+        self.source_rows = source_rows
+        self.engine = FilterEngine(frame)
+        # The frame doesn't change after this; only the engine's indexes grow
+        self._frame_bytes = int(frame.memory_usage(deep=True).sum())
+
+    @classmethod
+    def from_parts(cls, parts):
+        """Cube over the concatenation of parts, aggregated one part at a time.
+
+        Lets the cube be built from an extract's partitions without ever
+        holding all of its invoice lines in memory.
+        """
+        pieces = []
+        source_rows = 0
+        for part in parts:
+            pieces.append(_aggregate(part))
+            source_rows += len(part)
+        if len(pieces) == 1:
+            dimensions, measures, covers_dates, frame = pieces[0]
+        elif not pieces:
+            return cls(pd.DataFrame())
+        else:
+            dimensions, measures = pieces[0][0], pieces[0][1]
+            if any(p[0] != dimensions or p[1] != measures for p in pieces):
+                raise ValueError("Extract parts have different columns")
+            covers_dates = all(p[2] for p in pieces)
+            frame = _concat([p[3] for p in pieces], dimensions)
+            keys = [c for c in frame.columns if c not in measures]
+            if "item_name" in dimensions and measures:
+                # Parts may share cells (e.g. row groups of an unpartitioned file)
+                frame = frame.groupby(keys, observed=True, dropna=False)[measures].sum().reset_index()
+        cube = cls.__new__(cls)
+        cube._assign(dimensions, measures, DATE_COLUMN in frame.columns, covers_dates, frame, source_rows)
+        return cube
+
+    @classmethod
+    def refreshed(cls, previous, df, changed_dates, source_rows=None):
+        """previous with the days in changed_dates re-aggregated from df.
+
+        df must hold every current invoice line of those days (it may hold
+        more, e.g. whole partitions), so an incremental refresh costs in
+        proportion to what it touched. Returns None when previous can't be
+        reused (different columns, no day buckets).
+        """
+        changed = pd.DatetimeIndex(pd.to_datetime(list(changed_dates))).normalize()
+        if not previous.has_dates or not previous.covers_dates:
+            return None
+        if DATE_COLUMN not in df.columns or not pd.api.types.is_datetime64_dtype(df[DATE_COLUMN]):
+            return None
+        touched = df[df[DATE_COLUMN].dt.normalize().isin(changed)]
+        dimensions, measures, covers_dates, part = _aggregate(touched)
+        if dimensions != previous.dimensions or measures != previous.measures:
+            return None
+
+        kept = previous.frame[~previous.frame[DATE_COLUMN].isin(changed)]
+        cube = cls.__new__(cls)
+        cube._assign(dimensions, measures, True, covers_dates, _concat([kept, part], dimensions),
+                     previous.source_rows if source_rows is None else source_rows)
+        return cube
+
+    @property
+    def nbytes(self):
+        return self._frame_bytes + self.engine.nbytes
+
+    def covers(self, equals, date_range, metric, by="item_name"):
+        """Whether the cube can answer this query exactly"""
+        if by not in self.dimensions or metric not in self.measures:
+            return False
+        if any(col not in self.dimensions for col in equals):
+            return False
+        if date_range is not None and not self.covers_dates:
+            return False
+        return True
+
+    def cells(self, equals, date_range, metric, by="item_name"):
+        """Matching day-level cube rows, or None if the cube can't answer"""
+        if not self.covers(equals, date_range, metric, by):
+            return None
+        return self.engine.filter(equals, date_range)
+
+    def query(self, equals, date_range, metric, by="item_name"):
+        """Summary of metric grouped by `by`, or None if the cube can't answer"""
+        cells = self.cells(equals, date_range, metric, by)
+        if cells is None:
+            return None
+        return cells.groupby(by, observed=True)[metric].sum().reset_index()
@@ -0,0 +1,74 @@
+# sales_index.py
+import pandas as pd
+
+# Precomputed lookups for the sales page dropdowns.
+# Built once per dataset version from the distinct
+# (state, city, customer) combinations, so cascading dropdowns become
+# dictionary lookups instead of scans over every invoice line.
+
+def _options(values):
+    return [{'label': v, 'value': v} for v in values]
+
+
+def _distinct(df, col):
+    if col not in df.columns:
+        return []
+    return df[col].dropna().unique().tolist()
+
+
+def build_hierarchy(df):
+    """Build the State -> City -> Customer index plus flat t_code/location lists"""
+    cities = {}
+    customers = {}
+    levels = []
+    for col in ("state_name", "city_name", "Party_Name"):
+        if col not in df.columns:
+            break
+        levels.append(col)
+
+    if levels:
+        # Distinct combinations keep first-appearance order, like unique()
+        combos = df[levels].drop_duplicates()
+        # dicts double as insertion-ordered sets
+        for row in combos.itertuples(index=False, name=None):
+            state = row[0]
+            if pd.isna(state):
+                continue
+            state_cities = cities.setdefault(state, {})
+            if len(row) < 2 or pd.isna(row[1]):
+                continue
+            state_cities[row[1]] = None
+            city_customers = customers.setdefault((state, row[1]), {})
+            if len(row) < 3 or pd.isna(row[2]):
+                continue
+            city_customers[row[2]] = None
+
+    return {
+        'states': _options(_distinct(df, "state_name")),
+        'cities': {state: _options(values) for state, values in cities.items()},
+        'customers': {key: _options(values) for key, values in customers.items()},
+        't_codes': _options(_distinct(df, "t_code")),
+        'location_codes': _options(_distinct(df, "location_code")),
+    }
+
+
+def _union(options, more):
+    seen = {o['value'] for o in options}
+    return options + [o for o in more if o['value'] not in seen]
+
+
+def merge_hierarchy(index, other):
+    """index with other's options added (existing order kept, new values appended)"""
+    cities = dict(index['cities'])
+    for state, options in other['cities'].items():
+        cities[state] = _union(cities.get(state, []), options)
+    customers = dict(index['customers'])
+    for key, options in other['customers'].items():
+        customers[key] = _union(customers.get(key, []), options)
+    return {
+        'states': _union(index['states'], other['states']),
+        'cities': cities,
+        'customers': customers,
+        't_codes': _union(index['t_codes'], other['t_codes']),
+        'location_codes': _union(index['location_codes'], other['location_codes']),
+    }
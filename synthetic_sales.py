@@ -0,0 +1,280 @@
+# synthetic_sales.py
+import argparse
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from extract_schema import SALES_SCHEMA
+
+# Deterministic synthetic sales data in the shape SQL query.txt returns
+# from the ERP, for benchmarks and for trying the dashboards without an
+# Oracle connection. Rows are invoice lines with every SALES_SCHEMA
+# column; dates and months are text the way Oracle's TO_CHAR returns them,
+# so loading the data goes through the same conforming as a real extract.
+#
+# The same row count and seed always give the same rows. Customers and
+# items scale with the row count (about 600 customers and 150 items at
+# 10k rows, 40k customers and 5k items at 50M), purchases are skewed
+# towards a few large customers and fast-moving items, and invoices
+# have one to a dozen lines, each for a different item.
+#
+# python synthetic_sales.py --rows 1m --out data/erp_sales_data.parquet
+# python synthetic_sales.py --rows 100k --out sales.csv     # for /upload
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000, "50m": 50_000_000}
+# Rows generated at a time; fixed, so the data doesn't depend on how it's consumed
+CHUNK_ROWS = 1_000_000
+
+# Date range of SQL query.txt
+START_DATE = pd.Timestamp("2020-04-01")
+END_DATE = pd.Timestamp("2024-04-30")
+
+# (GST state code, name, share of customers)
+STATES = [
+    ("27", "Maharashtra", 16), ("24", "Gujarat", 11), ("29", "Karnataka", 9), ("33", "Tamil Nadu", 9),
+    ("09", "Uttar Pradesh", 8), ("07", "Delhi", 7), ("36", "Telangana", 6), ("19", "West Bengal", 5),
+    ("08", "Rajasthan", 5), ("23", "Madhya Pradesh", 4), ("06", "Haryana", 4), ("03", "Punjab", 3),
+    ("32", "Kerala", 3), ("37", "Andhra Pradesh", 3), ("21", "Odisha", 2), ("20", "Jharkhand", 2),
+    ("22", "Chhattisgarh", 2), ("10", "Bihar", 2), ("18", "Assam", 1), ("30", "Goa", 1),
+    ("05", "Uttarakhand", 1), ("02", "Himachal Pradesh", 1),
+]
+CITIES_PER_SHARE = 3
+# Companies (t_code) and their selling locations, with the state each ships from
+LOCATIONS = {
+    "0": [("100001", "27"), ("100002", "27"), ("100003", "24")],
+    "1": [("200001", "29"), ("200002", "33")],
+    "2": [("300001", "09")],
+}
+T_CODE_SHARE = {"0": 0.6, "1": 0.3, "2": 0.1}
+
+PARTY_PREFIXES = ["Shree", "Om", "Sai", "Balaji", "Ganesh", "Laxmi", "Krishna", "Durga", "Jai", "Mahalaxmi",
+                  "Vishal", "Royal", "National", "Bharat", "Supreme", "Modern", "New", "United", "Star", "Global"]
+PARTY_SUFFIXES = ["Traders", "Enterprises", "Industries", "Agencies", "Distributors", "Hardware", "Steel",
+                  "Electricals", "Engineering Works", "Sales Corporation", "Marketing", "Suppliers",
+                  "Pvt Ltd", "& Sons", "Trading Co"]
+STREETS = ["Industrial Area", "MIDC", "Station Road", "Main Bazar", "GIDC Estate", "Ring Road", "Market Yard"]
+ITEM_MATERIALS = ["MS", "SS", "GI", "PVC", "HDPE", "Copper", "Aluminium", "Brass", "CI", "UPVC"]
+ITEM_FORMS = ["Pipe", "Sheet", "Bolt", "Nut", "Washer", "Elbow", "Valve", "Flange", "Rod", "Wire", "Coupling",
+              "Bracket", "Clamp", "Bend", "Tee"]
+ITEM_SIZES = ["6 mm", "10 mm", "12 mm", "16 mm", "20 mm", "25 mm", "32 mm", "40 mm", "50 mm", "1/2 in",
+              "3/4 in", "1 in", "2 in", "4 in"]
+UOMS = ["NOS", "KGS", "MTR", "SET", "BOX", "LTR"]
+GST_RATES = np.array([5.0, 12.0, 18.0, 28.0])
+SALE_TYPES = ["Tax Invoice", "Tax Invoice - Depot", "Export Invoice", "Scrap Sale"]
+SALE_TYPE_SHARE = [0.78, 0.15, 0.04, 0.03]
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+
+def parse_rows(value):
+    """Row count from 50000, 10k, 1m or 50M"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([km]?)", str(value).strip().lower())
+    if match is None:
+        raise ValueError(f"Not a row count: {value!r}")
+    return int(float(match.group(1)) * {"": 1, "k": 1_000, "m": 1_000_000}[match.group(2)])
+
+
+def _zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _combinations(n, *parts):
+    """n distinct names combining one word from each part"""
+    names = []
+    total = int(np.prod([len(p) for p in parts]))
+    for i in range(n):
+        words, rest = [], i % total
+        for part in parts:
+            words.append(part[rest % len(part)])
+            rest //= len(part)
+        name = " ".join(words)
+        names.append(name if i < total else f"{name} {i // total + 1}")
+    return names
+
+
+class SalesDimensions:
+    """Customers, items, locations and the calendar shared by every chunk"""
+
+    def __init__(self, rows, seed=0):
+        rng = np.random.default_rng([seed, 0])
+        self.parties = int(np.clip(np.sqrt(rows) * 6, 300, 40_000))
+        self.items = int(np.clip(np.sqrt(rows) * 1.5, 150, 5_000))
+
+        # Cities belong to states; customers to cities, one company each
+        city_state = np.repeat(np.arange(len(STATES)), [s[2] * CITIES_PER_SHARE for s in STATES])
+        city_names = [f"{STATES[s][1].split()[0]} City {i + 1}" for i, s in enumerate(city_state)]
+        state_share = np.array([s[2] for s in STATES], dtype=float)
+        t_codes = list(T_CODE_SHARE)
+        party_tcode = rng.choice(len(t_codes), self.parties, p=list(T_CODE_SHARE.values()))
+        party_state = rng.choice(len(STATES), self.parties, p=state_share / state_share.sum())
+        # Half of a company's customers are in a state it ships from
+        state_index = {code: i for i, (code, _, _) in enumerate(STATES)}
+        local = rng.random(self.parties) < 0.5
+        for t, code in enumerate(t_codes):
+            home = [state_index[state] for _, state in LOCATIONS[code]]
+            mask = local & (party_tcode == t)
+            party_state[mask] = rng.choice(home, int(mask.sum()))
+        party_city = np.array([rng.choice(np.flatnonzero(city_state == s)) for s in party_state])
+        # Biggest buyers first, so popularity follows the Zipf ranks
+        self.party_weights = _zipf_weights(self.parties, 0.8)
+
+        letters = rng.choice(list("ABCDEFGHJKLMNPRSTUVWXYZ"), (self.parties, 6))
+        digits = rng.integers(1000, 10000, self.parties)
+        pan = ["".join(l[:5]) + str(d) + l[5] for l, d in zip(letters, digits)]
+        registered = rng.random(self.parties) > 0.08
+        self.party = pd.DataFrame({
+            "state_name": [STATES[s][1] for s in party_state],
+            "city_name": [city_names[c] for c in party_city],
+            "Party_Name": _combinations(self.parties, PARTY_PREFIXES, PARTY_SUFFIXES),
+            "party_address": [f"Plot No. {rng.integers(1, 400)}, {STREETS[i % len(STREETS)]}, {city_names[c]}"
+                              for i, c in enumerate(party_city)],
+            "Party_Gstn_No": [f"{STATES[s][0]}{p}1Z{i % 10}" if r else None
+                              for i, (s, p, r) in enumerate(zip(party_state, pan, registered))],
+            "Place_of_Supply": [f"{STATES[s][0]}-{STATES[s][1]}" for s in party_state],
+            "t_code": [t_codes[t] for t in party_tcode],
+        })
+        self.party_state_code = np.array([STATES[s][0] for s in party_state])
+        self.party_tcode = party_tcode
+
+        self.item_weights = _zipf_weights(self.items, 0.9)
+        self.item = pd.DataFrame({
+            "sale_item": [f"FG{i + 1:05d}" for i in range(self.items)],
+            "item_name": _combinations(self.items, ITEM_FORMS, ITEM_MATERIALS, ITEM_SIZES),
+            "uom": rng.choice(UOMS, self.items, p=[0.45, 0.25, 0.15, 0.07, 0.05, 0.03]),
+        })
+        self.item_rate = np.round(np.exp(rng.normal(5.5, 1.2, self.items)), 2)
+        self.item_gst = rng.choice(GST_RATES, self.items, p=[0.1, 0.2, 0.6, 0.1])
+
+        # Selling days: no Sundays, a busier March (year end) and steady growth
+        days = pd.date_range(START_DATE, END_DATE, freq="D")
+        weights = np.where(days.dayofweek == 6, 0.0, 1.0)
+        weights *= np.where(days.month == 3, 1.6, 1.0)
+        weights *= 1 + 0.5 * np.arange(len(days)) / len(days)
+        self.day_weights = weights / weights.sum()
+        self.day_text = np.array([f"{d.day:02d}-{MONTHS[d.month - 1]}-{d.year}" for d in days], dtype=object)
+        self.month_text = np.array([f"{MONTHS[d.month - 1]}/{d.year}" for d in days], dtype=object)
+        # Financial year (April-March) as it prefixes invoice numbers, e.g. 2324
+        fy_start = np.where(days.month >= 4, days.year, days.year - 1)
+        self.day_fin_year = np.array([f"{y % 100:02d}{(y + 1) % 100:02d}" for y in fy_start], dtype=object)
+
+        self.locations = {t: [loc for loc, _ in LOCATIONS[t]] for t in t_codes}
+        self.location_state = {loc: state for t in t_codes for loc, state in LOCATIONS[t]}
+
+
+def _repeated(line_invoice, item):
+    """Mask of lines whose item an earlier line of the same invoice already has"""
+    return pd.Series(line_invoice * (int(item.max()) + 1) + item).duplicated().to_numpy()
+
+
+def _chunk(dims, rows, rng, first_invoice):
+    """rows invoice lines; invoices are numbered from first_invoice"""
+    # Lines per invoice: mostly a few, occasionally a dozen
+    lines = np.minimum(rng.geometric(0.35, rows), 12)
+    ends = np.cumsum(lines)
+    invoices = int(np.searchsorted(ends, rows)) + 1
+    lines = lines[:invoices]
+    lines[-1] -= ends[invoices - 1] - rows
+    line_invoice = np.repeat(np.arange(invoices), lines)
+
+    inv_party = rng.choice(dims.parties, invoices, p=dims.party_weights)
+    inv_day = rng.choice(len(dims.day_weights), invoices, p=dims.day_weights)
+    inv_location = np.empty(invoices, dtype=object)
+    for t, code in enumerate(T_CODE_SHARE):
+        mask = dims.party_tcode[inv_party] == t
+        inv_location[mask] = rng.choice(dims.locations[code], int(mask.sum()))
+    inv_type = rng.choice(len(SALE_TYPES), invoices, p=SALE_TYPE_SHARE)
+    inv_tcs = rng.random(invoices) < 0.1
+
+    party = inv_party[line_invoice]
+    day = inv_day[line_invoice]
+    location = inv_location[line_invoice]
+    # An invoice lists each item once (SQL query.txt groups by invoice and
+    # item, and uploads upsert on that key): repeats are redrawn
+    item = rng.choice(dims.items, rows, p=dims.item_weights)
+    repeated = _repeated(line_invoice, item)
+    while repeated.any():
+        item[repeated] = rng.choice(dims.items, int(repeated.sum()), p=dims.item_weights)
+        repeated = _repeated(line_invoice, item)
+
+    qty = np.maximum(np.round(np.exp(rng.normal(2.5, 1.1, rows))), 1)
+    taxable = np.round(qty * dims.item_rate[item] * rng.uniform(0.85, 1.0, rows), 2)
+    gst = dims.item_gst[item]
+    # CGST+SGST within the shipping state, IGST across states
+    intra = dims.party_state_code[party] == pd.Series(location).map(dims.location_state).to_numpy()
+    tax = np.round(taxable * gst / 100, 2)
+    cgst = np.where(intra, np.round(tax / 2, 2), 0.0)
+    sgst = np.where(intra, tax - cgst, 0.0)
+    igst = np.where(intra, 0.0, tax)
+    tcs = np.where(inv_tcs[line_invoice], np.round((taxable + tax) * 0.001, 2), 0.0)
+
+    numbers = np.array([f"{fy}{first_invoice + i:08d}" for i, fy in enumerate(dims.day_fin_year[inv_day])],
+                       dtype=object)
+    columns = {
+        **{col: pd.Categorical(dims.party[col].to_numpy(dtype=object)[party])
+           for col in ["state_name", "city_name", "Party_Name", "party_address", "Party_Gstn_No", "t_code"]},
+        "location_code": pd.Categorical(location),
+        "Invoice_Number": numbers[line_invoice],
+        "invoice_date": dims.day_text[day],
+        "Month": pd.Categorical(dims.month_text[day]),
+        "Place_of_Supply": pd.Categorical(dims.party["Place_of_Supply"].to_numpy(dtype=object)[party]),
+        **{col: pd.Categorical(dims.item[col].to_numpy(dtype=object)[item]) for col in ["sale_item", "item_name", "uom"]},
+        "Sale_Type": pd.Categorical(np.array(SALE_TYPES, dtype=object)[inv_type[line_invoice]]),
+        "invoice_value": taxable + tax + tcs,
+        "qty": qty,
+        "gst_Rate": gst,
+        "Taxable_Value": taxable,
+        "cgst_amount": cgst,
+        "sgst_amount": sgst,
+        "igst_amount": igst,
+        "tcs_amount": tcs,
+    }
+    return pd.DataFrame({col: columns[col] for col in SALES_SCHEMA}), invoices
+
+
+def iter_sales_data(rows, seed=0):
+    """Yield rows synthetic invoice lines in chunks of up to CHUNK_ROWS"""
+    dims = SalesDimensions(rows, seed)
+    first_invoice = 1
+    for i, start in enumerate(range(0, rows, CHUNK_ROWS)):
+        rng = np.random.default_rng([seed, i + 1])
+        chunk, invoices = _chunk(dims, min(CHUNK_ROWS, rows - start), rng, first_invoice)
+        first_invoice += invoices
+        yield chunk
+
+
+def generate_sales_data(rows, seed=0):
+    """rows synthetic invoice lines as one DataFrame"""
+    return pd.concat(list(iter_sales_data(rows, seed)), ignore_index=True)
+
+
+def write_sales_data(rows, path, seed=0):
+    """Write synthetic data to a CSV file or a (partitioned) Parquet extract"""
+    if path.endswith(".csv"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        for i, chunk in enumerate(iter_sales_data(rows, seed)):
+            chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        return path
+
+    from extract_store import ExtractWriter, publish_extract
+    tmp_path = path + ".raw"
+    with ExtractWriter(tmp_path) as writer:
+        for chunk in iter_sales_data(rows, seed):
+            writer.write(chunk)
+    try:
+        return publish_extract(tmp_path, path)
+    finally:
+        os.remove(tmp_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write deterministic synthetic ERP sales data")
+    parser.add_argument("--rows", default="1m", help=f"row count, e.g. 250000 or one of {', '.join(SCALES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join("data", "erp_sales_data.parquet"),
+                        help="a .csv file or a .parquet extract")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    write_sales_data(parse_rows(args.rows), args.out, args.seed)
+    print(f"Wrote {parse_rows(args.rows):,} rows to {args.out} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,45 @@
+# tests/test_config_store.py
+# Run from the repo root: python -m pytest tests
+import os
+import time
+import pytest
+import config_store
+from extract_store import extract_path, session_extract_path
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    # SESSIONS_DIR is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SESSION_SECRET", "test")
+    monkeypatch.setattr(config_store, "_secret", None)
+    monkeypatch.setattr(config_store, "_last_touch", {})
+    session_id = config_store.new_session_id()
+    os.makedirs(config_store.session_dir(session_id))
+    open(session_extract_path(session_id), "w").close()
+    return session_id
+
+
+def _age(session_id, seconds):
+    then = time.time() - seconds
+    for path in (session_extract_path(session_id), config_store.session_dir(session_id)):
+        os.utime(path, (then, then))
+
+
+def test_idle_session_is_swept(session):
+    _age(session, config_store.SESSION_TTL_SECONDS + 60)
+    assert config_store.sweep_sessions(force=True) == 1
+    assert not os.path.exists(config_store.session_dir(session))
+
+
+def test_reading_the_extract_keeps_the_session(session):
+    _age(session, config_store.SESSION_TTL_SECONDS + 60)
+    assert extract_path(session) == session_extract_path(session)
+    assert config_store.sweep_sessions(force=True) == 0
+    assert os.path.exists(session_extract_path(session))
+
+
+def test_forged_session_ids_are_rejected(session):
+    key = session.split(".")[0]
+    assert config_store.session_dir(f"{key}.{'0' * 32}") is None
+    assert config_store.session_dir(session) is not None
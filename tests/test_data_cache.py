@@ -0,0 +1,44 @@
+# tests/test_data_cache.py
+# Run from the repo root: python -m pytest tests
+import pandas as pd
+from data_cache import DatasetCache
+
+
+def _files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"extract{i}.parquet"
+        path.write_bytes(b"x")
+        paths.append(str(path))
+    return paths
+
+
+def _hierarchy(n):
+    names = [f"Customer {i}" for i in range(n)]
+    return {'states': [{'label': v, 'value': v} for v in names], 'cities': {v: [] for v in names}}
+
+
+def test_dicts_count_against_the_budget(tmp_path):
+    first, second = _files(tmp_path, 2)
+    cache = DatasetCache(max_bytes=1)
+    cache.get(first, lambda p: _hierarchy(1000), variant='hierarchy')
+    assert cache.stats()['bytes'] > 100_000
+    cache.get(second, lambda p: _hierarchy(1000), variant='hierarchy')
+    assert cache.evictions == 1
+    assert cache.version(first, 'hierarchy') is None
+
+
+def test_frames_within_budget_stay_cached(tmp_path):
+    paths = _files(tmp_path, 3)
+    cache = DatasetCache(max_bytes=10 * 1024 * 1024)
+    loads = []
+
+    def load(path):
+        loads.append(path)
+        return pd.DataFrame({'qty': range(1000)})
+
+    for _ in range(2):
+        for path in paths:
+            cache.get(path, load)
+    assert loads == paths
+    assert cache.evictions == 0
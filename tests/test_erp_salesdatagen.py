@@ -0,0 +1,98 @@
+# tests/test_erp_salesdatagen.py
+# Run from the repo root: python -m pytest tests
+import io
+import pandas as pd
+import pytest
+import erp_salesdatagen
+
+HEADER = ("state_name,city_name,Party_Name,item_name,qty,Taxable_Value,cgst_amount,sgst_amount,"
+          "igst_amount,tcs_amount,invoice_value,t_code,location_code,invoice_date,Invoice_Number\n")
+
+
+def _line(invoice, item, qty, value=100.0):
+    return f"Kerala,Kochi,Acme,{item},{qty},{value},9,9,0,0,{value + 18},T1,L1,05-JAN-2024,{invoice}\n"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(erp_salesdatagen, 'DB', str(tmp_path / "erp_sales.db"))
+    erp_salesdatagen.init_db()
+    return erp_salesdatagen.app.test_client()
+
+
+def _upload(client, lines, mode='replace'):
+    data = {'file': (io.BytesIO((HEADER + ''.join(lines)).encode()), 'sales.csv'), 'mode': mode}
+    response = client.post('/upload', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _export(client, fmt):
+    data = io.BytesIO(client.get(f'/gen_csv?format={fmt}').data)
+    return pd.read_parquet(data) if fmt == 'parquet' else pd.read_csv(data)
+
+
+def test_csv_and_parquet_exports_match(client):
+    # Quantities in KGS or MTR are fractional
+    _upload(client, [_line("INV1", "Wire", 1.5), _line("INV1", "Cable", 2), _line("INV2", "Wire", 0.25)])
+    csv = _export(client, 'csv')
+    parquet = _export(client, 'parquet')
+    assert list(parquet['qty']) == [1.5, 2.0, 0.25]
+    for col in ('qty', 'Taxable_Value', 'invoice_value'):
+        assert list(csv[col]) == list(parquet[col])
+
+
+def test_parquet_keeps_fractions_in_integer_affinity_qty(client):
+    # Tables created when qty was declared INTEGER
+    conn = erp_salesdatagen.connect()
+    conn.execute(f'DROP TABLE {erp_salesdatagen.TABLE}')
+    conn.execute(f'CREATE TABLE {erp_salesdatagen.TABLE} (item_name TEXT, qty INTEGER)')
+    conn.executemany(f'INSERT INTO {erp_salesdatagen.TABLE} VALUES (?, ?)', [("Wire", 1.5), ("Cable", 2)])
+    conn.close()
+    assert list(_export(client, 'parquet')['qty']) == [1.5, 2.0]
+    assert list(_export(client, 'csv')['qty']) == [1.5, 2.0]
+
+
+def _count(where=""):
+    conn = erp_salesdatagen.connect()
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {erp_salesdatagen.TABLE} {where}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_replace_append_and_upsert_row_counts(client):
+    lines = [_line("INV1", "Wire", 1), _line("INV1", "Cable", 2), _line("INV2", "Wire", 3)]
+    assert _upload(client, lines)['rows'] == 3
+    _upload(client, lines[:2], mode='append')
+    assert _count() == 5
+    _upload(client, lines)
+    assert _count() == 3
+
+    # One revised line, one new line
+    result = _upload(client, [_line("INV1", "Cable", 7), _line("INV3", "Wire", 1)], mode='upsert')
+    assert result['rows'] == 2
+    assert _count() == 4
+    assert _count("WHERE Invoice_Number = 'INV1' AND item_name = 'Cable' AND qty = 7") == 1
+
+
+def test_upsert_keeps_the_last_of_repeated_keys(client):
+    _upload(client, [_line("INV1", "Wire", 1)])
+    _upload(client, [_line("INV1", "Wire", 2), _line("INV1", "Wire", 3)], mode='upsert')
+    assert _count() == 1
+    assert _count("WHERE qty = 3") == 1
+
+
+def test_upload_modes_are_validated(client):
+    response = client.post('/upload', data={'file': (io.BytesIO(HEADER.encode()), 'sales.csv'), 'mode': 'merge'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+def test_failed_upload_leaves_the_table_unchanged(client):
+    _upload(client, [_line("INV1", "Wire", 1)])
+    bad = _line("INV2", "Wire", 1).replace("05-JAN-2024", "not a date")
+    response = client.post('/upload', data={'file': (io.BytesIO((HEADER + bad).encode()), 'sales.csv'),
+                                            'mode': 'replace'}, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert _count() == 1
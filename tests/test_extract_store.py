@@ -0,0 +1,60 @@
+# tests/test_extract_store.py
+# Run from the repo root: python -m pytest tests
+import numpy as np
+import pandas as pd
+from extract_store import ExtractWriter, read_extract
+
+ROWS = 100
+
+
+def _write(path, chunks):
+    with ExtractWriter(str(path)) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return read_extract(str(path))
+
+
+def test_all_null_first_chunk_takes_later_values(tmp_path):
+    # A nullable column that is NULL for the whole first fetch
+    chunks = [
+        pd.DataFrame({'remarks': [None] * ROWS, 'qty': np.ones(ROWS)}),
+        pd.DataFrame({'remarks': ["urgent", "repeat"] * (ROWS // 2), 'qty': np.ones(ROWS)}),
+    ]
+    df = _write(tmp_path / "extract.parquet", chunks)
+    assert len(df) == 2 * ROWS
+    assert df['remarks'].isna().sum() == ROWS
+    assert set(df['remarks'].dropna()) == {"urgent", "repeat"}
+
+
+def test_integer_column_with_fractions_in_later_chunk(tmp_path):
+    # NUMBER columns are fetched as int64 while every value is whole
+    chunks = [
+        pd.DataFrame({'discount': np.arange(ROWS, dtype=np.int64)}),
+        pd.DataFrame({'discount': np.arange(ROWS) + 0.5}),
+    ]
+    df = _write(tmp_path / "extract.parquet", chunks)
+    assert len(df) == 2 * ROWS
+    assert df['discount'].sum() == 2 * np.arange(ROWS).sum() + ROWS * 0.5
+    assert [p.name for p in tmp_path.iterdir()] == ["extract.parquet"]
+
+
+def test_whole_numbers_load_as_integers(tmp_path):
+    df = _write(tmp_path / "extract.parquet", [pd.DataFrame({'cases': np.arange(ROWS, dtype=np.int64)})])
+    assert pd.api.types.is_integer_dtype(df['cases'])
+
+
+def test_integers_beyond_float_precision_round_trip(tmp_path):
+    # Document and row ids above 2**53 have no exact float64
+    ids = 2 ** 60 + np.arange(ROWS, dtype=np.int64)
+    df = _write(tmp_path / "extract.parquet", [pd.DataFrame({'doc_id': ids[:ROWS // 2]}),
+                                               pd.DataFrame({'doc_id': ids[ROWS // 2:]})])
+    assert df['doc_id'].astype(np.int64).tolist() == ids.tolist()
+
+
+def test_whole_floats_in_later_chunk_keep_integers_exact(tmp_path):
+    chunks = [
+        pd.DataFrame({'doc_id': np.array([2 ** 60 + 1] * ROWS, dtype=np.int64)}),
+        pd.DataFrame({'doc_id': np.full(ROWS, 2.0 ** 60)}),
+    ]
+    df = _write(tmp_path / "extract.parquet", chunks)
+    assert df['doc_id'].astype(np.int64).tolist() == [2 ** 60 + 1] * ROWS + [2 ** 60] * ROWS
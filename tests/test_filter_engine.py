@@ -0,0 +1,71 @@
+# tests/test_filter_engine.py
+# Run from the repo root: python -m pytest tests
+import numpy as np
+import pandas as pd
+import pytest
+from extract_store import read_extract, write_extract
+from filter_engine import FilterEngine
+from synthetic_sales import generate_sales_data
+
+ROWS = 5000
+
+
+@pytest.fixture(scope="module")
+def df(tmp_path_factory):
+    # Loaded the way the dashboard loads an extract: categories and datetimes
+    path = str(tmp_path_factory.mktemp("extract") / "extract.parquet")
+    write_extract(generate_sales_data(ROWS), path)
+    return read_extract(path)
+
+
+def _mask(df, equals, date_range):
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in equals.items():
+        mask &= (df[col] == value).to_numpy()
+    if date_range is not None:
+        dates = df['invoice_date']
+        mask &= ((dates >= date_range[0]) & (dates <= date_range[1])).to_numpy()
+    return mask
+
+
+def _cases(df):
+    first = df.iloc[0]
+    quarter = (pd.Timestamp("2023-01-01"), pd.Timestamp("2023-03-31"))
+    return [
+        ({'state_name': first['state_name']}, None),
+        ({'state_name': first['state_name'], 'city_name': first['city_name']}, None),
+        ({'t_code': first['t_code'], 'location_code': first['location_code']}, quarter),
+        ({}, quarter),
+        ({'Party_Name': first['Party_Name']}, quarter),
+    ]
+
+
+def test_select_matches_the_pandas_mask(df):
+    engine = FilterEngine(df)
+    for equals, date_range in _cases(df):
+        rows = engine.select(equals, date_range)
+        assert rows.tolist() == np.flatnonzero(_mask(df, equals, date_range)).tolist()
+
+
+def test_filter_returns_the_same_rows_as_boolean_indexing(df):
+    engine = FilterEngine(df)
+    for equals, date_range in _cases(df):
+        expected = df[_mask(df, equals, date_range)]
+        pd.testing.assert_frame_equal(engine.filter(equals, date_range), expected)
+
+
+def test_unknown_value_selects_nothing(df):
+    assert len(FilterEngine(df).select({'state_name': "Atlantis"})) == 0
+
+
+def test_no_predicates_select_everything(df):
+    engine = FilterEngine(df)
+    assert engine.select() is None
+    assert engine.filter() is df
+
+
+def test_indexes_are_built_lazily_and_counted(df):
+    engine = FilterEngine(df)
+    assert engine.nbytes == 0
+    engine.select({'state_name': df['state_name'].iloc[0]})
+    assert engine.nbytes > 0
@@ -0,0 +1,76 @@
+# tests/test_job_runner.py
+# Run from the repo root: python -m pytest tests
+import threading
+import pytest
+from job_runner import CANCELLED, DONE, JobLimitError, JobRunner, JobSnapshot
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    # Job snapshots go to data/jobs/ under the working directory
+    monkeypatch.chdir(tmp_path)
+    return JobRunner(workers=2, per_user=1)
+
+
+def _wait(runner, job, owner):
+    # Returns once the job's final snapshot has been written
+    job._future.result(timeout=10)
+    return runner.get(job.id, owner)
+
+
+def test_only_the_owner_sees_and_cancels_a_job(runner):
+    release = threading.Event()
+    job = runner.submit("alice", "query", lambda job: release.wait(10))
+    assert runner.get(job.id, "alice") is job
+    assert runner.get(job.id, "bob") is None
+    assert runner.get(job.id, None) is None
+    assert not runner.cancel(job.id, "bob")
+    release.set()
+    assert _wait(runner, job, "alice").status == DONE
+
+
+def test_cancel_runs_the_hooks_of_a_running_job(runner):
+    started, interrupted = threading.Event(), threading.Event()
+
+    def work(job):
+        job.on_cancel(interrupted.set)
+        started.set()
+        interrupted.wait(10)
+        job.check_cancelled()
+
+    job = runner.submit("alice", "query", work)
+    assert started.wait(10)
+    assert runner.cancel(job.id, "alice")
+    assert _wait(runner, job, "alice").status == CANCELLED
+    assert not runner.cancel(job.id, "alice")
+
+
+def test_jobs_per_owner_are_limited(runner):
+    release = threading.Event()
+    job = runner.submit("alice", "query", lambda job: release.wait(10))
+    with pytest.raises(JobLimitError):
+        runner.submit("alice", "query", lambda job: None)
+    # Other sessions have their own allowance
+    other = runner.submit("bob", "query", lambda job: None)
+    release.set()
+    _wait(runner, job, "alice")
+    _wait(runner, other, "bob")
+
+
+def test_download_token_is_checked(runner):
+    job = runner.submit("alice", "data-export", lambda job: "export.csv")
+    _wait(runner, job, "alice")
+    assert runner.get_by_token(job.id, job.token) is job
+    assert runner.get_by_token(job.id, "guess") is None
+    assert runner.get_by_token(job.id, None) is None
+
+
+def test_other_workers_see_the_snapshot(runner):
+    job = runner.submit("alice", "query", lambda job: {'rows': 3})
+    _wait(runner, job, "alice")
+    other_worker = JobRunner(workers=1)
+    snapshot = other_worker.get(job.id, "alice")
+    assert isinstance(snapshot, JobSnapshot)
+    assert (snapshot.status, snapshot.result) == (DONE, {'rows': 3})
+    assert other_worker.get(job.id, "bob") is None
+    assert other_worker.get_by_token(job.id, job.token) is not None
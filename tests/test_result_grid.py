@@ -0,0 +1,62 @@
+# tests/test_result_grid.py
+# Run from the repo root: python -m pytest tests
+import pandas as pd
+import pytest
+from extract_store import ExtractWriter
+from result_grid import ResultGrid, filter_mask, parse_filter_query, sorted_rows
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'item_name': pd.Categorical(["Bolt M6", "bolt M8", "Nut M6", None, "Washer"]),
+        'qty': [5, 12, 3, 8, 20],
+        'invoice_date': pd.to_datetime(["2024-03-05", "2024-03-20", "2024-04-01", "2023-12-31", "2024-03-05"]),
+    })
+
+
+def test_parse_filter_query():
+    terms = parse_filter_query('{qty} >= 5 && {item_name} icontains "bolt" && {invoice_date} datestartswith 2024-03')
+    assert terms == [("qty", ">=", "5", True), ("item_name", "contains", "bolt", False),
+                     ("invoice_date", "datestartswith", "2024-03", True)]
+    assert parse_filter_query('{qty} eq 5') == [("qty", "=", "5", True)]
+    assert parse_filter_query(None) == []
+
+
+def test_unsupported_filters_are_rejected():
+    with pytest.raises(ValueError):
+        parse_filter_query("qty > 5")
+
+
+def test_filter_mask_per_column_type(frame):
+    def rows(query):
+        return frame.index[filter_mask(frame, parse_filter_query(query))].tolist()
+
+    assert rows('{qty} > 5') == [1, 3, 4]
+    assert rows('{item_name} icontains "bolt"') == [0, 1]
+    assert rows('{item_name} contains "bolt"') == [1]
+    assert rows('{invoice_date} datestartswith 2024-03') == [0, 1, 4]
+    assert rows('{qty} < 10 && {invoice_date} datestartswith 2024') == [0, 2]
+    # Unknown columns don't narrow the result
+    assert filter_mask(frame, parse_filter_query('{missing} = 1')) is None
+
+
+def test_sorted_rows(frame):
+    rows = frame.index.to_numpy()
+    by_name = sorted_rows(frame, rows, [{'column_id': 'item_name', 'direction': 'asc'}])
+    assert frame['item_name'].iloc[by_name].tolist()[:4] == ["Bolt M6", "Nut M6", "Washer", "bolt M8"]
+    assert pd.isna(frame['item_name'].iloc[by_name[-1]])
+    by_qty = sorted_rows(frame, rows, [{'column_id': 'qty', 'direction': 'desc'}])
+    assert frame['qty'].iloc[by_qty].tolist() == [20, 12, 8, 5, 3]
+
+
+def test_pages_through_a_stored_result(tmp_path):
+    path = str(tmp_path / "result.parquet")
+    with ExtractWriter(path) as writer:
+        writer.write(pd.DataFrame({'qty': range(120)}))
+    grid = ResultGrid()
+    records, matching, total = grid.page("r1", path, page_current=1, page_size=50,
+                                         sort_by=[{'column_id': 'qty', 'direction': 'desc'}],
+                                         filter_query='{qty} >= 10')
+    assert (matching, total) == (110, 120)
+    assert [r['qty'] for r in records] == list(range(69, 19, -1))
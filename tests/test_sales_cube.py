@@ -0,0 +1,68 @@
+# tests/test_sales_cube.py
+# Run from the repo root: python -m pytest tests
+import numpy as np
+import pandas as pd
+import pytest
+from extract_store import read_extract, write_extract
+from sales_cube import SalesCube
+from synthetic_sales import generate_sales_data
+
+ROWS = 5000
+METRIC = 'invoice_value'
+
+
+@pytest.fixture(scope="module")
+def df(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("extract") / "extract.parquet")
+    write_extract(generate_sales_data(ROWS), path)
+    return read_extract(path)
+
+
+def _expected(df, equals, date_range):
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in equals.items():
+        mask &= (df[col] == value).to_numpy()
+    if date_range is not None:
+        mask &= ((df['invoice_date'] >= date_range[0]) & (df['invoice_date'] <= date_range[1])).to_numpy()
+    return df[mask].groupby('item_name', observed=True)[METRIC].sum()
+
+
+def _assert_answers(cube, df):
+    first = df.iloc[0]
+    quarter = (pd.Timestamp("2023-01-01"), pd.Timestamp("2023-03-31"))
+    for equals, date_range in [({}, None), ({'state_name': first['state_name']}, None),
+                               ({'t_code': first['t_code']}, quarter), ({}, quarter)]:
+        summary = cube.query(equals, date_range, METRIC).set_index('item_name')[METRIC]
+        expected = _expected(df, equals, date_range)
+        pd.testing.assert_series_equal(summary.sort_index(), expected.sort_index(), check_names=False,
+                                       check_index_type=False, check_categorical=False)
+
+
+def test_cube_answers_match_the_invoice_lines(df):
+    _assert_answers(SalesCube(df), df)
+
+
+def test_cube_built_from_parts_matches_one_built_whole(df):
+    parts = [df.iloc[:1000], df.iloc[1000:3000], df.iloc[3000:]]
+    _assert_answers(SalesCube.from_parts(parts), df)
+
+
+def test_refreshed_cube_matches_a_full_rebuild(df):
+    days = df['invoice_date'].drop_duplicates().sort_values().iloc[[3, 40]].tolist()
+    touched = df['invoice_date'].isin(days)
+    # A refresh that revised the lines of two days and added one more line
+    current = df.copy()
+    current.loc[touched, METRIC] = current.loc[touched, METRIC] * 2
+    current = pd.concat([current, df[touched].head(1)], ignore_index=True)
+
+    cube = SalesCube.refreshed(SalesCube(df), current[current['invoice_date'].isin(days)], days,
+                               source_rows=len(current))
+    assert cube is not None
+    assert cube.source_rows == len(current)
+    _assert_answers(cube, current)
+    assert cube.frame[METRIC].sum() == pytest.approx(SalesCube(current).frame[METRIC].sum())
+
+
+def test_refresh_without_dates_falls_back_to_a_rebuild(df):
+    previous = SalesCube(df.drop(columns=['invoice_date']))
+    assert SalesCube.refreshed(previous, df, [df['invoice_date'].iloc[0]]) is None
@@ -0,0 +1,17 @@
+# tests/test_synthetic_sales.py
+# Run from the repo root: python -m pytest tests
+from erp_salesdatagen import KEY_COLUMNS
+from synthetic_sales import generate_sales_data
+
+ROWS = 20000
+
+
+def test_same_seed_same_rows():
+    assert generate_sales_data(ROWS, seed=3).equals(generate_sales_data(ROWS, seed=3))
+
+
+def test_each_invoice_lists_an_item_once():
+    # Upserts key on invoice and item; repeats would overwrite each other
+    df = generate_sales_data(ROWS)
+    assert len(df) == ROWS
+    assert not df.duplicated(KEY_COLUMNS).any()
@@ -0,0 +1,54 @@
+# tests/test_timeseries.py
+# Run from the repo root: python -m pytest tests
+import numpy as np
+import pandas as pd
+from timeseries import bucket_series, lttb, other_label
+
+POINTS = 1000
+
+
+def test_lttb_keeps_the_endpoints_and_threshold_points():
+    x = np.arange(POINTS)
+    y = np.sin(x / 50)
+    keep = lttb(x, y, 100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == POINTS - 1
+    assert (np.diff(keep) > 0).all()
+
+
+def test_lttb_keeps_a_spike():
+    y = np.zeros(POINTS)
+    y[537] = 100.0
+    assert 537 in lttb(np.arange(POINTS), y, 50)
+
+
+def test_lttb_leaves_short_series_alone():
+    assert lttb(np.arange(10), np.arange(10), 50).tolist() == list(range(10))
+
+
+def test_other_label_never_names_a_real_item():
+    taken = {other_label(3, set())}
+    assert other_label(3, taken) not in taken
+
+
+def _sales(items):
+    days = pd.date_range("2020-01-01", periods=POINTS, freq="D")
+    return pd.DataFrame({
+        'invoice_date': np.tile(days, items),
+        'item_name': np.repeat([f"Item {i}" for i in range(items)], POINTS),
+        'invoice_value': np.tile(np.arange(POINTS, dtype=float), items),
+    })
+
+
+def test_bucket_series_folds_items_beyond_the_top_n():
+    df = _sales(20)
+    series = bucket_series(df, 'invoice_value', freq="M", top_n=5)
+    assert series['item_name'].nunique() == 6
+    assert (series['item_name'] == other_label(15, set())).any()
+    # Folding and bucketing move values between rows; they never lose them
+    assert series['invoice_value'].sum() == df['invoice_value'].sum()
+
+
+def test_bucket_series_downsamples_long_traces():
+    series = bucket_series(_sales(3), 'invoice_value', freq="D", max_points=100)
+    assert series.groupby('item_name').size().tolist() == [100, 100, 100]
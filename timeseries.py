@@ -0,0 +1,94 @@
+# timeseries.py
+import os
+import numpy as np
+import pandas as pd
+from dtype_optimizer import widen
+
+# Server-side shaping of the Time Series chart.
+# Rows are bucketed by day/week/month depending on the date span, items
+# beyond the top N are folded into "Other (N items)", and any trace still longer
+# than the point budget is downsampled with LTTB, so the figure size stays
+# bounded however many rows the extract has.
+
+MAX_POINTS_PER_TRACE = int(os.environ.get("SALES_TS_MAX_POINTS", 400))
+TOP_N_ITEMS = int(os.environ.get("SALES_TS_TOP_ITEMS", 15))
+# Label of the folded items; never the name of a real item
+OTHER_LABEL = "Other ({count:,} items)"
+
+
+def choose_frequency(start, end):
+    """Pick a period frequency (day/week/month) for the span between two dates"""
+    span = (pd.Timestamp(end) - pd.Timestamp(start)).days
+    if span <= 120:
+        return "D"
+    if span <= 2 * 365:
+        return "W"
+    return "M"
+
+
+def other_label(count, names):
+    """Label for count folded items that isn't one of names"""
+    label = OTHER_LABEL.format(count=count)
+    while label in names:
+        label = f"({label})"
+    return label
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of the points to keep"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    # Interior points split into threshold-2 equal buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_start, nxt_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_start:nxt_end].mean()
+        avg_y = y[nxt_start:nxt_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                       - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        keep[i + 1] = a
+    return keep
+
+
+def bucket_series(df, metric, freq=None, top_n=TOP_N_ITEMS, max_points=MAX_POINTS_PER_TRACE):
+    """Per-item time series of metric, bucketed, top-N limited and downsampled.
+
+    df needs invoice_date, item_name and metric columns. Returns a long frame
+    with invoice_date, item_name and metric.
+    """
+    df = widen(df[["invoice_date", "item_name", metric]]).dropna(subset=["invoice_date"])
+    if df.empty:
+        return df
+    if freq is None:
+        freq = choose_frequency(df["invoice_date"].min(), df["invoice_date"].max())
+
+    items = df["item_name"].astype(object)
+    totals = df[metric].groupby(items).sum()
+    if len(totals) > top_n:
+        top = totals.nlargest(top_n).index
+        label = other_label(len(totals) - len(top), set(totals.index))
+        items = items.where(items.isin(top), label)
+
+    # Bucket start dates: Mondays for weeks, the 1st for months
+    buckets = df["invoice_date"].dt.to_period(freq).dt.start_time
+    series = (df[metric]
+              .groupby([items.rename("item_name"), buckets.rename("invoice_date")])
+              .sum()
+              .reset_index())
+
+    traces = []
+    for _, trace in series.groupby("item_name", sort=False):
+        if len(trace) > max_points:
+            dates = trace["invoice_date"].to_numpy().astype("datetime64[s]").astype(np.int64)
+            trace = trace.iloc[lttb(dates, trace[metric].to_numpy(), max_points)]
+        traces.append(trace)
+    return pd.concat(traces, ignore_index=True)
@@ -0,0 +1,42 @@
+# wsgi.py
+import gc
+import os
+import time
+
+# Production entry point: `gunicorn -c gunicorn.conf.py wsgi:server`.
+# gunicorn imports this once in the master (preload_app) and forks the
+# workers from it, so everything loaded and warmed up here is shared
+# copy-on-write instead of being rebuilt by every worker on its first
+# request.
+
+from app import server
+from extract_schema import SchemaError
+from pages import sales
+
+WARM_UP = os.environ.get("WARM_UP", "1") != "0"
+
+
+def warm_up():
+    """Build the shared extract's dropdown index and cube, render the default
+    chart once and hit the Dash endpoints so their responses are cached"""
+    start = time.perf_counter()
+    try:
+        sales.load_index()
+        sales.load_cube()
+    except SchemaError as e:
+        # Still serve the app (a session can run a fresh query), but say why
+        print(f"Shared extract not loaded: {e}")
+    sales.update_graph(None, None, None, None, None, None, None, 'bar', 'invoice_value')
+
+    client = server.test_client()
+    for path in ("/sales", "/_dash-layout", "/_dash-dependencies"):
+        client.get(path)
+    print(f"Warm-up finished in {time.perf_counter() - start:.1f}s")
+
+
+if WARM_UP:
+    warm_up()
+
+# Move everything loaded so far out of the collector's reach, so its
+# bookkeeping doesn't touch (and un-share) those pages in the workers
+gc.freeze()